@@ -0,0 +1,167 @@
+# --- BATCHED MULTI-OUTCOME OLS ---
+# Fits `outcome ~ regressors + C(fixed effects)` for many outcome columns at once. The
+# design matrix is built once and factorized (pseudo-inverse) once per pattern of missing
+# rows, so every outcome sharing a sample is solved with a single matrix product instead
+# of re-parsing a formula and refitting per outcome. Estimates match statsmodels' OLS:
+# 'nonrobust' uses t-based inference; 'HC1' and 'cluster' are normal-based like
+# statsmodels' default for robust covariances.
+#
+# With `by` (e.g. 'year') the same model is fit separately within every group. All
+# (group, missing-row pattern) samples are zero-padded to a common shape and factorized in
+# one stacked pinv call, so a 46-year panel is one batched solve rather than 46 fits.
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+SUMMARY_COLUMNS = ['Variable', 'Coeff', 'Standard Error', 't-score', 'P>|t|',
+                   'ci_lower', 'ci_upper']
+
+
+def design_matrix(df, regressors, fixed_effects=()):
+    # Intercept, regressors, then treatment-coded dummies (first sorted level dropped)
+    # named the way patsy names C(col) terms. Also returns rows usable for estimation.
+    parts = [pd.DataFrame({'Intercept': 1.0}, index=df.index), df[list(regressors)].astype(float)]
+    usable = df[list(regressors)].notna().all(axis=1)
+    for col in fixed_effects:
+        levels = pd.Categorical(df[col])
+        dummies = pd.get_dummies(levels, prefix=f'C({col})[T', prefix_sep='.', dtype=float)
+        dummies.columns = [f'{c}]' for c in dummies.columns]
+        dummies.index = df.index
+        parts.append(dummies.iloc[:, 1:])
+        usable &= df[col].notna()
+    X = pd.concat(parts, axis=1)
+    usable &= np.isfinite(X.to_numpy()).all(axis=1)
+    return X, usable.to_numpy()
+
+
+class BatchOLS:
+    def __init__(self, df, outcomes, regressors, fixed_effects=(), cov_type='nonrobust',
+                 groups=None, by=None):
+        # cov_type: 'nonrobust', 'HC1' or 'cluster' (clustered on the `groups` column)
+        self.outcomes = list(outcomes)
+        self.by = by
+        if by is not None:
+            self.group_codes, self.group_keys = pd.factorize(df[by], sort=True)
+        else:
+            self.group_codes, self.group_keys = np.zeros(len(df), dtype=int), pd.Index([None])
+        X, usable = design_matrix(df, regressors, fixed_effects)
+        self.terms = list(X.columns)
+        self.X = X.to_numpy()
+        self.Y = df[self.outcomes].to_numpy(dtype=float)
+        self.cov_type = cov_type
+        self.groups = pd.factorize(df[groups])[0] if groups is not None else None
+        if cov_type == 'cluster' and self.groups is None:
+            raise ValueError("cov_type='cluster' needs a groups column")
+
+        # Row mask per outcome: statsmodels drops rows missing the outcome or any regressor
+        self.rows = usable[:, None] & np.isfinite(self.Y)
+
+    def _samples(self):
+        # (group, rows, outcome columns) for every distinct estimation sample
+        samples = []
+        for g in range(len(self.group_keys)):
+            rows = self.rows & (self.group_codes == g)[:, None]
+            patterns, pattern_of = np.unique(rows.T, axis=0, return_inverse=True)
+            for p, pattern in enumerate(patterns):
+                if pattern.sum():
+                    samples.append((g, np.flatnonzero(pattern), np.flatnonzero(pattern_of.ravel() == p)))
+        return samples
+
+    def _factorize(self, samples):
+        # Zero rows don't change OLS, so pad every sample to the largest and solve them all
+        # in one stacked call: pinv is (samples, terms, max_rows)
+        n_max = max(len(rows) for _, rows, _ in samples)
+        stacked = np.zeros((len(samples), n_max, self.X.shape[1]))
+        for s, (_, rows, _) in enumerate(samples):
+            stacked[s, :len(rows)] = self.X[rows]
+        return np.linalg.pinv(stacked), np.linalg.matrix_rank(stacked)
+
+    def _fit_pattern(self, rows, Y, pinv, rank):
+        # Solve every outcome in Y (n_rows x m) against the same sample of rows
+        X = self.X[rows]
+        n = len(X)
+        pinv = pinv[:, :n]
+        params = pinv @ Y
+        resid = Y - X @ params
+        df_resid = n - rank
+
+        if self.cov_type == 'nonrobust':
+            sigma2 = (resid ** 2).sum(axis=0) / df_resid
+            var = np.diag(pinv @ pinv.T)[:, None] * sigma2[None, :]
+        elif self.cov_type == 'HC1':
+            var = (pinv ** 2) @ (resid ** 2) * (n / df_resid)
+        else:
+            codes = pd.factorize(self.groups[rows])[0]
+            n_groups = codes.max() + 1
+            # Per-cluster score sums for every term and outcome: (groups, terms, outcomes)
+            indicator = np.zeros((n_groups, n))
+            indicator[codes, np.arange(n)] = 1.0
+            scores = np.tensordot(indicator, pinv.T[:, :, None] * resid[:, None, :], axes=1)
+            # statsmodels' small-sample correction counts the design's columns. Ours can carry
+            # all-zero dummies (levels missing from this sample) that a fit on just these
+            # rows wouldn't have, so count the rank instead
+            correction = n_groups / (n_groups - 1) * (n - 1) / (n - rank)
+            var = correction * (scores ** 2).sum(axis=0)
+        return params, np.sqrt(var), df_resid
+
+    def fit(self, alpha=0.05):
+        # Long table with one row per (group, outcome, term)
+        m, k, n_groups = len(self.outcomes), len(self.terms), len(self.group_keys)
+        params = np.full((n_groups, k, m), np.nan)
+        bse = np.full((n_groups, k, m), np.nan)
+        df_resid = np.full((n_groups, 1, m), np.nan)
+
+        samples = self._samples()
+        if samples:
+            pinvs, ranks = self._factorize(samples)
+            for (g, rows, cols), pinv, rank in zip(samples, pinvs, ranks):
+                params[g][:, cols], bse[g][:, cols], df_resid[g, 0, cols] = \
+                    self._fit_pattern(rows, self.Y[rows][:, cols], pinv, rank)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tvalues = params / bse
+        if self.cov_type == 'nonrobust':
+            pvalues = 2 * stats.t.sf(np.abs(tvalues), df_resid)
+            crit = stats.t.ppf(1 - alpha / 2, df_resid)
+        else:
+            pvalues = 2 * stats.norm.sf(np.abs(tvalues))
+            crit = stats.norm.ppf(1 - alpha / 2)
+
+        table = pd.DataFrame({
+            'outcome': np.tile(self.outcomes, n_groups * k),
+            'term': np.tile(np.repeat(self.terms, m), n_groups),
+            'coef': params.ravel(),
+            'se': bse.ravel(),
+            't': tvalues.ravel(),
+            'p': pvalues.ravel(),
+            'ci_lower': (params - crit * bse).ravel(),
+            'ci_upper': (params + crit * bse).ravel(),
+            'df_resid': np.broadcast_to(df_resid, params.shape).ravel(),
+        })
+        if self.by is not None:
+            table.insert(0, self.by, np.repeat(np.asarray(self.group_keys), k * m))
+        return BatchResults(table, self.by)
+
+
+class BatchResults:
+    def __init__(self, table, by=None):
+        self.table = table
+        self.by = by
+
+    def summary(self, term, labels=None):
+        # Same columns as the per-model summary built in fisc_plots.py (plus the group
+        # column first when fit with `by`)
+        rows = self.table[self.table['term'] == term]
+        out = pd.DataFrame({
+            'Variable': rows['outcome'].replace(labels or {}).to_numpy(),
+            'Coeff': rows['coef'].to_numpy(),
+            'Standard Error': rows['se'].to_numpy(),
+            't-score': rows['t'].to_numpy(),
+            'P>|t|': rows['p'].to_numpy(),
+            'ci_lower': rows['ci_lower'].to_numpy(),
+            'ci_upper': rows['ci_upper'].to_numpy(),
+        })
+        if self.by is not None:
+            out.insert(0, self.by, rows[self.by].to_numpy())
+            return out[[self.by] + SUMMARY_COLUMNS]
+        return out[SUMMARY_COLUMNS]
@@ -0,0 +1,166 @@
+# --- COMPACTNESS AND BOUNDARY-QUALITY METRICS ---
+# Scores for any tract selection without dissolving it:
+#   - Polsby-Popper: 4*pi*area / perimeter^2 (1 for a circle)
+#   - Reock: area / area of the smallest enclosing circle
+#   - Convex hull ratio: area / area of the convex hull
+#   - Shared perimeter: share of the outline drawn through the rest of the region rather
+#     than along the study area's edge (the rivers / county line)
+#   - Contiguity: number of separate pieces and of enclosed holes
+# The union perimeter is the tracts' own perimeters minus twice every edge shared inside
+# the selection, so with per-tract perimeters and the shared-edge matrix cached, adding or
+# removing a tract only touches that tract's row (MetricTracker). Hull based metrics use
+# each tract's convex hull vertices, since the hull of a union is the hull of the parts'
+# hulls; they and the contiguity counts are computed when asked for.
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from spatial_index import PROJECTED_CRS
+
+METRIC_COLUMNS = ['Tracts', 'Total Population', 'SQMI', 'DENSITY', 'Polsby-Popper', 'Reock',
+                  'Convex Hull Ratio', 'Shared Perimeter Share', 'Pieces', 'Holes']
+
+
+def tract_arrays(engine):
+    # The per-tract arrays the metrics need, in a plain dict so it can be shipped to
+    # worker processes without the engine's geometry
+    adjacency = engine.adjacency
+    return {'indptr': adjacency.indptr, 'indices': adjacency.indices, 'shared': adjacency.data,
+            'pop': engine.pop, 'sqmi': engine.sqmi, 'area': engine.area_m2,
+            'perimeter': engine.perimeter,
+            # Length of each tract's boundary on the study area's edge
+            'edge_length': np.maximum(engine.perimeter - engine.shared_length, 0.0),
+            'on_edge': engine.on_edge, 'locked': engine.is_city}
+
+
+def polsby_popper(area, perimeter):
+    area, perimeter = np.asarray(area, dtype=float), np.asarray(perimeter, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(perimeter > 0, 4 * np.pi * area / perimeter ** 2, 0.0)
+
+
+class MetricTracker:
+    # Running totals for one selection. `toggled(i)` returns the totals after flipping
+    # tract i, without changing anything, so a move can be scored before it is made.
+    def __init__(self, arrays, mask):
+        self.g = arrays
+        self.mask = np.asarray(mask, dtype=bool).copy()
+        self.pop = arrays['pop'][self.mask].sum()
+        self.sqmi = arrays['sqmi'][self.mask].sum()
+        self.area = arrays['area'][self.mask].sum()
+        self.edge = arrays['edge_length'][self.mask].sum()
+        # Every edge shared by two selected tracts is counted once from each side
+        inside = sum(self._shared_with_selection(i) for i in np.flatnonzero(self.mask))
+        self.perimeter = arrays['perimeter'][self.mask].sum() - inside
+
+    def neighbors(self, i):
+        return self.g['indices'][self.g['indptr'][i]:self.g['indptr'][i + 1]]
+
+    def _shared_with_selection(self, i):
+        lo, hi = self.g['indptr'][i], self.g['indptr'][i + 1]
+        return self.g['shared'][lo:hi][self.mask[self.g['indices'][lo:hi]]].sum()
+
+    @property
+    def totals(self):
+        return self.pop, self.sqmi, self.area, self.perimeter, self.edge
+
+    def toggled(self, i):
+        sign = -1.0 if self.mask[i] else 1.0
+        g = self.g
+        return (self.pop + sign * g['pop'][i], self.sqmi + sign * g['sqmi'][i],
+                self.area + sign * g['area'][i],
+                self.perimeter + sign * (g['perimeter'][i] - 2 * self._shared_with_selection(i)),
+                self.edge + sign * g['edge_length'][i])
+
+    def flip(self, i, totals=None):
+        totals = self.toggled(i) if totals is None else totals
+        self.mask[i] = not self.mask[i]
+        self.pop, self.sqmi, self.area, self.perimeter, self.edge = totals
+
+    def add(self, i):
+        if not self.mask[i]:
+            self.flip(i)
+
+    def remove(self, i):
+        if self.mask[i]:
+            self.flip(i)
+
+    @property
+    def density(self):
+        return self.pop / self.sqmi if self.sqmi else 0.0
+
+    @property
+    def polsby_popper(self):
+        return float(polsby_popper(self.area, self.perimeter))
+
+    @property
+    def shared_perimeter_share(self):
+        return (self.perimeter - self.edge) / self.perimeter if self.perimeter > 0 else 0.0
+
+
+class BoundaryMetrics:
+    # Per-tract caches for one boundary engine; build once and reuse for every selection
+    def __init__(self, engine):
+        self.engine = engine
+        self.arrays = tract_arrays(engine)
+        projected = gpd.GeoSeries(engine.geoms, crs='EPSG:4326').to_crs(PROJECTED_CRS).to_numpy()
+        self.hull_points, self.hull_owner = shapely.get_coordinates(
+            shapely.convex_hull(projected), return_index=True)
+
+    def tracker(self, mask):
+        return MetricTracker(self.arrays, mask)
+
+    def _hulls(self, masks):
+        # Convex hull of every selection from the selected tracts' hull vertices. Empty
+        # selections get None; multipoints wants consecutive indices, so the hulls are
+        # built over the non-empty rows only and put back in place.
+        selected = masks[:, self.hull_owner]
+        nonempty = selected.any(axis=1)
+        hulls = np.full(len(masks), None, dtype=object)
+        if nonempty.any():
+            sel, point = np.nonzero(selected[nonempty])
+            hulls[nonempty] = shapely.convex_hull(shapely.multipoints(self.hull_points[point], indices=sel))
+        return hulls
+
+    def _contiguity(self, mask):
+        engine = self.engine
+        pieces = len(np.unique(engine._components(mask)[mask]))
+        outside = ~mask
+        labels = engine._components(outside)
+        if not outside.any():
+            return pieces, 0
+        reaches_edge = np.bincount(labels[outside], weights=engine.on_edge[outside]) > 0
+        return pieces, int((~reaches_edge).sum())
+
+    def measure(self, masks):
+        # One row of METRIC_COLUMNS per selection; `masks` is one boolean mask or an
+        # (n_selections, n_tracts) stack of them
+        masks = np.atleast_2d(np.asarray(masks, dtype=bool))
+        g = self.arrays
+        weights = masks.astype(float)
+        pop, sqmi, area = weights @ g['pop'], weights @ g['sqmi'], weights @ g['area']
+        adjacency = self.engine.adjacency
+        inside = np.asarray((adjacency @ weights.T).T * weights).sum(axis=1)
+        perimeter = weights @ g['perimeter'] - inside
+        edge = weights @ g['edge_length']
+
+        hulls = self._hulls(masks)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            reock = area / (np.pi * shapely.minimum_bounding_radius(hulls) ** 2)
+            hull_ratio = area / shapely.area(hulls)
+            density = np.where(sqmi > 0, pop / sqmi, 0.0)
+            shared_share = np.where(perimeter > 0, (perimeter - edge) / perimeter, 0.0)
+        pieces, holes = zip(*(self._contiguity(mask) for mask in masks))
+
+        metrics = pd.DataFrame({
+            'Tracts': masks.sum(axis=1), 'Total Population': pop, 'SQMI': sqmi,
+            'DENSITY': density, 'Polsby-Popper': polsby_popper(area, perimeter),
+            'Reock': reock, 'Convex Hull Ratio': hull_ratio,
+            'Shared Perimeter Share': shared_share, 'Pieces': pieces, 'Holes': holes,
+        }, columns=METRIC_COLUMNS)
+        # Ratios are undefined for an empty selection
+        empty = ~masks.any(axis=1)
+        metrics.loc[empty, ['DENSITY', 'Polsby-Popper', 'Reock', 'Convex Hull Ratio',
+                            'Shared Perimeter Share']] = np.nan
+        return metrics
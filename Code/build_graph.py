@@ -0,0 +1,169 @@
+# --- INCREMENTAL BUILD GRAPH FOR THE PREPROCESSING STAGES ---
+# Each stage of preprocessing.py is registered as a named target with the files it
+# reads and the files it writes. Before a target runs we hash its inputs, its
+# parameters and its own source code, and compare against the hashes recorded on the
+# last successful run. If nothing changed and the outputs are still on disk untouched,
+# the target is skipped. Because a target's inputs are usually another target's
+# outputs, a rebuild that writes identical bytes also stops the chain early.
+import hashlib
+import inspect
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+@dataclass
+class Target:
+    name: str
+    func: Callable
+    inputs: list
+    outputs: list
+    params: dict = field(default_factory=dict)
+    # Non-default targets (e.g. exports) only run when asked for by name
+    default: bool = True
+
+
+class BuildGraph:
+    def __init__(self, base_dir, state_path):
+        self.base_dir = str(base_dir)
+        self.state_path = state_path
+        self.targets = {}
+        self.state = self._load_state()
+
+    # Decorator used by preprocessing.py to declare a stage
+    def target(self, name, inputs=(), outputs=(), params=None, default=True):
+        def register(func):
+            if name in self.targets:
+                raise ValueError(f'Target {name!r} is already registered')
+            self.targets[name] = Target(name, func, list(inputs), list(outputs),
+                                        dict(params or {}), default)
+            return func
+        return register
+
+    # --- Hashing ---
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.base_dir)
+
+    def _file_digest(self, path):
+        # Hashing a few MB of GeoJSON is cheap, but we still skip it when the file's
+        # size and mtime match what we saw last time.
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        cached = self.state['files'].get(self._rel(path))
+        if cached and cached['signature'] == signature:
+            return cached['digest']
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        self.state['files'][self._rel(path)] = {'signature': signature, 'digest': digest}
+        return digest
+
+    def _target_key(self, target):
+        sha = hashlib.sha256()
+        sha.update(inspect.getsource(target.func).encode())
+        sha.update(json.dumps(target.params, sort_keys=True, default=str).encode())
+        for path in target.inputs:
+            sha.update(self._rel(path).encode())
+            sha.update(self._file_digest(path).encode())
+        return sha.hexdigest()
+
+    # --- State on disk ---
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            state.setdefault('files', {})
+            state.setdefault('targets', {})
+            return state
+        return {'files': {}, 'targets': {}}
+
+    def _save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    # --- Scheduling ---
+
+    def _producers(self):
+        producers = {}
+        for target in self.targets.values():
+            for path in target.outputs:
+                producers[os.path.abspath(path)] = target.name
+        return producers
+
+    def order(self, names=None):
+        # Depth-first topological sort, pulling in upstream targets of anything requested
+        producers = self._producers()
+        ordered, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f'Cycle in build graph at target {name!r}')
+            visiting.add(name)
+            for path in self.targets[name].inputs:
+                upstream = producers.get(os.path.abspath(path))
+                if upstream is not None and upstream != name:
+                    visit(upstream)
+            visiting.discard(name)
+            done.add(name)
+            ordered.append(name)
+
+        if not names:
+            names = [name for name, target in self.targets.items() if target.default]
+        for name in names:
+            if name not in self.targets:
+                raise KeyError(f'Unknown target {name!r}; choose from {sorted(self.targets)}')
+            visit(name)
+        return ordered
+
+    def is_stale(self, target):
+        record = self.state['targets'].get(target.name)
+        if record is None:
+            return True
+        missing = [p for p in target.inputs if not os.path.exists(p)]
+        if missing:
+            raise FileNotFoundError(f'Target {target.name!r} is missing inputs: {missing}')
+        if record['key'] != self._target_key(target):
+            return True
+        for path in target.outputs:
+            if not os.path.exists(path):
+                return True
+            if record['outputs'].get(self._rel(path)) != self._file_digest(path):
+                return True
+        return False
+
+    def run(self, names=None, force=()):
+        # `force` can be True (rebuild everything requested) or a list of target names
+        built = []
+        for name in self.order(names):
+            target = self.targets[name]
+            forced = force is True or name in force
+            if not forced and not self.is_stale(target):
+                print(f'[skip]  {name}')
+                continue
+
+            start = time.perf_counter()
+            target.func()
+            elapsed = time.perf_counter() - start
+
+            missing = [p for p in target.outputs if not os.path.exists(p)]
+            if missing:
+                raise RuntimeError(f'Target {name!r} did not write: {missing}')
+            self.state['targets'][name] = {
+                'key': self._target_key(target),
+                'outputs': {self._rel(p): self._file_digest(p) for p in target.outputs},
+            }
+            self._save_state()
+            built.append(name)
+            print(f'[built] {name} ({elapsed:.1f}s)')
+        return built
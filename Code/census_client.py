@@ -0,0 +1,151 @@
+# --- CACHED, PARALLEL CENSUS ACS CLIENT ---
+# Thin client for the Census Bureau ACS 5-year tract endpoint. Every response is
+# written to disk keyed by (year, geography, variable set), so repeat runs are served
+# offline, and multiple counties/years are fetched concurrently with a bounded thread
+# pool and retry/backoff. Point `base_url` (or CENSUS_API_URL) at a local stand-in
+# server to exercise it without touching the real API.
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+base_dir = Path(__file__).resolve().parent.parent
+default_cache_dir = os.path.join(base_dir, 'data', 'raw-data', 'census_cache')
+
+# Vintage the project's tract data is pulled for
+ACS_YEAR = 2022
+
+# The API caps a single request at 50 variables
+MAX_VARIABLES_PER_REQUEST = 49
+
+# (state FIPS, county FIPS) for the 15-county St. Louis MSA
+STL_MSA_COUNTIES = [
+    ('29', '071'),  # Franklin
+    ('29', '099'),  # Jefferson
+    ('29', '113'),  # Lincoln
+    ('29', '183'),  # St. Charles
+    ('29', '189'),  # St. Louis County
+    ('29', '219'),  # Warren
+    ('29', '510'),  # St. Louis city
+    ('17', '005'),  # Bond
+    ('17', '013'),  # Calhoun
+    ('17', '027'),  # Clinton
+    ('17', '083'),  # Jersey
+    ('17', '117'),  # Macoupin
+    ('17', '119'),  # Madison
+    ('17', '133'),  # Monroe
+    ('17', '163'),  # St. Clair
+]
+
+GEOGRAPHY_COLUMNS = ['state', 'county', 'tract']
+
+
+class CensusAPIError(RuntimeError):
+    pass
+
+
+class CensusClient:
+    def __init__(self, api_key=None, cache_dir=default_cache_dir, base_url=None,
+                 max_workers=8, retries=4, backoff=1.0, timeout=30, offline=False):
+        # The API works without a key for light use, so an empty key is allowed
+        self.api_key = api_key or os.environ.get('CENSUS_API_KEY', '')
+        self.base_url = (base_url or os.environ.get('CENSUS_API_URL')
+                         or 'https://api.census.gov/data').rstrip('/')
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.offline = offline
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # --- Disk cache ---
+
+    def _cache_path(self, year, state, county, variables):
+        key = json.dumps({'dataset': 'acs5', 'year': int(year), 'state': state,
+                          'county': county, 'variables': sorted(variables)})
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f'acs5_{year}_{state}{county}_{digest}.json')
+
+    # --- HTTP with retry/backoff ---
+
+    def _get(self, year, state, county, variables):
+        params = {'get': ','.join(variables), 'for': 'tract:*',
+                  'in': f'state:{state} county:{county}'}
+        if self.api_key:
+            params['key'] = self.api_key
+        url = f'{self.base_url}/{year}/acs/acs5'
+
+        for attempt in range(self.retries + 1):
+            try:
+                response = requests.get(url, params=params, timeout=self.timeout)
+                # Rate limiting and server hiccups are worth retrying, bad requests are not
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.HTTPError(f'{response.status_code} from {url}',
+                                             response=response)
+                if response.status_code != 200:
+                    raise CensusAPIError(f'{response.status_code} from {url}: {response.text[:200]}')
+                return response.json()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError,
+                    ValueError) as err:
+                if attempt == self.retries:
+                    raise CensusAPIError(f'Giving up on {url} ({state}{county}, {year}): {err}') from err
+                # Exponential backoff with jitter so parallel workers don't retry in lockstep
+                time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def _fetch_rows(self, year, state, county, variables):
+        path = self._cache_path(year, state, county, variables)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        if self.offline:
+            raise CensusAPIError(f'No cached response for {state}{county} ({year}) and offline=True')
+
+        rows = self._get(year, state, county, variables)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(rows, f)
+        os.replace(tmp_path, path)
+        return rows
+
+    # --- Public API ---
+
+    def county_tracts(self, variables, state, county, year=ACS_YEAR):
+        variables = list(dict.fromkeys(variables))
+        chunks = [variables[i:i + MAX_VARIABLES_PER_REQUEST]
+                  for i in range(0, len(variables), MAX_VARIABLES_PER_REQUEST)]
+
+        frame = None
+        for chunk in chunks:
+            rows = self._fetch_rows(year, state, county, chunk)
+            part = pd.DataFrame(rows[1:], columns=rows[0])
+            frame = part if frame is None else frame.merge(part, on=GEOGRAPHY_COLUMNS)
+        return _coerce_numeric(frame)
+
+    def tracts(self, variables, counties, years=(ACS_YEAR,)):
+        # One job per (county, year); results come back in submission order
+        jobs = [(state, county, year) for year in years for state, county in counties]
+        if not jobs:
+            return pd.DataFrame(columns=list(dict.fromkeys(variables)) + GEOGRAPHY_COLUMNS + ['year'])
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            futures = [pool.submit(self.county_tracts, variables, state, county, year)
+                       for state, county, year in jobs]
+            frames = []
+            for (_, _, year), future in zip(jobs, futures):
+                frame = future.result()
+                frame['year'] = year
+                frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+
+def _coerce_numeric(df):
+    for col in df.columns:
+        if col not in GEOGRAPHY_COLUMNS and col != 'NAME':
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
@@ -0,0 +1,160 @@
+# --- SPARSE AREAL INTERPOLATION CROSSWALKS ---
+# Tract demographics and municipal finances live on different geographies. A crosswalk
+# stores, once, the area of every tract x municipality (or tract x fire district)
+# intersection as a sparse matrix; after that any set of columns moves between the two
+# geographies with one sparse matrix product.
+#   - extensive values (counts, dollar totals) are split by share of area
+#   - intensive values (rates, medians, proportions) are averaged, weighted by area or by
+#     another extensive column such as population
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.sparse import coo_matrix, diags
+
+from spatial_index import PROJECTED_CRS
+
+# Municipal view name -> (all_tracts column, extensive?) for the dashboard's municipal
+# page. Counts are split by area share; the rest are tract values averaged by population.
+MUNI_ACS_MEASURES = {
+    'ACS Population (from tracts)': ('Total Population', True),
+    'ACS Median Household Income (tract avg.)': ('Median HHI', False),
+    'ACS Proportion Black (tract avg.)': ('Proportion Black', False),
+    'ACS Home Ownership Rate (tract avg.)': ('Home Ownership Rate', False),
+    "ACS Bachelor's Degree (tract avg.)": ("Bachelor's Degree", False),
+}
+
+# name: (source layer, source id column, target layer, target id column)
+CROSSWALKS = {
+    'tract_muni': ('all_tracts', 'TRACT', 'munis_merged', 'Municipality'),
+    'tract_firedist': ('all_tracts', 'TRACT', 'firedist', 'District'),
+}
+
+
+def crosswalk_name(name):
+    return f'crosswalk_{name}'
+
+
+def _as_matrix(values):
+    # (n, p) float array plus column labels for 1D/2D arrays, Series and DataFrames
+    if isinstance(values, pd.DataFrame):
+        return values.to_numpy(dtype=float), list(values.columns)
+    if isinstance(values, pd.Series):
+        return values.to_numpy(dtype=float)[:, None], [values.name]
+    values = np.asarray(values, dtype=float)
+    return (values[:, None], [0]) if values.ndim == 1 else (values, list(range(values.shape[1])))
+
+
+def _by_id(ids):
+    # Unique ids (first-seen order) and a features x ids indicator matrix, so features
+    # sharing an id (e.g. a municipality stored as several polygon rows) act as one
+    codes, unique = pd.factorize(ids)
+    indicator = coo_matrix((np.ones(len(codes)), (np.arange(len(codes)), codes)),
+                           shape=(len(codes), len(unique))).tocsr()
+    return np.asarray(unique), indicator
+
+
+class Crosswalk:
+    def __init__(self, source, source_id, target, target_id):
+        # Features without an id can't be looked up by id, so they're left out (firedist
+        # has a couple of unnamed pieces)
+        source = source[source[source_id].notna()].to_crs(PROJECTED_CRS)
+        target = target[target[target_id].notna()].to_crs(PROJECTED_CRS)
+        self.source_ids, source_by_id = _by_id(source[source_id].to_numpy())
+        self.target_ids, target_by_id = _by_id(target[target_id].to_numpy())
+        source_geoms = shapely.make_valid(source.geometry.to_numpy())
+        target_geoms = shapely.make_valid(target.geometry.to_numpy())
+        self.source_area = source_by_id.T @ shapely.area(source_geoms)
+        self.target_area = target_by_id.T @ shapely.area(target_geoms)
+
+        # Candidate pairs from the tree, then the exact intersection areas (square meters)
+        s_idx, t_idx = shapely.STRtree(target_geoms).query(source_geoms, predicate='intersects')
+        areas = shapely.area(shapely.intersection(source_geoms[s_idx], target_geoms[t_idx]))
+        keep = areas > 0
+        areas = coo_matrix((areas[keep], (s_idx[keep], t_idx[keep])),
+                           shape=(len(source_geoms), len(target_geoms))).tocsr()
+        # One row/column per id
+        self.areas = (source_by_id.T @ areas @ target_by_id).tocsr()
+
+    @classmethod
+    def from_layers(cls, name, read_layer):
+        source_layer, source_id, target_layer, target_id = CROSSWALKS[name]
+        return cls(read_layer(source_layer, columns=[source_id]), source_id,
+                   read_layer(target_layer, columns=[target_id]), target_id)
+
+    # --- Persistence (pickled next to the spatial indexes) ---
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    # --- Apportioning ---
+
+    def _share_of_source(self):
+        # Fraction of each source polygon's area falling in each target
+        return diags(1 / np.where(self.source_area > 0, self.source_area, np.inf)) @ self.areas
+
+    def _share_of_target(self):
+        return self.areas @ diags(1 / np.where(self.target_area > 0, self.target_area, np.inf))
+
+    @staticmethod
+    def _apply(matrix, values, weights, extensive, index):
+        X, columns = _as_matrix(values)
+        valid = ~np.isnan(X)
+        if extensive:
+            out = matrix @ np.where(valid, X, 0.0)
+        else:
+            w = np.ones(len(X)) if weights is None else np.nan_to_num(np.asarray(weights, dtype=float))
+            w = np.where(valid, w[:, None], 0.0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out = (matrix @ (np.where(valid, X, 0.0) * w)) / (matrix @ w)
+        return pd.DataFrame(out, index=index, columns=columns)
+
+    def to_target(self, values, weights=None, extensive=True):
+        # Source rows (in source_ids order) -> one row per target id. Extensive values
+        # are split by area share; intensive values are averaged weighted by `weights`
+        # (e.g. tract population) spread over each source's area, or by area if None.
+        share = self._share_of_source()
+        if not extensive and weights is None:
+            weights = self.source_area
+        return self._apply(share.T.tocsr(), values, weights, extensive, self.target_ids)
+
+    def to_source(self, values, weights=None, extensive=True):
+        # Target rows (in target_ids order) -> one row per source id
+        share = self._share_of_target()
+        if not extensive and weights is None:
+            weights = self.target_area
+        return self._apply(share, values, weights, extensive, self.source_ids)
+
+    def align_source(self, df, id_col):
+        # Reorder a frame keyed by source ids to this crosswalk's source order (the first
+        # row wins where an id repeats)
+        return df.drop_duplicates(id_col).set_index(id_col).reindex(self.source_ids)
+
+    def align_target(self, df, id_col):
+        return df.drop_duplicates(id_col).set_index(id_col).reindex(self.target_ids)
+
+
+def muni_acs(crosswalk, tracts, measures=MUNI_ACS_MEASURES):
+    # Tract ACS columns apportioned to municipalities through a tract_muni crosswalk, one
+    # column per entry of `measures`, indexed by municipality
+    needed = {col for col, _ in measures.values()} | {'TRACT', 'Total Population'}
+    missing = sorted(needed - set(tracts.columns))
+    if missing:
+        raise KeyError(f'all_tracts is missing the columns {missing}')
+    tracts = crosswalk.align_source(pd.DataFrame(tracts.drop(columns='geometry', errors='ignore')), 'TRACT')
+    extensive = {k: c for k, (c, ext) in measures.items() if ext}
+    intensive = {k: c for k, (c, ext) in measures.items() if not ext}
+    return pd.concat([
+        crosswalk.to_target(tracts[list(extensive.values())]).set_axis(list(extensive), axis=1),
+        crosswalk.to_target(tracts[list(intensive.values())], weights=tracts['Total Population'],
+                            extensive=False).set_axis(list(intensive), axis=1),
+    ], axis=1)[list(measures)]
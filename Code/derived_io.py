@@ -0,0 +1,64 @@
+# --- READ/WRITE HELPERS FOR THE DERIVED LAYERS ---
+# Derived layers are stored as GeoParquet (columnar, WKB geometry) so readers can pull
+# only the columns they need without parsing the whole file as text. GeoJSON is still
+# produced on request as an export for anyone outside the project.
+import os
+from pathlib import Path
+
+import geopandas as gpd
+
+base_dir = Path(__file__).resolve().parent.parent
+path_cleaned_data = os.path.join(base_dir, 'data', 'derived-data')
+
+
+def layer_path(name, ext='parquet', path_dir=path_cleaned_data):
+    return os.path.join(path_dir, f'{name}.{ext}')
+
+
+def write_layer(gdf, name, path_dir=path_cleaned_data, geojson=False):
+    gdf.to_parquet(layer_path(name, 'parquet', path_dir))
+    if geojson:
+        export_geojson(gdf, name, path_dir)
+
+
+def export_geojson(gdf, name, path_dir=path_cleaned_data):
+    gdf.to_file(layer_path(name, 'geojson', path_dir), driver='GeoJSON')
+
+
+def layer_source(name, path_dir=path_cleaned_data):
+    # The file read_layer would read for `name` (parquet first), or None
+    for ext in ('parquet', 'geojson'):
+        path = layer_path(name, ext, path_dir)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def layer_signature(name, path_dir=path_cleaned_data):
+    # Changes whenever the layer's file is rebuilt; used to invalidate in-memory caches
+    path = layer_source(name, path_dir)
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def read_layer(name, columns=None, path_dir=path_cleaned_data):
+    # `columns` limits the attribute columns read; geometry always comes along.
+    # Falls back to the GeoJSON export when the parquet file hasn't been built yet.
+    parquet_path = layer_path(name, 'parquet', path_dir)
+    if os.path.exists(parquet_path):
+        if columns is not None:
+            columns = list(dict.fromkeys(list(columns) + ['geometry']))
+        return gpd.read_parquet(parquet_path, columns=columns)
+
+    geojson_path = layer_path(name, 'geojson', path_dir)
+    if not os.path.exists(geojson_path):
+        return None
+    gdf = gpd.read_file(geojson_path)
+    # Convert any datetime columns to strings to avoid JSON serialization errors
+    for col in gdf.select_dtypes(include=['datetime', 'datetimetz']).columns:
+        gdf[col] = gdf[col].astype(str)
+    if columns is not None:
+        gdf = gdf[[c for c in columns if c in gdf.columns and c != 'geometry'] + ['geometry']]
+    return gdf
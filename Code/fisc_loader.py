@@ -0,0 +1,84 @@
+# --- TYPED, CACHED FISC LOADER ---
+# The Lincoln Institute FiSC panel (1977-2022, ~200 cities, a few hundred columns) is read
+# from the published csv/xlsx once, cleaned (state/city split out of city_name) and saved
+# as a compact parquet file: integer columns downcast, state/city categorical, rows sorted
+# by year so each year is its own row group. Callers then ask for only the years, cities
+# and columns they need and pyarrow skips everything else on disk.
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+base_dir = Path(__file__).resolve().parent.parent
+path_raw_data = os.path.join(base_dir, 'data', 'raw-data')
+path_cleaned_data = os.path.join(base_dir, 'data', 'derived-data')
+
+FISC_SOURCES = [os.path.join(path_raw_data, 'fisc_data.csv'),
+                os.path.join(path_raw_data, 'FiSC-Full-Dataset-2023-Update.xlsx')]
+# Versioned so caches written with older dtypes (float32 measures) get rebuilt
+FISC_CACHE = os.path.join(path_cleaned_data, 'fisc_v2.parquet')
+
+# Always returned so rows stay identifiable
+KEY_COLUMNS = ['state', 'city', 'year']
+
+
+def _source_path():
+    for path in FISC_SOURCES:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError('FiSC data not found; download it to data/raw-data/fisc_data.csv '
+                            '(see the README for the link)')
+
+
+def read_fisc_source(path):
+    fisc = pd.read_excel(path) if path.endswith('.xlsx') else pd.read_csv(path)
+    fisc[['state', 'city']] = fisc['city_name'].str.split(':', n=1, expand=True)
+    fisc['city'] = fisc['city'].str.strip()
+    fisc['state'] = fisc['state'].str.strip()
+    fisc['city'] = np.where(fisc['state']=='Average for Core FiSCs', fisc['state'], fisc['city'])
+    fisc.drop('city_name', axis=1, inplace=True)
+    cols_to_move = ['state', 'city']
+    return fisc[cols_to_move + [c for c in fisc.columns if c not in cols_to_move]]
+
+
+def compact_dtypes(fisc):
+    # Smallest integer type that fits and categories for repeated labels. Measures stay
+    # float64: they go straight into the regressions, and float32 shifts the estimates
+    for col in fisc.select_dtypes(include='integer').columns:
+        fisc[col] = pd.to_numeric(fisc[col], downcast='integer')
+    for col in ['state', 'city']:
+        fisc[col] = fisc[col].astype('category')
+    return fisc
+
+
+def build_fisc_cache(source=None, path=FISC_CACHE):
+    source = source or _source_path()
+    fisc = compact_dtypes(read_fisc_source(source))
+    fisc = fisc.sort_values(['year', 'state', 'city'], kind='stable').reset_index(drop=True)
+    rows_per_year = int(fisc.groupby('year', observed=True).size().max())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fisc.to_parquet(path, index=False, row_group_size=rows_per_year)
+    return path
+
+
+def load_fisc(years=None, columns=None, cities=None, path=FISC_CACHE):
+    # Rebuilds the cache when it is missing or older than the source file
+    source = next((p for p in FISC_SOURCES if os.path.exists(p)), None)
+    if not os.path.exists(path) or (source and os.path.getmtime(source) > os.path.getmtime(path)):
+        build_fisc_cache(source, path)
+
+    filters = []
+    if years is not None:
+        filters.append(('year', 'in', [int(y) for y in np.atleast_1d(years)]))
+    if cities is not None:
+        filters.append(('city', 'in', list(cities)))
+    if columns is not None:
+        columns = list(dict.fromkeys(KEY_COLUMNS + list(columns)))
+
+    fisc = pd.read_parquet(path, columns=columns, filters=filters or None)
+    # Drop categories filtered out on read
+    for col in ['state', 'city']:
+        if col in fisc.columns:
+            fisc[col] = fisc[col].cat.remove_unused_categories()
+    return fisc
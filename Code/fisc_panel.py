@@ -0,0 +1,87 @@
+# --- MULTI-YEAR FISC PANEL ANALYSIS ---
+# Everything fisc_plots.py does for 2022, but for every year of the 1977-2022 panel at
+# once: the peer-group weighted means and city comparison values come out of one grouped
+# pass, and the consolidation regressions for all years are one batched fit
+# (BatchOLS(by='year')). The trend charts show how St. Louis and Louisville compare to
+# the consolidated/non-consolidated peer groups over time, and how the estimated
+# consolidation effect moves year to year.
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from batch_ols import BatchOLS
+from weighted_stats import weighted_mean
+
+# Summary rows published in the FiSC data that aren't cities
+AGGREGATE_ROWS = ['Average for All Cities', 'Average for Core FiSCs', 'Median for All Cities',
+                  'Median for Core FiSCs', 'Median for Legacy Cities']
+OUTLIERS = ['Washington', 'New York']
+
+COMPARISON_CITIES = ['St. Louis', 'University City', 'Consolidated', 'NonConsolidated',
+                     'Louisville']
+TREND_CITIES = ['St. Louis', 'Louisville', 'Consolidated', 'NonConsolidated']
+
+
+def with_peer_groups(fisc, weight='city_population'):
+    # Appends population-weighted Consolidated/NonConsolidated rows for every year
+    weighted = weighted_mean(fisc, ['year', 'consolidated_govt'], weight).reset_index()
+    weighted['city'] = np.where(weighted['consolidated_govt']==0, 'NonConsolidated', 'Consolidated')
+    return pd.concat([fisc, weighted], ignore_index=True)
+
+
+def regression_sample(fisc, cols):
+    # Cities only (no published averages/medians, no outliers), with log outcomes and
+    # log population added as `<col>_log` and `pop_log`
+    sample = fisc[~fisc['state'].isin(AGGREGATE_ROWS) & fisc['state'].notna()
+                  & ~fisc['city'].isin(OUTLIERS)].copy()
+    # Levels of filtered-out rows would otherwise become all-zero state dummies
+    for col in ['state', 'city']:
+        if isinstance(sample[col].dtype, pd.CategoricalDtype):
+            sample[col] = sample[col].cat.remove_unused_categories()
+    sample[[f'{col}_log' for col in cols]] = np.log(sample[list(cols)].astype(float) + 1) # +1 prevents ln(0) issues
+    sample['pop_log'] = np.log(sample['city_population'].astype(float))
+    return sample
+
+
+def consolidation_effects(fisc, cols, by='year', alpha=0.05):
+    # col_log ~ consolidated_govt + pop_log + C(state), fit for every outcome and every
+    # value of `by` in one batched solve. Same columns as summary_df plus `by`.
+    sample = regression_sample(fisc, cols)
+    log_cols = [f'{col}_log' for col in cols]
+    model = BatchOLS(sample, log_cols, ['consolidated_govt', 'pop_log'], fixed_effects=['state'],
+                     by=by)
+    return model.fit(alpha=alpha).summary('consolidated_govt', labels=dict(zip(log_cols, cols)))
+
+
+def comparison_panel(fisc, metrics, cities=COMPARISON_CITIES):
+    # Long format (year, city, Metric, Value) for the comparison cities and peer groups
+    panel = fisc[fisc['city'].isin(cities)]
+    return panel.melt(id_vars=['year', 'city'], value_vars=list(metrics), var_name='Metric',
+                      value_name='Value')
+
+
+# --- Trend charts ---
+
+def metric_trend_chart(long_df, title):
+    return alt.Chart(long_df).mark_line(point=True).encode(
+        x=alt.X('year:O', title=None),
+        y=alt.Y('Value:Q', title='Per Capita (2022 Dollars)'),
+        color=alt.Color('city:N', title='City'),
+        tooltip=['year', 'city', 'Metric', alt.Tooltip('Value:Q', format=',.0f')]
+    ).properties(width=250, height=180).facet(
+        facet=alt.Facet('Metric:N', title=None), columns=2
+    ).properties(title=title).resolve_scale(y='independent')
+
+
+def effect_trend_chart(effects, title='Consolidation Effect Over Time'):
+    # Layers share the top-level data so the chart can be faceted by outcome
+    base = alt.Chart().encode(x=alt.X('year:O', title=None))
+    band = base.mark_area(opacity=0.3).encode(
+        y=alt.Y('ci_lower:Q', title='Coefficient (Effect of Consolidated Govt)'), y2='ci_upper:Q')
+    line = base.mark_line(point=True, color='black').encode(
+        y='Coeff:Q', tooltip=['year', 'Variable', 'Coeff', 'P>|t|'])
+    zero = alt.Chart().mark_rule(color='red', strokeDash=[5, 5]).encode(y=alt.datum(0))
+    effects = effects[['year', 'Variable', 'Coeff', 'ci_lower', 'ci_upper', 'P>|t|']]
+    return alt.layer(band, line, zero, data=effects).properties(width=250, height=180).facet(
+        facet=alt.Facet('Variable:N', title=None), columns=3
+    ).properties(title=title).resolve_scale(y='independent')
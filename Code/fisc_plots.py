@@ -1,26 +1,29 @@
 # --- 0. Packages and formatting ---
-from os.path import join
+import argparse
 import os
 from pathlib import Path
 import altair as alt
 import pandas as pd
-import numpy as np
-from statsmodels.stats.weightstats import DescrStatsW as dsw
-import statsmodels.formula.api as smf
+from fisc_loader import load_fisc
+from fisc_panel import (COMPARISON_CITIES, TREND_CITIES, comparison_panel, consolidation_effects,
+                        effect_trend_chart, metric_trend_chart, regression_sample, with_peer_groups)
+from batch_ols import BatchOLS
+from resampling import resample
+from render import FORMATS, SpecSizeWarning, path_figures, render_charts
 
 base_dir = Path(__file__).resolve().parent.parent
 path_raw_data = os.path.join(base_dir, 'data', 'raw-data')
 path_cleaned_data = os.path.join(base_dir, 'data', 'derived-data')
 
 # improve graph resolution
-import tempfile
-from IPython.display import SVG, display, Image
+from IPython.display import display, Image
 import vl_convert as vlc
 
 import warnings 
 warnings.filterwarnings('ignore')
+# ...except oversized chart specs, which we want to hear about
+warnings.filterwarnings('default', category=SpecSizeWarning)
 #alt.renderers.enable("png")
-alt.data_transformers.disable_max_rows()
 
 #This function will work with (alt.Chat + alt.Chart) as well
 def display_to_pdf(altchart, scale=2):
@@ -147,49 +150,35 @@ alt.themes.enable('my_theme')
 
 
 # --- 1. Load and alter fisc data for analysis and plotting ---
+# Everything that reads data or builds charts lives in functions called from main(), so
+# importing this file (e.g. the resampling worker processes re-importing the main module)
+# doesn't rerun the analysis.
 
-fisc = pd.read_csv(os.path.join(path_raw_data, 'fisc_data.csv'))
-fisc[['state', 'city']] = fisc['city_name'].str.split(':', n=1, expand=True)
-fisc['city'] = fisc['city'].str.strip()
-fisc['state'] = fisc['state'].str.strip()
-cols_to_move = ['state', 'city']
-new_order = cols_to_move + [c for c in fisc.columns if c not in cols_to_move]
-fisc = fisc[new_order]
-fisc['city'] = np.where(fisc['state']=='Average for Core FiSCs', fisc['state'], fisc['city'])
-fisc.drop('city_name', axis=1, inplace=True)
-
-def get_weighted_means(group: pd.DataFrame):
-    # Don't want the weight column in the calculation
-    numeric_cols = group.select_dtypes(include='number').drop(columns=['city_population'])
-    stats = dsw(numeric_cols, weights=group['city_population'])
-    return pd.Series(stats.mean, index=numeric_cols.columns)
-
-# Apply get_weighted_means to the groupby dataframe
-weighted_fisc_data = fisc.groupby(['year', 'consolidated_govt']).apply(get_weighted_means).drop(columns=['consolidated_govt', 'year']).reset_index()
-weighted_fisc_data['city'] = np.where(weighted_fisc_data['consolidated_govt']==0,
-                                      'NonConsolidated', 'Consolidated')
-fisc = pd.concat([fisc, weighted_fisc_data])
-fisc
+def load_comparison_data():
+    # The loader caches the cleaned panel as parquet (state/city split out, compact dtypes)
+    # and only reads the years asked for; everything below uses 2022. Population-weighted
+    # means per (year, consolidated_govt) are appended as 'Consolidated'/'NonConsolidated' rows
+    return with_peer_groups(load_fisc(years=[2022]))
 
 
 
 # --- 2. SET UP TO PLOT COMPAREABLE CITIES ---
 
-# Craft subset data for plotting
-cities =  fisc = fisc[fisc['year']==2022]
-cities = fisc[fisc['city'].isin(['St. Louis', 'University City', 'Consolidated',
-                                 'NonConsolidated', 'Louisville'])]
-cities_subset = pd.concat([
-    cities.loc[:, 'state':'cpi'], 
-    cities.loc[:, 'rev_general':'consolidated_govt']
-], axis=1)
+rename_dict = {'taxes': 'All Taxes',
+               'tax_property':'Property Tax',
+               'igr_federal':'Federal Transfers',
+               'charges':'Charges', 'police':'Police',
+               'fire':'Fire', 'public_safety':'Public Safety',
+               'administration':'Administration',
+               'spending_utility':'Utility Spending',
+               'debt_outstanding':'Outstanding Debt',
+               'spending_general':'General Spending'}
 
 # Plot metrics on x-axis across cities of interest
 def plot_fisc_comparison(df: pd.DataFrame, columns: list, title: str):
-    base = alt.Chart(df).transform_fold(
-        columns,
-        as_=['Metric', 'Value']
-    ).mark_bar().encode(
+    # Melt to long format here so the spec only embeds the city and the plotted metrics
+    long_df = df[['city'] + columns].melt(id_vars='city', var_name='Metric', value_name='Value')
+    base = alt.Chart(long_df).mark_bar().encode(
         x=alt.X('Metric:N', title=None, sort=columns, axis=alt.Axis(labelAngle=0)),
         y=alt.Y('Value:Q', title='2022 Dollars'),
         color=alt.Color('city:N', title='City'),
@@ -217,67 +206,36 @@ def plot_fisc_comparison(df: pd.DataFrame, columns: list, title: str):
     
     return chart
 
-rename_dict = {'taxes': 'All Taxes',
-               'tax_property':'Property Tax',
-               'igr_federal':'Federal Transfers',
-               'charges':'Charges', 'police':'Police',
-               'fire':'Fire', 'public_safety':'Public Safety',
-               'administration':'Administration',
-               'spending_utility':'Utility Spending',
-               'debt_outstanding':'Outstanding Debt',
-               'spending_general':'General Spending'}
-cities_subset.rename(columns=rename_dict, inplace=True)
+def comparison_charts(fisc):
+    # Craft subset data for plotting
+    fisc_year = fisc[fisc['year']==2022]
+    cities = fisc_year[fisc_year['city'].isin(COMPARISON_CITIES)]
+    cities_subset = pd.concat([
+        cities.loc[:, 'state':'cpi'], 
+        cities.loc[:, 'rev_general':'consolidated_govt']
+    ], axis=1)
+    cities_subset = cities_subset.rename(columns=rename_dict)
 
-# Comparison of various revenue sources
-revenue_metrics = ['All Taxes', 'Property Tax', 'Federal Transfers', 'Charges']
-revenue_chart = plot_fisc_comparison(cities_subset, revenue_metrics, 'Per Capita Revenue Sources (2022)')
-
-# Comparison of spending categories
-spending_metrics = ['Police', 'Fire', 'Administration', 'Utility Spending']
-spending_chart = plot_fisc_comparison(cities_subset, spending_metrics, 'Per Capita Spending Categories (2022)')
-
-# Broad comparison
-general_comp = plot_fisc_comparison(cities_subset, ['Outstanding Debt', 'General Spending'], 'Debt vs General Spending (2022)')
+    return {
+        # Comparison of various revenue sources
+        'revenue_chart': plot_fisc_comparison(cities_subset, ['All Taxes', 'Property Tax', 'Federal Transfers', 'Charges'],
+                                              'Per Capita Revenue Sources (2022)'),
+        # Comparison of spending categories
+        'spending_chart': plot_fisc_comparison(cities_subset, ['Police', 'Fire', 'Administration', 'Utility Spending'],
+                                               'Per Capita Spending Categories (2022)'),
+        # Broad comparison
+        'general_comp': plot_fisc_comparison(cities_subset, ['Outstanding Debt', 'General Spending'],
+                                             'Debt vs General Spending (2022)'),
+    }
 
 
 
 #--- 3. SET UP STATS EXPRESSION FOR CONSOLIDATED CITIES ---
 
-fisc_2022 = fisc[fisc['year']==2022]
-fisc_2022 = fisc_2022[~fisc_2022['state'].isin(['Average for All Cities','Average for Core FiSCs',
-                                               'Median for All Cities', 'Median for Core FiSCs',
-                                               'Median for Legacy Cities'])]
-fisc_2022 = fisc_2022[~fisc_2022['state'].isna()]
-outliers = ['Washington', 'New York']
-fisc_2022 = fisc_2022[~fisc_2022['city'].isin(outliers)]
-
-
 cols_interest = ['debt_outstanding', 'taxes', 'tax_property', 'igr_federal', 'charges',
                  'rev_utility','spending_general', 'public_safety', 'police', 'fire',
                  'administration', 'spending_utility']
-
-summary_df = []
-for col in cols_interest:
-    # Transform to log to better capture relationships
-    fisc_2022[f'{col}_log'] = np.log(fisc_2022[col] + 1) # +1 prevents ln(0) issues
-    fisc_2022['pop_log'] = np.log(fisc_2022['city_population'])
-    
-    # Naive model
-    formula = f'{col}_log ~ consolidated_govt + pop_log + C(state)'
-    model = smf.ols(formula, data=fisc_2022).fit()
-    ci = model.conf_int(alpha=0.05)
-
-    summary_df.append({
-    'Variable': col,
-    'Coeff': model.params['consolidated_govt'],
-    'Standard Error': model.bse['consolidated_govt'],
-    't-score': model.tvalues['consolidated_govt'],
-    'P>|t|': model.pvalues['consolidated_govt'],
-    'ci_lower': ci.loc['consolidated_govt', 0],
-    'ci_upper': ci.loc['consolidated_govt', 1]
-    })
-
-summary_df = pd.DataFrame(summary_df).sort_values('P>|t|')
+log_cols = [f'{col}_log' for col in cols_interest]
 
 # Map to make plot names pretty
 label_map = {
@@ -293,47 +251,110 @@ label_map = {
     'fire': 'Fire Protection Spending',
     'administration': 'Government Administration Spending',
     'spending_utility': 'Utility Expenditure'}
-summary_df['Label'] = summary_df['Variable'].replace(label_map)
-
-# Plot layering
-base = alt.Chart(summary_df).encode(
-    y=alt.Y('Label:N', sort='-x', title='Financial Category'))
-error_bars = base.mark_rule().encode(
-    x=alt.X('ci_lower:Q', title='Coefficient (Effect of Consolidated Govt)'),
-    x2='ci_upper:Q')
-points = base.mark_point(filled=True, size=100, color='black').encode(
-    x=alt.X('Coeff:Q'),
-    tooltip=['Label', 'Coeff', 'P>|t|'] ) # For HTML
-zero_line = alt.Chart(pd.DataFrame({'x': [0]})).mark_rule( # Shows statistical significance
-    color='red', 
-    strokeDash=[5, 5],
-    strokeWidth=3).encode(
-    x='x:Q')
-footer = alt.Chart({'values': [{}]}).mark_text(
-        align="right",
-        baseline="top",
-        fontSize=10,
-        text="Source: 2022 Lincoln Institute Fiscally Standardized Cities Data",
-        clip=False
-    ).encode(
-        x=alt.value(125), 
-        y=alt.value(450))
-
-coef_plot = (zero_line + error_bars + points + footer).properties(
-    title='Impact of Consolidated Government on Municipal Finance Categories',
-    width=600,
-    height=400).configure_axis(
-    labelFontSize=12,
-    titleFontSize=14).configure_title(
-    fontSize=16,
-    anchor='middle')
-
-
-
-# --- 4. DISPLAY PLOTS ---
-
-display_to_pdf(revenue_chart)
-display_to_pdf(spending_chart)
-display_to_pdf(general_comp)
-display_to_pdf(coef_plot)
 
+def consolidation_regressions(fisc):
+    # Cities only (published averages/medians and outliers dropped), with the outcomes
+    # transformed to log to better capture relationships
+    fisc_2022 = regression_sample(fisc[fisc['year']==2022], cols_interest)
+
+    # Naive model (col_log ~ consolidated_govt + pop_log + C(state)) for every outcome at once.
+    # The design matrix is built and factorized once and all twelve outcomes are solved together.
+    model = BatchOLS(fisc_2022, log_cols, ['consolidated_govt', 'pop_log'], fixed_effects=['state'])
+    summary_df = model.fit(alpha=0.05).summary('consolidated_govt', labels=dict(zip(log_cols, cols_interest)))
+    summary_df = summary_df.sort_values('P>|t|')
+    summary_df['Label'] = summary_df['Variable'].replace(label_map)
+    return fisc_2022, summary_df
+
+def coefficient_chart(summary_df):
+    # Plot layering (only the columns the chart uses go into the spec)
+    base = alt.Chart(summary_df[['Label', 'Coeff', 'ci_lower', 'ci_upper', 'P>|t|']]).encode(
+        y=alt.Y('Label:N', sort='-x', title='Financial Category'))
+    error_bars = base.mark_rule().encode(
+        x=alt.X('ci_lower:Q', title='Coefficient (Effect of Consolidated Govt)'),
+        x2='ci_upper:Q')
+    points = base.mark_point(filled=True, size=100, color='black').encode(
+        x=alt.X('Coeff:Q'),
+        tooltip=['Label', 'Coeff', 'P>|t|'] ) # For HTML
+    zero_line = alt.Chart(pd.DataFrame({'x': [0]})).mark_rule( # Shows statistical significance
+        color='red', 
+        strokeDash=[5, 5],
+        strokeWidth=3).encode(
+        x='x:Q')
+    footer = alt.Chart({'values': [{}]}).mark_text(
+            align="right",
+            baseline="top",
+            fontSize=10,
+            text="Source: 2022 Lincoln Institute Fiscally Standardized Cities Data",
+            clip=False
+        ).encode(
+            x=alt.value(125), 
+            y=alt.value(450))
+
+    return (zero_line + error_bars + points + footer).properties(
+        title='Impact of Consolidated Government on Municipal Finance Categories',
+        width=600,
+        height=400).configure_axis(
+        labelFontSize=12,
+        titleFontSize=14).configure_title(
+        fontSize=16,
+        anchor='middle')
+
+
+
+# --- 4. DISPLAY AND EXPORT PLOTS ---
+# parse_known_args lets this still run inside IPython/Quarto.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='FiSC comparison plots and consolidation regressions.')
+    parser.add_argument('--resample', type=int, default=0, metavar='N',
+                        help='also run N bootstrap and N permutation replicates (cached on disk)')
+    parser.add_argument('--workers', type=int, default=None, help='resampling worker processes')
+    parser.add_argument('--panel', action='store_true',
+                        help='also run the 1977-2022 panel: trends and per-year consolidation effects')
+    parser.add_argument('--out', default=path_figures, help='directory the figures are written to')
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=FORMATS)
+    parser.add_argument('--force', action='store_true', help='re-render charts even if unchanged')
+    args, _ = parser.parse_known_args(argv)
+
+    fisc = load_comparison_data()
+    fisc_2022, summary_df = consolidation_regressions(fisc)
+    charts = comparison_charts(fisc)
+    charts['coef_plot'] = coefficient_chart(summary_df)
+
+    if args.resample:
+        resampled = resample(fisc_2022, log_cols, ['consolidated_govt', 'pop_log'],
+                             fixed_effects=['state'], n_boot=args.resample, n_perm=args.resample,
+                             workers=args.workers, labels=dict(zip(log_cols, cols_interest)))
+        print(resampled.merge(summary_df[['Variable', 'ci_lower', 'ci_upper', 'P>|t|']], on='Variable')
+              .sort_values('Permutation p').to_string(index=False))
+
+    # --- 5. PANEL MODE ---
+    if args.panel:
+        panel = with_peer_groups(load_fisc())
+        revenue_trend = metric_trend_chart(comparison_panel(panel, ['taxes', 'tax_property',
+                                                                    'igr_federal', 'charges'],
+                                                            TREND_CITIES).replace(rename_dict),
+                                           'Per Capita Revenue Sources Over Time')
+        spending_trend = metric_trend_chart(comparison_panel(panel, ['police', 'fire',
+                                                                     'administration', 'spending_utility'],
+                                                             TREND_CITIES).replace(rename_dict),
+                                            'Per Capita Spending Categories Over Time')
+        # Every year's regressions in one batched fit
+        effects = consolidation_effects(panel, cols_interest)
+        effects['Variable'] = effects['Variable'].replace(label_map)
+        print(effects.to_string(index=False))
+
+        charts.update({'revenue_trend': revenue_trend, 'spending_trend': spending_trend,
+                       'effect_trend': effect_trend_chart(effects)})
+
+    # Write every chart to disk (unchanged ones are skipped), and show them inline when
+    # running inside IPython/Quarto
+    render_charts(charts, args.out, args.formats, force=args.force)
+    from IPython import get_ipython
+    if get_ipython() is not None:
+        for chart in charts.values():
+            display_to_pdf(chart)
+    return charts
+
+
+if __name__ == '__main__':
+    main()
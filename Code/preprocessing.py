@@ -1,38 +1,49 @@
 # --- 0. PACKAGES AND SETUP ---
+import argparse
 import pandas as pd
 import numpy as np
 import os
 from pathlib import Path
 import geopandas as gpd
 import censusdata
-from census import Census
+
+from build_graph import BuildGraph
+from derived_io import export_geojson, layer_path, read_layer, write_layer
+from simplify import SIMPLIFIED_LAYERS, LEVELS, layer_name, simplified_levels
+from vector_tiles import TILE_LAYERS, build_mbtiles
+from spatial_index import INDEXED_LAYERS, SpatialIndex, index_path, tract_service_coverage
+from topology import Topology, dissolve
+from transit_access import TRANSIT_LAYERS, transit_access
+from crosswalk import CROSSWALKS, Crosswalk, crosswalk_name
+from boundary_engine import (DEFAULT_DENSITY_THRESHOLD, MANUAL_EXCLUDE, MANUAL_INCLUDE,
+                             BoundaryEngine)
+from boundary_metrics import BoundaryMetrics
+from redistricting import CANDIDATE_SEARCH, candidate_layer, search
+from census_client import ACS_YEAR, CensusClient
 
 base_dir = Path(__file__).resolve().parent.parent
 path_raw_data = os.path.join(base_dir, 'data', 'raw-data')
 path_cleaned_data = os.path.join(base_dir, 'data', 'derived-data')
 
-# The below code will take the .shp and its dependencies to convert to a more usable .geojson file type. 
-o_data = gpd.read_file(os.path.join(path_raw_data, 'census_tracts.shp'))
-stl_tracts = o_data[(o_data['NAMELSADCO']=='St. Louis County') | (o_data['NAMELSADCO']=='St. Louis city')]
-stl_tracts = gpd.GeoDataFrame(stl_tracts).set_crs('EPSG:4326')
-stl_tracts.to_file(os.path.join(path_cleaned_data, 'stl_tracts.geojson'), driver='GeoJSON')
-
-
-
-# Below, I am processing the converted files and preparing them for later merging. 
-# The last line takes the city and county demogrpahics, concatinating into one dataset 
-# for easier manipulation.
-stl_tracts = gpd.read_file(os.path.join(path_cleaned_data, 'stl_tracts.geojson'))
-stl_tracts = gpd.GeoDataFrame(stl_tracts[['COUNTYFP', 'NAME', 'NAMELSADCO', 'ALAND',
-                                          'AWATER', 'geometry']])
+def raw(filename):
+    return os.path.join(path_raw_data, filename)
 
+def derived(filename):
+    return os.path.join(path_cleaned_data, filename)
 
+# Derived layers are written as GeoParquet; see derived_io.py
+def layer(name):
+    return layer_path(name, 'parquet', path_cleaned_data)
 
-# --- 1. PULL CENSUS DATA AND CLEAN ---
+# Each section below is a named target with declared inputs and outputs. Running the
+# script only rebuilds the targets whose inputs (or code) changed since the last run;
+# the hashes live in data/derived-data/.build_state.json.
+graph = BuildGraph(base_dir, derived('.build_state.json'))
 
-# 1. To run this code replace the below code with your API key
+# 1. To run the census pull replace the below code with your API key (or set
+# CENSUS_API_KEY). Responses are cached in data/raw-data/census_cache, so repeat
+# runs work offline.
 my_census_api = ''
-c = Census(my_census_api)
 
 # 2. Define the exact variables we need
 variables = (
@@ -57,294 +68,497 @@ variables = (
 less_than_hs_vars = [f'B15003_{str(i).zfill(3)}E' for i in range(2, 17)]
 variables = variables + tuple(less_than_hs_vars)
 
-# 3. Pull the data for all tracts in a specific state (e.g., Illinois FIPS is '17', Cook County is '031')
-# To get all states, you would loop through state FIPS codes.
-stlc = pd.DataFrame(c.acs5.state_county_tract(variables, state_fips='29',
-                                 county_fips='189', tract='*'))
-stl = pd.DataFrame(c.acs5.state_county_tract(variables,state_fips='29',
-                                              county_fips='510', tract='*'))
+# St. Louis County and St. Louis city. census_client.STL_MSA_COUNTIES has the full MSA.
+census_counties = [('29', '189'), ('29', '510')]
+census_years = [ACS_YEAR]
 
-# 4. Convert to a Pandas DataFrame
-df = pd.concat([stl, stlc])
 
-# 5. Calculate your specific requested columns
-df['Less than High School'] = df[less_than_hs_vars].sum(axis=1) / df['B15003_001E']
-df['High School'] = (df['B15003_017E'] + df['B15003_018E']) / df['B15003_001E']
-df["Associate's Degree"] = df['B15003_021E'] / df['B15003_001E']
-df["Bachelor's Degree"] = df['B15003_022E'] / df['B15003_001E']
-df["Master's Degree or Higher"] = (df['B15003_023E'] + df['B15003_024E'] + df['B15003_025E']) / df['B15003_001E']
 
-df['Proportion White'] = df['B02001_002E'] / df['B02001_001E']
-df['Proportion Black'] = df['B02001_003E'] / df['B02001_001E']
-df['Proportion All Other Races'] = (df['B02001_001E'] - df['B02001_002E'] - df['B02001_003E']) / df['B02001_001E']
+# --- 1a. TRACT EXTRACTION ---
 
-df['Home Ownership Rate'] = df['B25003_002E'] / df['B25003_001E']
+# The below code will take the .shp and its dependencies to convert to a more usable GeoParquet file type.
+@graph.target('tracts',
+              inputs=[raw('census_tracts.shp'), raw('census_tracts.dbf'), raw('census_tracts.shx')],
+              outputs=[layer('stl_tracts')])
+def build_tracts():
+    o_data = gpd.read_file(raw('census_tracts.shp'))
+    stl_tracts = o_data[(o_data['NAMELSADCO']=='St. Louis County') | (o_data['NAMELSADCO']=='St. Louis city')]
+    stl_tracts = gpd.GeoDataFrame(stl_tracts).set_crs('EPSG:4326')
+    write_layer(stl_tracts, 'stl_tracts')
 
-# 6. Rename the straight-pull columns to match your desired output
-df = df.rename(columns={
-    'B01003_001E': 'Total Population',
-    'B19013_001E': 'Median HHI',
-    'B19013A_001E': 'Median HHI White',
-    'B19013B_001E': 'Median HHI Black'
-})
 
-# 7. Keep ONLY your desired columns
-final_columns = [
-    'NAME', 'Total Population', 'Median HHI', 'Median HHI White', 'Median HHI Black',
-    'Less than High School', 'High School', "Associate's Degree", "Bachelor's Degree", 
-    "Master's Degree or Higher", 'Proportion White', 'Proportion Black', 
-    'Proportion All Other Races', 'Home Ownership Rate'
-]
 
-final_df = df[final_columns]
+# --- 1b. PULL CENSUS DATA AND CLEAN ---
 
-census_nulls = [
-    -666666666, '-666666666', -666666666.0,
-    -888888888, '-888888888', -888888888.0,
-    -999999999, '-999999999', -999999999.0
-]
-final_df = final_df.replace(census_nulls, np.nan)
+# The census pull has no file inputs, so it only reruns when the variable list or
+# counties change, when its output is missing, or when forced with `--force census`.
+@graph.target('census',
+              outputs=[derived('census_acs.csv')],
+              params={'variables': variables, 'counties': census_counties,
+                      'years': census_years})
+def build_census():
+    c = CensusClient(my_census_api)
 
-final_df['NAME'] = final_df['NAME'].str.extract(r'Census Tract ([\d\.]+)')
+    # 3. Pull the data for all tracts in each county (Missouri FIPS is '29'). Counties
+    # and years are fetched concurrently and come back as one DataFrame.
+    df = c.tracts(variables, census_counties, years=census_years)
 
-# Export to CSV if you would like, not required for project workflow
-#final_df.to_csv(os.path.join(path_raw_data, 'clean_census_tracts.csv'), index=False)
+    # 4. Calculate your specific requested columns
+    df['Less than High School'] = df[less_than_hs_vars].sum(axis=1) / df['B15003_001E']
+    df['High School'] = (df['B15003_017E'] + df['B15003_018E']) / df['B15003_001E']
+    df["Associate's Degree"] = df['B15003_021E'] / df['B15003_001E']
+    df["Bachelor's Degree"] = df['B15003_022E'] / df['B15003_001E']
+    df["Master's Degree or Higher"] = (df['B15003_023E'] + df['B15003_024E'] + df['B15003_025E']) / df['B15003_001E']
 
+    df['Proportion White'] = df['B02001_002E'] / df['B02001_001E']
+    df['Proportion Black'] = df['B02001_003E'] / df['B02001_001E']
+    df['Proportion All Other Races'] = (df['B02001_001E'] - df['B02001_002E'] - df['B02001_003E']) / df['B02001_001E']
 
+    df['Home Ownership Rate'] = df['B25003_002E'] / df['B25003_001E']
 
-# --- 2. MERGE DEMOGRAPHIC AND SHAPE DATA ---
+    # 5. Rename the straight-pull columns to match your desired output
+    df = df.rename(columns={
+        'B01003_001E': 'Total Population',
+        'B19013_001E': 'Median HHI',
+        'B19013A_001E': 'Median HHI White',
+        'B19013B_001E': 'Median HHI Black'
+    })
 
-# Here I am taking the combined demo data and merging it with the geographic data to
-# prepare a dataset for later mapping with GeoPandas.
-
-stl_tracts = stl_tracts.merge(final_df, on='NAME')
-stl_tracts.rename({'NAME':'TRACT', 'NAMELSADCO':'COUNTY'}, axis=1, inplace=True)
-stl_tracts['AREA'] = stl_tracts['ALAND'] + stl_tracts['AWATER']
-stl_tracts['SQMI'] = stl_tracts['AREA']*3.8610215854245E-7
-stl_tracts['DENSITY'] = round(stl_tracts['Total Population']/stl_tracts['SQMI'])
-
-# Here I am discerning the boundries of the proposed new city, which requires some 
-# mannual tuning for geographic considerations.
-# Density selection
-stl_select = stl_tracts[(stl_tracts['COUNTY']=='St. Louis city') | (stl_tracts['DENSITY']>=3600)]
-
-# Remove tracts for compactness
-non_cont_tracts = ['2215.06', '2179.44', '2179.23', '2179.31', '2179.42', '2181.05', '2214.25',
-                   '2180.16', '2115.45', '2115.46', '2150.05', '2132.04', '2149.02', '2146.01',
-                   '2146.02', '2144', '2135', '2134.01', '2134.02', '2133.02', '2148', '2116',
-                   '2111.01', '2110.02', '2110.01', '2109.25', '2109.26', '2109.28', '2109.24',
-                   '2109.23', '2113.01', '2113.31', '2113.32', '2151.45', '2151.46', '2147',
-                   '2107.04', '2184.01', '2151.02', '2118.01']
-
-# #Add tracts for contiguity
-add_tracts = ['2201.02','2206.01', '2206.02', '2203', '2197','2207.01', '2208.01', '2192', '2193',
-              '2213.37', '2213.37', '2204.50', '2204.42', '2186', '2219', '2189.01', '2173',
-              '2166', '2139', '2141', '2104', '2120.02', '2118.01', '2202', '2124']
-
-stl_select = stl_select[~stl_select['TRACT'].isin(non_cont_tracts)]
-stl_select = pd.concat([stl_tracts[stl_tracts['TRACT'].isin(add_tracts)], stl_select],
-                       ignore_index=True)
-stl_select.drop_duplicates(inplace=True)
-
-# Basic calculations for verification
-print(stl_select['Total Population'].sum())
-print(stl_select['SQMI'].sum())
-print(stl_select['Total Population'].sum()/stl_select['SQMI'].sum())
-
-# Here I dissolve the cencus tracts for visual presentation purposes, removing internal
-# tract boarders.
-newstl = stl_select.copy()
-newstl['DISID'] = 1
-newstl = newstl.dissolve(by='DISID', aggfunc={'Total Population':'sum', 'SQMI':'sum'})
-newstl['DENSITY'] = round(newstl['Total Population']/newstl['SQMI'])
-newstl['NAME'] = 'New St. Louis'
-print(newstl)
-
-# New County all in
-county_all = stl_tracts.copy()
-county_all['DISID'] = 1
-county_all = county_all.dissolve(by='DISID', aggfunc={'Total Population':'sum', 'SQMI':'sum'})
-county_all['NAME'] = 'New Combined St. Louis County'
-
-# New St. Louis County (minus the new city)
-newstl_tracts = stl_select['TRACT']
-newcounty = stl_tracts[~stl_tracts['TRACT'].isin(newstl_tracts)]
-newcounty = newcounty.dissolve(by='COUNTY', aggfunc={'Total Population':'sum', 'SQMI':'sum'})
-newcounty['NAME'] = 'St. Louis County (without STL)'
+    # 6. Keep ONLY your desired columns
+    final_columns = [
+        'NAME', 'Total Population', 'Median HHI', 'Median HHI White', 'Median HHI Black',
+        'Less than High School', 'High School', "Associate's Degree", "Bachelor's Degree",
+        "Master's Degree or Higher", 'Proportion White', 'Proportion Black',
+        'Proportion All Other Races', 'Home Ownership Rate'
+    ]
 
+    final_df = df[final_columns]
 
+    census_nulls = [
+        -666666666, '-666666666', -666666666.0,
+        -888888888, '-888888888', -888888888.0,
+        -999999999, '-999999999', -999999999.0
+    ]
+    final_df = final_df.replace(census_nulls, np.nan)
 
-# --- 2a. Municipality level data ---
+    final_df['NAME'] = final_df['NAME'].str.extract(r'Census Tract ([\d\.]+)')
 
-stl_munis = gpd.read_file(os.path.join(path_raw_data,
-                                       'Municipal_Boundaries.geojson'))
-stl_munis['last_edited_date'] = stl_munis['last_edited_date'].astype(str)
-stl_munis['MUNICIPALITY'] = stl_munis['MUNICIPALITY'].str.title()
-stl_munis.rename(columns={'MUNICIPALITY': 'Municipality'}, inplace=True)
-stl_munis = stl_munis[stl_munis['Municipality']!='Unincorporated']
-
-muni_fin = pd.read_csv(os.path.join(path_raw_data,'muni_finances_merged.csv'))
-muni_fin.drop(columns='Population', inplace=True)
-muni_gov = pd.read_csv(os.path.join(path_raw_data,'muni_governance_merged.csv'))
-muni_data = muni_fin.merge(muni_gov, on='Municipality')
-muni_data['Municipality'].replace(['Saint Ann', 'Saint John'], ['St Ann', 'St John'],
-                                  inplace=True)
-
-munis_merged = stl_munis.merge(muni_data, on='Municipality', how='right')
-munis_merged[munis_merged['geometry']==None]
-
-# Manually add the missing geometry
-current_city_geom = stl_tracts[stl_tracts['COUNTY'] == 'St. Louis city'].dissolve().geometry.iloc[0]
-current_county_geom = stl_tracts[stl_tracts['COUNTY'] == 'St. Louis County'].dissolve().geometry.iloc[0]
-
-# Calculate incorporated union to find unincorporated area
-incorporated_union = stl_munis.unary_union
-unincorporated_geom = current_county_geom.difference(incorporated_union)
-
-munis_merged.loc[munis_merged['Municipality'] == 'STL County', 'geometry'] = unincorporated_geom
-munis_merged.loc[munis_merged['Municipality'] == 'Saint Louis City', 'geometry'] = current_city_geom
-munis_merged.drop(columns='last_edited_date', inplace=True)
-
-# Ensure it's a GeoDataFrame before renaming/saving
-munis_merged = gpd.GeoDataFrame(munis_merged, crs='EPSG:4326')
-
-# Rename columns for human readability
-rename_dict = {
-    'Year_Inc': 'Year Incorporated',
-    'Total_Rev': 'Total Revenue',
-    'Sales_Tax_Rev': 'Sales Tax Revenue',
-    'Property_Tax_Rev': 'Property Tax Revenue',
-    'Utility_Tax_Rev': 'Utility Tax Revenue',
-    'Court_Fines_Rev': 'Court Fines Revenue',
-    'Total_Exp': 'Total Expenditures',
-    'Top_Exp_Type': 'Top Expenditure Type',
-    'Median_HH_Inc': 'Median Household Income',
-    'Poverty_Rate': 'Poverty Rate',
-    'HS_Grad_Rate': 'HS Graduation Rate',
-    'Median_House_Value': 'Median House Value',
-    'Housing_Units': 'Housing Units',
-    'Percent_White': 'Percent White',
-    'Percent_Black': 'Percent Black',
-    'Percent_Asian': 'Percent Asian',
-    'Percent_Hispanic': 'Percent Hispanic',
-    'Total_Elected_Officials': 'Total Elected Officials',
-    'Aldermen_Count': 'Aldermen Count',
-    'Total_Aldermen_Pay': 'Total Aldermen Pay',
-    'Mayor_Pay': 'Mayor Pay',
-    'Admin_Position': 'Admin Position',
-    'Admin_Pay': 'Admin Pay',
-    'Sum_Total_Payroll': 'Sum Total Payroll',
-    'Per_Capita_Admin_Cost': 'Per Capita Admin Cost'
-}
-munis_merged.rename(columns=rename_dict, inplace=True)
-
-munis_merged['Year Incorporated'] = np.where(munis_merged['Municipality']=='STL County', 1812, munis_merged['Year Incorporated'])
-munis_merged['Year Incorporated'] = np.where(munis_merged['Municipality']=='Green Park', 1995, munis_merged['Year Incorporated'])
-
-# Craft per capita metrics
-# List of columns to calculate per capita and winsorize
-pc_cols = ['Total Revenue', 'Sales Tax Revenue', 'Property Tax Revenue', 
-           'Utility Tax Revenue', 'Court Fines Revenue', 'Total Expenditures',
-           'Total Elected Officials']
-
-# Ensure population is numeric and handle zeros to avoid division error
-munis_merged['Population'] = pd.to_numeric(munis_merged['Population'], errors='coerce')
-pop_safe = munis_merged['Population'].replace(0, np.nan)
-
-# Loop through to get new values
-for col in pc_cols:
-    # Ensure column is numeric (handle potential string/comma issues)
-    if munis_merged[col].dtype == 'object':
-        munis_merged[col] = pd.to_numeric(munis_merged[col].astype(str).str.replace(',', ''), errors='coerce')
-
-    if col == 'Total Elected Officials':
-        pc_name = 'Elected Officials Per 50,000 People'
-        wins_name = 'Elected Officials Per 50,000 People (winsorized)'
-        # Calculate Per 50,000
-        munis_merged[pc_name] = (munis_merged[col] / pop_safe) * 50000
-    else:
-        pc_name = f'{col} Per Capita'
-        wins_name = f'{col} Per Capita (winsorized)'
-        # Calculate Per Capita
-        munis_merged[pc_name] = munis_merged[col] / pop_safe
+    # Stored as an intermediate so downstream stages don't need the API
+    final_df.to_csv(derived('census_acs.csv'), index=False)
 
-    # Calculate Winsorized version 
-    upper = munis_merged[pc_name].quantile(0.90)
-    munis_merged[wins_name] = munis_merged[pc_name].clip(upper=upper)
 
-munis_merged['Per Capita Admin Cost (winsorized)'] = munis_merged['Per Capita Admin Cost'].clip(upper=munis_merged['Per Capita Admin Cost'].quantile(0.95))  
 
+# --- 2. MERGE DEMOGRAPHIC AND SHAPE DATA ---
 
+@graph.target('newstl',
+              inputs=[layer('stl_tracts'), derived('census_acs.csv')],
+              outputs=[layer('all_tracts'), layer('newstl_tracts'),
+                       layer('newstl_dis'), layer('county_minus_newstl'),
+                       layer('county_plus_newstl'), layer('cur_city_dis'),
+                       index_path('boundary_engine')])
+def build_newstl():
+    # Below, I am processing the converted files and preparing them for later merging.
+    stl_tracts = read_layer('stl_tracts')
+    stl_tracts = gpd.GeoDataFrame(stl_tracts[['COUNTYFP', 'NAME', 'NAMELSADCO', 'ALAND',
+                                              'AWATER', 'geometry']])
+    # Tract names like '1001.10' must stay strings for the merge
+    final_df = pd.read_csv(derived('census_acs.csv'), dtype={'NAME': str})
+
+    # Here I am taking the combined demo data and merging it with the geographic data to
+    # prepare a dataset for later mapping with GeoPandas.
+    stl_tracts = stl_tracts.merge(final_df, on='NAME')
+    stl_tracts.rename({'NAME':'TRACT', 'NAMELSADCO':'COUNTY'}, axis=1, inplace=True)
+    stl_tracts['AREA'] = stl_tracts['ALAND'] + stl_tracts['AWATER']
+    stl_tracts['SQMI'] = stl_tracts['AREA']*3.8610215854245E-7
+    stl_tracts['DENSITY'] = round(stl_tracts['Total Population']/stl_tracts['SQMI'])
+
+    # Here I am discerning the boundries of the proposed new city. The boundary engine
+    # selects the city plus tracts at or above the density threshold, keeps only what is
+    # contiguous with the city and fills enclosed holes. The manual lists in
+    # boundary_engine.py carry the remaining compactness tuning.
+    engine = BoundaryEngine(stl_tracts)
+    engine.save(index_path('boundary_engine'))
+    new_city = engine.select(DEFAULT_DENSITY_THRESHOLD, include=MANUAL_INCLUDE,
+                             exclude=MANUAL_EXCLUDE)
+    stl_select = stl_tracts[new_city]
+
+    # Basic calculations for verification, plus how compact and contiguous the proposal
+    # is next to the current city (see boundary_metrics.py)
+    print(stl_select['Total Population'].sum())
+    print(stl_select['SQMI'].sum())
+    print(stl_select['Total Population'].sum()/stl_select['SQMI'].sum())
+    metrics = BoundaryMetrics(engine).measure(np.vstack([new_city, engine.is_city]))
+    print(metrics.set_axis(['New St. Louis', 'Current city']).T)
+
+    # Here I dissolve the cencus tracts for visual presentation purposes, removing internal
+    # tract boarders. The tract topology is built once and reused for every dissolve below,
+    # which just drops the shared edges instead of unioning polygons.
+    topology = engine.topology
+    newstl = stl_select.copy()
+    newstl['DISID'] = 1
+    newstl = dissolve(newstl, by='DISID', aggfunc={'Total Population':'sum', 'SQMI':'sum'},
+                      topology=topology)
+    newstl['DENSITY'] = round(newstl['Total Population']/newstl['SQMI'])
+    newstl['NAME'] = 'New St. Louis'
+    print(newstl)
+
+    # New County all in
+    county_all = stl_tracts.copy()
+    county_all['DISID'] = 1
+    county_all = dissolve(county_all, by='DISID', aggfunc={'Total Population':'sum', 'SQMI':'sum'},
+                          topology=topology)
+    county_all['NAME'] = 'New Combined St. Louis County'
+
+    # Current city boundary, saved so the dashboard doesn't dissolve it on startup
+    cur_city = stl_tracts[stl_tracts['COUNTY'] == 'St. Louis city'].copy()
+    cur_city['DISID'] = 1
+    cur_city = dissolve(cur_city, by='DISID', aggfunc={'Total Population':'sum', 'SQMI':'sum'},
+                        topology=topology)
+    cur_city['NAME'] = 'St. Louis City'
+
+    # New St. Louis County (minus the new city)
+    newstl_tracts = stl_select['TRACT']
+    newcounty = stl_tracts[~stl_tracts['TRACT'].isin(newstl_tracts)]
+    newcounty = dissolve(newcounty, by='COUNTY', aggfunc={'Total Population':'sum', 'SQMI':'sum'},
+                         topology=topology)
+    newcounty['NAME'] = 'St. Louis County (without STL)'
+
+    # All tracts map
+    write_layer(stl_tracts, 'all_tracts')
+
+    # New proposed city boundires without dissolve
+    write_layer(stl_select, 'newstl_tracts')
+
+    # New proposed city boundries with dissolve
+    write_layer(newstl, 'newstl_dis')
+
+    # New county boundries with dissolve (minus stl)
+    write_layer(newcounty, 'county_minus_newstl')
+
+    # New county boundries with dissolve (incl stl)
+    write_layer(county_all, 'county_plus_newstl')
+
+    # Current city boundry with dissolve
+    write_layer(cur_city, 'cur_city_dis')
 
-# --- 3. TRANSIT AND PUBLIC SAFTEY OVERLAYS ---
 
-# Police and Fire
-police = gpd.read_file(os.path.join(path_raw_data, 'police.geojson'))
-firestat = gpd.read_file(os.path.join(path_raw_data, 'stl_firestat.geojson'))
-firedist = gpd.read_file(os.path.join(path_raw_data, 'stlc_firedist.geojson'))
-
-# Transit
-busstat = gpd.read_file(os.path.join(path_raw_data, 'stations_bus.geojson'))
-metrostat = gpd.read_file(os.path.join(path_raw_data, 'stations_metro.geojson'))
-busroute = gpd.read_file(os.path.join(path_raw_data, 'routes_bus.geojson'))
-metroroute = gpd.read_file(os.path.join(path_raw_data, 'routes_metro.geojson'))
-
-# Cleaning safety data
-police = police[['OBJECTID', 'Police_Dep', 'Precinct', 'Muni',
-                 'Address', 'geometry']]
-police.rename(columns={'Police_Dep':'Police Dept.', 'Muni': 'Municipality'},
-              inplace=True)
-firestat = firestat[['Engine', 'Address', 'Dist', 'HOUSENUM', 'geometry']]
-firestat.rename(columns={'Dist':'District', 'HOUSENUM': 'House Number'},
-                inplace=True)
-firedist = firedist[['GlobalID', 'FD_TYPE', 'FIRE_DISTRICT', 'SQ_MILES', 'geometry']]
-firedist.rename(columns={'FD_TYPE':'Type', 'FIRE_DISTRICT': 'District',
-                         'SQ_MILES':'Square Miles'}, inplace=True)
-
-# Cleaning transit data
-busstat = busstat[['OBJECTID', 'StopID', 'StopName', 'Lines', 'Routes',
-                   'CountyName', 'geometry']]
-metrostat = metrostat[['OBJECTID', 'StopID', 'StopName', 'BusCxn',
-                       'City', 'CountyName', 'geometry']]
-metrostat.rename(columns={'City':'Municipality', 'BusCxn':'Bus Connection'},
-                 inplace=True)
-busroute = busroute[['OBJECTID', 'LineName', 'LineNum', 'geometry']]
-
-# Econ data
-econ = pd.read_csv(os.path.join(path_raw_data, 'stl_innovation_geo.csv'))
-econ['geometry'] = gpd.points_from_xy(econ['long'], econ['lat'])
-econ = gpd.GeoDataFrame(econ, geometry='geometry', crs='EPSG:4326')
 
+# --- 2a. Municipality level data ---
 
+@graph.target('munis',
+              inputs=[raw('Municipal_Boundaries.geojson'), raw('muni_finances_merged.csv'),
+                      raw('muni_governance_merged.csv'), layer('all_tracts')],
+              outputs=[layer('munis_merged')])
+def build_munis():
+    stl_tracts = read_layer('all_tracts')
+
+    stl_munis = gpd.read_file(raw('Municipal_Boundaries.geojson'))
+    stl_munis['last_edited_date'] = stl_munis['last_edited_date'].astype(str)
+    stl_munis['MUNICIPALITY'] = stl_munis['MUNICIPALITY'].str.title()
+    stl_munis.rename(columns={'MUNICIPALITY': 'Municipality'}, inplace=True)
+    stl_munis = stl_munis[stl_munis['Municipality']!='Unincorporated']
+
+    muni_fin = pd.read_csv(raw('muni_finances_merged.csv'))
+    muni_fin.drop(columns='Population', inplace=True)
+    muni_gov = pd.read_csv(raw('muni_governance_merged.csv'))
+    muni_data = muni_fin.merge(muni_gov, on='Municipality')
+    muni_data['Municipality'] = muni_data['Municipality'].replace(['Saint Ann', 'Saint John'],
+                                                                  ['St Ann', 'St John'])
+
+    munis_merged = stl_munis.merge(muni_data, on='Municipality', how='right')
+
+    # Manually add the missing geometry
+    topology = Topology.from_frame(stl_tracts)
+    current_city_geom = topology.outline(stl_tracts['COUNTY'] == 'St. Louis city')
+    current_county_geom = topology.outline(stl_tracts['COUNTY'] == 'St. Louis County')
+
+    # Calculate incorporated union to find unincorporated area
+    incorporated_union = stl_munis.unary_union
+    unincorporated_geom = current_county_geom.difference(incorporated_union)
+
+    munis_merged.loc[munis_merged['Municipality'] == 'STL County', 'geometry'] = unincorporated_geom
+    munis_merged.loc[munis_merged['Municipality'] == 'Saint Louis City', 'geometry'] = current_city_geom
+    munis_merged.drop(columns='last_edited_date', inplace=True)
+
+    # Ensure it's a GeoDataFrame before renaming/saving
+    munis_merged = gpd.GeoDataFrame(munis_merged, crs='EPSG:4326')
+
+    # Rename columns for human readability
+    rename_dict = {
+        'Year_Inc': 'Year Incorporated',
+        'Total_Rev': 'Total Revenue',
+        'Sales_Tax_Rev': 'Sales Tax Revenue',
+        'Property_Tax_Rev': 'Property Tax Revenue',
+        'Utility_Tax_Rev': 'Utility Tax Revenue',
+        'Court_Fines_Rev': 'Court Fines Revenue',
+        'Total_Exp': 'Total Expenditures',
+        'Top_Exp_Type': 'Top Expenditure Type',
+        'Median_HH_Inc': 'Median Household Income',
+        'Poverty_Rate': 'Poverty Rate',
+        'HS_Grad_Rate': 'HS Graduation Rate',
+        'Median_House_Value': 'Median House Value',
+        'Housing_Units': 'Housing Units',
+        'Percent_White': 'Percent White',
+        'Percent_Black': 'Percent Black',
+        'Percent_Asian': 'Percent Asian',
+        'Percent_Hispanic': 'Percent Hispanic',
+        'Total_Elected_Officials': 'Total Elected Officials',
+        'Aldermen_Count': 'Aldermen Count',
+        'Total_Aldermen_Pay': 'Total Aldermen Pay',
+        'Mayor_Pay': 'Mayor Pay',
+        'Admin_Position': 'Admin Position',
+        'Admin_Pay': 'Admin Pay',
+        'Sum_Total_Payroll': 'Sum Total Payroll',
+        'Per_Capita_Admin_Cost': 'Per Capita Admin Cost'
+    }
+    munis_merged.rename(columns=rename_dict, inplace=True)
+
+    # The csv has years as text and '--' where unknown; keep the column numeric so the
+    # parquet writer gets one type
+    munis_merged['Year Incorporated'] = pd.to_numeric(munis_merged['Year Incorporated'], errors='coerce')
+    munis_merged.loc[munis_merged['Municipality']=='STL County', 'Year Incorporated'] = 1812
+    munis_merged.loc[munis_merged['Municipality']=='Green Park', 'Year Incorporated'] = 1995
+
+    # Craft per capita metrics
+    # List of columns to calculate per capita and winsorize
+    pc_cols = ['Total Revenue', 'Sales Tax Revenue', 'Property Tax Revenue',
+               'Utility Tax Revenue', 'Court Fines Revenue', 'Total Expenditures',
+               'Total Elected Officials']
+
+    # Ensure population is numeric and handle zeros to avoid division error
+    munis_merged['Population'] = pd.to_numeric(munis_merged['Population'], errors='coerce')
+    pop_safe = munis_merged['Population'].replace(0, np.nan)
+
+    # Loop through to get new values
+    for col in pc_cols:
+        # Ensure column is numeric (handle potential string/comma issues)
+        if munis_merged[col].dtype == 'object':
+            munis_merged[col] = pd.to_numeric(munis_merged[col].astype(str).str.replace(',', ''), errors='coerce')
+
+        if col == 'Total Elected Officials':
+            pc_name = 'Elected Officials Per 50,000 People'
+            wins_name = 'Elected Officials Per 50,000 People (winsorized)'
+            # Calculate Per 50,000
+            munis_merged[pc_name] = (munis_merged[col] / pop_safe) * 50000
+        else:
+            pc_name = f'{col} Per Capita'
+            wins_name = f'{col} Per Capita (winsorized)'
+            # Calculate Per Capita
+            munis_merged[pc_name] = munis_merged[col] / pop_safe
+
+        # Calculate Winsorized version
+        upper = munis_merged[pc_name].quantile(0.90)
+        munis_merged[wins_name] = munis_merged[pc_name].clip(upper=upper)
+
+    munis_merged['Per Capita Admin Cost (winsorized)'] = munis_merged['Per Capita Admin Cost'].clip(upper=munis_merged['Per Capita Admin Cost'].quantile(0.95))
+
+    # Municipalities geo data with finance data
+    write_layer(munis_merged, 'munis_merged')
+
+
+
+# --- 2b. Optimized boundary candidates ---
+
+# Ranked alternatives to the hand-tuned New St. Louis boundary from annealing chains over
+# the tract graph (see redistricting.py). Takes a while, so only built when asked for:
+# `preprocessing.py candidates`
+@graph.target('candidates',
+              inputs=[index_path('boundary_engine')],
+              outputs=[layer('newstl_candidates'),
+                       layer_path('newstl_candidates', 'geojson', path_cleaned_data)],
+              params=CANDIDATE_SEARCH,
+              default=False)
+def build_candidates():
+    engine = BoundaryEngine.load(index_path('boundary_engine'))
+    candidates = candidate_layer(engine, search(engine, **CANDIDATE_SEARCH))
+    print(candidates.drop(columns=['geometry', 'TRACT_LIST']))
+    write_layer(candidates, 'newstl_candidates')
+    export_geojson(candidates, 'newstl_candidates', path_cleaned_data)
 
-# --- 4. ADD PROCESSED DATA TO DERIVED DATA FOLDER ---
 
-# Run code blocks to drop cleaned boundry data into the proper project folder for use 
-# in visualizations
-# All tracts map
-stl_tracts.to_file(os.path.join(path_cleaned_data, 'all_tracts.geojson'), driver='GeoJSON')
 
-# New proposed city boundires without dissolve
-stl_select.to_file(os.path.join(path_cleaned_data, 'newstl_tracts.geojson'), driver='GeoJSON')
+# --- 3. TRANSIT AND PUBLIC SAFTEY OVERLAYS ---
 
-# New proposed city boundries with dissolve
-newstl.to_file(os.path.join(path_cleaned_data, 'newstl_dis.geojson'), driver='GeoJSON')
+@graph.target('infrastructure',
+              inputs=[raw('police.geojson'), raw('stl_firestat.geojson'),
+                      raw('stlc_firedist.geojson'), raw('stations_bus.geojson'),
+                      raw('stations_metro.geojson'), raw('routes_bus.geojson'),
+                      raw('routes_metro.geojson')],
+              outputs=[layer('police'), layer('firestat'),
+                       layer('firedist'), layer('busstat'),
+                       layer('busroute'), layer('metroroute'),
+                       layer('metrostat')])
+def build_infrastructure():
+    # Police and Fire
+    police = gpd.read_file(raw('police.geojson'))
+    firestat = gpd.read_file(raw('stl_firestat.geojson'))
+    firedist = gpd.read_file(raw('stlc_firedist.geojson'))
+
+    # Transit
+    busstat = gpd.read_file(raw('stations_bus.geojson'))
+    metrostat = gpd.read_file(raw('stations_metro.geojson'))
+    busroute = gpd.read_file(raw('routes_bus.geojson'))
+    metroroute = gpd.read_file(raw('routes_metro.geojson'))
+
+    # Cleaning safety data
+    police = police[['OBJECTID', 'Police_Dep', 'Precinct', 'Muni',
+                     'Address', 'geometry']]
+    police.rename(columns={'Police_Dep':'Police Dept.', 'Muni': 'Municipality'},
+                  inplace=True)
+    firestat = firestat[['Engine', 'Address', 'Dist', 'HOUSENUM', 'geometry']]
+    firestat.rename(columns={'Dist':'District', 'HOUSENUM': 'House Number'},
+                    inplace=True)
+    firedist = firedist[['GlobalID', 'FD_TYPE', 'FIRE_DISTRICT', 'SQ_MILES', 'geometry']]
+    firedist.rename(columns={'FD_TYPE':'Type', 'FIRE_DISTRICT': 'District',
+                             'SQ_MILES':'Square Miles'}, inplace=True)
+
+    # Cleaning transit data
+    busstat = busstat[['OBJECTID', 'StopID', 'StopName', 'Lines', 'Routes',
+                       'CountyName', 'geometry']]
+    metrostat = metrostat[['OBJECTID', 'StopID', 'StopName', 'BusCxn',
+                           'City', 'CountyName', 'geometry']]
+    metrostat.rename(columns={'City':'Municipality', 'BusCxn':'Bus Connection'},
+                     inplace=True)
+    busroute = busroute[['OBJECTID', 'LineName', 'LineNum', 'geometry']]
+
+    write_layer(police, 'police')
+    write_layer(firestat, 'firestat')
+    write_layer(firedist, 'firedist')
+    write_layer(busstat, 'busstat')
+    write_layer(busroute, 'busroute')
+    write_layer(metroroute, 'metroroute')
+    write_layer(metrostat, 'metrostat')
+
+
+
+# --- 3a. Econ data ---
+
+@graph.target('econ',
+              inputs=[raw('stl_innovation_geo.csv')],
+              outputs=[layer('stl_econ')])
+def build_econ():
+    econ = pd.read_csv(raw('stl_innovation_geo.csv'))
+    econ['geometry'] = gpd.points_from_xy(econ['long'], econ['lat'])
+    econ = gpd.GeoDataFrame(econ, geometry='geometry', crs='EPSG:4326')
+    write_layer(econ, 'stl_econ')
+
+
+
+# --- 3b. Spatial indexes, tract service coverage and crosswalks ---
+
+# STRtree indexes over the layers we relate to each other, pickled for reuse
+@graph.target('indexes',
+              inputs=[layer(name) for name in INDEXED_LAYERS],
+              outputs=[index_path(name) for name in INDEXED_LAYERS])
+def build_indexes():
+    for name in INDEXED_LAYERS:
+        SpatialIndex.from_layer(name).save(index_path(name))
+
+# Which muni/fire district holds each tract, and how far its nearest stations are
+@graph.target('coverage',
+              inputs=[layer('all_tracts')] + [index_path(name) for name in INDEXED_LAYERS],
+              outputs=[layer('tract_coverage')])
+def build_coverage():
+    indexes = {name: SpatialIndex.load(index_path(name)) for name in INDEXED_LAYERS}
+    coverage = tract_service_coverage(read_layer('all_tracts', columns=['TRACT', 'COUNTY']), indexes)
+    write_layer(coverage, 'tract_coverage')
+
+# Bus/MetroLink stops within walking distance, route miles and MetroLink distance for
+# every tract and municipality
+@graph.target('transit',
+              inputs=[layer(area) for area, _ in TRANSIT_LAYERS.values()]
+                     + [layer('busroute'), layer('metroroute'),
+                        index_path('busstat'), index_path('metrostat')],
+              outputs=[layer(name) for name in TRANSIT_LAYERS])
+def build_transit():
+    indexes = {name: SpatialIndex.load(index_path(name)) for name in ['busstat', 'metrostat']}
+    bus_routes, metro_routes = read_layer('busroute', columns=[]), read_layer('metroroute', columns=[])
+    for name, (area, id_col) in TRANSIT_LAYERS.items():
+        access = transit_access(read_layer(area, columns=[id_col]), id_col, indexes,
+                                bus_routes, metro_routes)
+        write_layer(access, name)
+
+# Tract x municipality / fire district intersection areas for moving columns between them
+@graph.target('crosswalks',
+              inputs=[layer(name) for name in sorted({l for cw in CROSSWALKS.values() for l in cw[::2]})],
+              outputs=[index_path(crosswalk_name(name)) for name in CROSSWALKS])
+def build_crosswalks():
+    for name in CROSSWALKS:
+        Crosswalk.from_layers(name, read_layer).save(index_path(crosswalk_name(name)))
+
+
+
+# --- 3c. Simplified copies for the dashboard ---
+
+# Each polygon layer gets a simplified, coordinate-quantized copy per zoom level
+# (e.g. all_tracts_low.parquet) so the maps don't ship sub-pixel vertices.
+@graph.target('simplify',
+              inputs=[layer(name) for name in SIMPLIFIED_LAYERS],
+              outputs=[layer(layer_name(name, level))
+                       for name in SIMPLIFIED_LAYERS for level in LEVELS],
+              params={'levels': LEVELS})
+def build_simplified():
+    for name in SIMPLIFIED_LAYERS:
+        for level, gdf in simplified_levels(read_layer(name), name).items():
+            write_layer(gdf, layer_name(name, level))
+
+
+
+# --- 3d. Optional GeoJSON export ---
+
+# GeoParquet is the working format for the dashboard and analysis. The GeoJSON copies
+# are for external consumers and only rebuild when asked for: `preprocessing.py geojson`
+exported_layers = ['stl_tracts', 'all_tracts', 'newstl_tracts', 'newstl_dis', 'county_minus_newstl',
+                   'county_plus_newstl', 'cur_city_dis', 'munis_merged', 'police', 'firestat', 'firedist',
+                   'busstat', 'busroute', 'metroroute', 'metrostat', 'stl_econ']
+
+@graph.target('geojson',
+              inputs=[layer(name) for name in exported_layers],
+              outputs=[layer_path(name, 'geojson', path_cleaned_data) for name in exported_layers],
+              default=False)
+def build_geojson_export():
+    for name in exported_layers:
+        export_geojson(read_layer(name), name, path_cleaned_data)
+
+
+
+# --- 3e. Optional vector tile archive ---
+
+# Pre-tiled MVT copy of the map layers for the dashboard's tile server mode. Only built
+# when asked for: `preprocessing.py tiles` (needs mapbox-vector-tile)
+@graph.target('tiles',
+              inputs=[layer(name) for name in TILE_LAYERS],
+              outputs=[derived('stl_layers.mbtiles')],
+              params={'min_zoom': 8, 'max_zoom': 14},
+              default=False)
+def build_tiles():
+    build_mbtiles({tile_name: read_layer(name) for name, tile_name in TILE_LAYERS.items()},
+                  derived('stl_layers.mbtiles'), min_zoom=8, max_zoom=14)
 
-# New county boundries with dissolve (minus stl)
-newcounty.to_file(os.path.join(path_cleaned_data, 'county_minus_newstl.geojson'), driver='GeoJSON')
 
-# New county boundries with dissolve (incl stl)
-county_all.to_file(os.path.join(path_cleaned_data, 'county_plus_newstl.geojson'), driver='GeoJSON')
 
-# Municipalities geo data with finance data
-munis_merged.to_file(os.path.join(path_cleaned_data, 'munis_merged.geojson'), driver='GeoJSON')
+# --- 4. ADD PROCESSED DATA TO DERIVED DATA FOLDER ---
 
-# Infra.
-police.to_file(os.path.join(path_cleaned_data, 'police.geojson'), driver='GeoJSON')
-firestat.to_file(os.path.join(path_cleaned_data, 'firestat.geojson'), driver='GeoJSON')
-firedist.to_file(os.path.join(path_cleaned_data, 'firedist.geojson'), driver='GeoJSON')
-busstat.to_file(os.path.join(path_cleaned_data, 'busstat.geojson'), driver='GeoJSON')
-busroute.to_file(os.path.join(path_cleaned_data, 'busroute.geojson'), driver='GeoJSON')
-metroroute.to_file(os.path.join(path_cleaned_data, 'metroroute.geojson'), driver='GeoJSON')
-metrostat.to_file(os.path.join(path_cleaned_data, 'metrostat.geojson'), driver='GeoJSON')
-econ.to_file(os.path.join(path_cleaned_data, 'stl_econ.geojson'), driver='GeoJSON')
+# Run the targets to drop cleaned boundry data into the proper project folder for use
+# in visualizations. With no arguments every target is checked and only stale ones rebuild.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the derived datasets.')
+    parser.add_argument('targets', nargs='*',
+                        help=f'Targets to build (default: all). Options: {", ".join(graph.targets)}')
+    parser.add_argument('--force', nargs='*', metavar='TARGET',
+                        help='Rebuild the given targets (or all requested targets if none given) even if up to date')
+    parser.add_argument('--list', action='store_true',
+                        help='Show each target and whether it is stale, then exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for name in graph.order(args.targets or None):
+            target = graph.targets[name]
+            try:
+                status = 'stale' if graph.is_stale(target) else 'up to date'
+            except FileNotFoundError:
+                status = 'waiting on upstream'
+            print(f'{name:15} {status}')
+    else:
+        force = True if args.force == [] else (args.force or ())
+        graph.run(args.targets or None, force=force)
@@ -0,0 +1,164 @@
+# --- AUTOMATED NEW ST. LOUIS BOUNDARY SEARCH ---
+# Instead of tuning the boundary with hand lists of tracts, this searches the tract
+# adjacency graph for contiguous tract sets that are dense and compact, within population
+# bounds. Each search is a simulated annealing chain of single-tract flips on the edge of
+# the selection:
+#   - the current city tracts are locked in, so every candidate grows out of the city
+#   - a move is only allowed if the selection stays in one piece and doesn't enclose a hole
+#   - population, area and perimeter are updated per move from the tract's own row of the
+#     shared-edge matrix (boundary_metrics.MetricTracker), so scoring a move costs
+#     O(neighbors), not a dissolve
+# Several chains run at once in a process pool (the graph arrays are sent to each worker
+# once) and the best distinct boundaries across chains are ranked.
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import geopandas as gpd
+
+from boundary_engine import DEFAULT_DENSITY_THRESHOLD
+from boundary_metrics import BoundaryMetrics, MetricTracker, polsby_popper, tract_arrays
+
+# score = log(density) + COMPACTNESS_WEIGHT * Polsby-Popper
+COMPACTNESS_WEIGHT = 1.0
+# Population bounds default to the threshold selection's population +/- this share
+POPULATION_SLACK = 0.25
+# Annealing temperatures (score units), cooled geometrically over the chain
+T_START, T_END = 1e-2, 1e-4
+
+# Settings the preprocessing target runs with
+CANDIDATE_SEARCH = {'chains': 8, 'steps': 20000, 'seed': 2022, 'top': 5}
+
+# Read-only graph arrays, set once per worker process by _init_worker
+_shared = {}
+
+
+def _init_worker(graph):
+    _shared.update(graph)
+
+
+def population_bounds(engine, threshold=DEFAULT_DENSITY_THRESHOLD, slack=POPULATION_SLACK):
+    pop = engine.pop[engine.select(threshold)].sum()
+    return pop * (1 - slack), pop * (1 + slack)
+
+
+def score(totals, compactness=COMPACTNESS_WEIGHT):
+    # `totals` as returned by MetricTracker.totals / toggled
+    pop, sqmi, area, perimeter, _ = totals
+    density = pop / sqmi if sqmi > 0 else 0.0
+    return np.log(max(density, 1.0)) + compactness * float(polsby_popper(area, perimeter))
+
+
+class AnnealingState(MetricTracker):
+    # Metric tracker plus the checks that keep each move contiguous and hole-free
+    def _search(self, start, within, stop):
+        # Breadth-first search from `start` through tracts where `within` is True; returns
+        # True as soon as `stop(node, seen)` holds
+        seen = {start}
+        frontier = [start]
+        while frontier:
+            node = frontier.pop()
+            if stop(node, seen):
+                return True
+            for j in self.neighbors(node):
+                if within[j] and j not in seen:
+                    seen.add(j)
+                    frontier.append(j)
+        return False
+
+    def can_flip(self, i):
+        g, mask = self.g, self.mask
+        nbrs = self.neighbors(i)
+        if mask[i]:
+            if g['locked'][i]:
+                return False
+            # Only tracts on the selection's edge, or removing one would open a hole
+            if mask[nbrs].all() and not g['on_edge'][i]:
+                return False
+            # The remaining selected neighbors must still be connected to each other
+            rest = nbrs[mask[nbrs]]
+            if len(rest) <= 1:
+                return len(rest) == 1
+            after = mask.copy()
+            after[i] = False
+            targets = set(rest.tolist())
+            return self._search(rest[0], after, lambda node, seen: targets <= seen)
+        # Additions must touch the selection ...
+        if not mask[nbrs].any():
+            return False
+        # ... and every unselected neighbor must still reach the study area's edge
+        outside = ~mask
+        outside[i] = False
+        reaches_edge = lambda node, seen: g['on_edge'][node]
+        return all(self._search(j, outside, reaches_edge) for j in nbrs[outside[nbrs]])
+
+
+def _run_chain(mask, seed, steps, bounds, compactness):
+    # One annealing chain from `mask`; returns (best score, best mask)
+    g = _shared
+    rng = np.random.default_rng(seed)
+    state = AnnealingState(g, mask)
+    current = score(state.totals, compactness)
+    best, best_mask = current, state.mask.copy()
+    movable = np.flatnonzero(~g['locked'])
+    temperatures = np.geomspace(T_START, T_END, steps)
+    proposals = rng.choice(movable, size=steps)
+    draws = rng.random(steps)
+
+    for step in range(steps):
+        i = proposals[step]
+        totals = state.toggled(i)
+        if not bounds[0] <= totals[0] <= bounds[1]:
+            continue
+        if not state.can_flip(i):
+            continue
+        new = score(totals, compactness)
+        if new >= current or draws[step] < np.exp((new - current) / temperatures[step]):
+            state.flip(i, totals)
+            current = new
+            if current > best:
+                best, best_mask = current, state.mask.copy()
+    return best, best_mask
+
+
+def search(engine, chains=CANDIDATE_SEARCH['chains'], steps=CANDIDATE_SEARCH['steps'],
+           seed=CANDIDATE_SEARCH['seed'], top=CANDIDATE_SEARCH['top'], bounds=None,
+           compactness=COMPACTNESS_WEIGHT, threshold=DEFAULT_DENSITY_THRESHOLD, workers=None):
+    # Runs `chains` annealing chains from the threshold selection and returns the `top`
+    # distinct boundaries as a list of (score, mask), best first
+    graph = tract_arrays(engine)
+    start = engine.select(threshold)
+    bounds = bounds or population_bounds(engine, threshold)
+    seeds = np.random.SeedSequence(seed).spawn(chains)
+    args = [start] * chains, seeds, [steps] * chains, [bounds] * chains, [compactness] * chains
+
+    workers = workers or min(chains, os.cpu_count())
+    if workers == 1:
+        _init_worker(graph)
+        results = list(map(_run_chain, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(graph,)) as pool:
+            results = list(pool.map(_run_chain, *args))
+
+    # Chains often settle on the same boundary; keep one copy of each
+    distinct = {}
+    for best, mask in results:
+        key = mask.tobytes()
+        if key not in distinct or best > distinct[key][0]:
+            distinct[key] = (best, mask)
+    return sorted(distinct.values(), key=lambda c: -c[0])[:top]
+
+
+def candidate_layer(engine, candidates):
+    # One dissolved boundary per candidate, with the same totals as newstl_dis plus the
+    # rank, score, compactness metrics and member tracts
+    masks = np.array([mask for _, mask in candidates])
+    layer = BoundaryMetrics(engine).measure(masks)
+    layer['DENSITY'] = layer['DENSITY'].round()
+    layer.insert(0, 'RANK', np.arange(1, len(candidates) + 1))
+    layer.insert(1, 'NAME', [f'New St. Louis candidate {rank}' for rank in layer['RANK']])
+    layer.insert(2, 'SCORE', [best for best, _ in candidates])
+    layer['TRACT_LIST'] = [','.join(engine.selected_tracts(mask)) for mask in masks]
+    layer['geometry'] = [engine.outline(mask) for mask in masks]
+    return gpd.GeoDataFrame(layer, geometry='geometry', crs='EPSG:4326')
@@ -0,0 +1,105 @@
+# --- HEADLESS CHART RENDERING ---
+# Exports Altair charts to PNG/SVG/PDF files with vl-convert, rendering several charts at
+# once in worker processes. A manifest next to the figures records the hash of each
+# chart's Vega-Lite spec (plus formats and scale), so charts that haven't changed since
+# the last run are skipped and a report build only regenerates the figures that moved.
+import hashlib
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+base_dir = Path(__file__).resolve().parent.parent
+path_figures = os.path.join(base_dir, 'figures')
+
+FORMATS = ('png', 'svg', 'pdf')
+MANIFEST = '.render_manifest.json'
+
+# Specs bigger than this (bytes of JSON) are probably embedding data the chart doesn't use.
+# The largest chart we make on purpose, the panel effect trend (46 years x 12 outcomes,
+# ~550 inline rows), is about 110 KB; this leaves room for roughly twice that.
+SPEC_SIZE_BUDGET = 250_000
+
+
+class SpecSizeWarning(UserWarning):
+    pass
+
+
+def check_spec_size(spec, name, budget=SPEC_SIZE_BUDGET):
+    size = len(json.dumps(spec, default=str))
+    if size > budget:
+        warnings.warn(f'{name}: Vega-Lite spec is {size:,} bytes (budget {budget:,}); '
+                      'prune or pre-aggregate the chart data', SpecSizeWarning, stacklevel=2)
+    return size
+
+
+def spec_hash(spec, formats, scale):
+    import vl_convert as vlc
+    payload = json.dumps({'spec': spec, 'formats': list(formats), 'scale': scale,
+                          'vl_convert': getattr(vlc, '__version__', '')}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _render(spec, base_path, formats, scale):
+    # Runs in a worker process; returns the files written
+    import vl_convert as vlc
+    written = []
+    for fmt in formats:
+        if fmt == 'png':
+            data = vlc.vegalite_to_png(spec, scale=scale)
+        elif fmt == 'svg':
+            data = vlc.vegalite_to_svg(spec).encode()
+        elif fmt == 'pdf':
+            data = vlc.vegalite_to_pdf(spec, scale=scale)
+        else:
+            raise ValueError(f'unsupported format: {fmt}')
+        path = f'{base_path}.{fmt}'
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        written.append(path)
+    return written
+
+
+def _load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def render_charts(charts, out_dir=path_figures, formats=FORMATS, scale=2, workers=None, force=False):
+    # `charts` maps file names (no extension) to Altair charts. Returns {name: 'built'/'skip'}.
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _load_manifest(out_dir)
+
+    todo, status = {}, {}
+    for name, chart in charts.items():
+        spec = chart.to_dict()
+        check_spec_size(spec, name)
+        digest = spec_hash(spec, formats, scale)
+        files_exist = all(os.path.exists(os.path.join(out_dir, f'{name}.{fmt}')) for fmt in formats)
+        if not force and files_exist and manifest.get(name) == digest:
+            status[name] = 'skip'
+        else:
+            todo[name] = (spec, digest)
+
+    try:
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers or min(len(todo), os.cpu_count())) as pool:
+                futures = {name: pool.submit(_render, spec, os.path.join(out_dir, name), formats, scale)
+                           for name, (spec, _) in todo.items()}
+                for name, future in futures.items():
+                    future.result()
+                    manifest[name] = todo[name][1]
+                    status[name] = 'built'
+    finally:
+        # Charts finished before a failure still count as rendered
+        with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    for name, state in status.items():
+        print(f'[{state}] {name}')
+    return status
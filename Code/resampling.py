@@ -0,0 +1,115 @@
+# --- BOOTSTRAP AND PERMUTATION INFERENCE FOR THE CONSOLIDATION EFFECT ---
+# The analytic OLS intervals in fisc_plots.py lean on a small cross-section of cities, so
+# this reruns the same batched regressions on resampled data:
+#   - pairs bootstrap: cities are redrawn with replacement (as multinomial row weights, so
+#     every outcome keeps its own missing-row pattern) -> percentile CIs and bootstrap SEs
+#   - permutation: consolidated_govt is shuffled across cities -> two-sided p-values
+# Replicates run in chunks over a process pool. Each chunk gets its own child of one
+# SeedSequence, so results depend only on the seed, not on the number of workers. The
+# design data are sent to each worker once (pool initializer) and results are cached on
+# disk keyed by a hash of the data and settings.
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from batch_ols import BatchOLS
+
+base_dir = Path(__file__).resolve().parent.parent
+path_resampling = os.path.join(base_dir, 'data', 'derived-data', 'resampling')
+
+CHUNK_SIZE = 250
+
+# Read-only design data, set once per worker process by _init_worker
+_shared = {}
+
+
+def _init_worker(X, Y, patterns, pattern_cols, term_idx):
+    _shared.update(X=X, Y=Y, patterns=patterns, pattern_cols=pattern_cols, term_idx=term_idx)
+
+
+def _term_coefs(X, weights):
+    # Coefficient on the term of interest for every outcome under the given row weights
+    Y, term_idx = _shared['Y'], _shared['term_idx']
+    coefs = np.full(Y.shape[1], np.nan)
+    for rows, cols in zip(_shared['patterns'], _shared['pattern_cols']):
+        w = np.sqrt(weights[rows])[:, None]
+        coefs[cols] = (np.linalg.pinv(X[rows] * w)[term_idx] @ (Y[rows][:, cols] * w))
+    return coefs
+
+
+def _run_chunk(kind, seed, size):
+    X = _shared['X']
+    n = len(X)
+    rng = np.random.default_rng(seed)
+    out = np.empty((size, _shared['Y'].shape[1]))
+    for r in range(size):
+        if kind == 'bootstrap':
+            out[r] = _term_coefs(X, rng.multinomial(n, np.full(n, 1 / n)).astype(float))
+        else:
+            Xp = X.copy()
+            Xp[:, _shared['term_idx']] = rng.permutation(X[:, _shared['term_idx']])
+            out[r] = _term_coefs(Xp, np.ones(n))
+    return out
+
+
+def _replicates(kind, n_reps, seed_seq, workers, initargs):
+    sizes = [min(CHUNK_SIZE, n_reps - start) for start in range(0, n_reps, CHUNK_SIZE)]
+    seeds = seed_seq.spawn(len(sizes))
+    if workers == 1:
+        _init_worker(*initargs)
+        return np.vstack([_run_chunk(kind, s, size) for s, size in zip(seeds, sizes)])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=initargs) as pool:
+        return np.vstack(list(pool.map(_run_chunk, [kind] * len(sizes), seeds, sizes)))
+
+
+def _cache_key(model, term, n_boot, n_perm, seed, alpha):
+    h = hashlib.sha256()
+    for array in (model.X, model.Y, model.rows):
+        h.update(np.ascontiguousarray(array).tobytes())
+    h.update(repr((model.terms, model.outcomes, term, n_boot, n_perm, seed, alpha)).encode())
+    return h.hexdigest()[:16]
+
+
+def resample(df, outcomes, regressors, fixed_effects=(), term='consolidated_govt',
+             n_boot=2000, n_perm=2000, seed=2022, alpha=0.05, workers=None,
+             cache_dir=path_resampling, labels=None):
+    # One row per outcome: observed coefficient, bootstrap SE and percentile CI, and the
+    # permutation p-value for `term`
+    model = BatchOLS(df, outcomes, regressors, fixed_effects)
+    key = _cache_key(model, term, n_boot, n_perm, seed, alpha)
+    cache_path = os.path.join(cache_dir, f'{key}.parquet')
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    # Design data restricted to usable rows, split by missing-row pattern like BatchOLS
+    usable = model.rows.any(axis=1)
+    X, Y, rows = model.X[usable], model.Y[usable], model.rows[usable]
+    patterns, pattern_of = np.unique(rows.T, axis=0, return_inverse=True)
+    pattern_cols = [np.flatnonzero(pattern_of.ravel() == p) for p in range(len(patterns))]
+    initargs = (X, Y, patterns, pattern_cols, model.terms.index(term))
+
+    _init_worker(*initargs)
+    observed = _term_coefs(X, np.ones(len(X)))
+
+    workers = workers or os.cpu_count()
+    boot_seq, perm_seq = np.random.SeedSequence(seed).spawn(2)
+    boot = _replicates('bootstrap', n_boot, boot_seq, workers, initargs)
+    perm = _replicates('permutation', n_perm, perm_seq, workers, initargs)
+
+    result = pd.DataFrame({
+        'Variable': pd.Series(outcomes).replace(labels or {}).to_numpy(),
+        'Coeff': observed,
+        'Bootstrap SE': np.nanstd(boot, axis=0, ddof=1),
+        'boot_ci_lower': np.nanquantile(boot, alpha / 2, axis=0),
+        'boot_ci_upper': np.nanquantile(boot, 1 - alpha / 2, axis=0),
+        'Permutation p': (1 + (np.abs(perm) >= np.abs(observed)).sum(axis=0)) / (1 + n_perm),
+    })
+
+    os.makedirs(cache_dir, exist_ok=True)
+    result.to_parquet(cache_path, index=False)
+    return result
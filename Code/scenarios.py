@@ -0,0 +1,189 @@
+# --- CONSOLIDATION FISCAL SCENARIOS ---
+# What would a consolidated city look like fiscally? For a set of merged municipalities
+# (e.g. the ones New St. Louis overlaps) this pools their revenues, expenditures and
+# governance payroll from munis_merged and applies a set of assumptions:
+#   - payroll_savings:  share of the absorbed municipalities' elected/admin payroll cut
+#   - service_savings:  share of the absorbed municipalities' spending saved by sharing
+#                       services (economies of scale)
+#   - fines_retained:   share of municipal court fines revenue kept after consolidation
+#   - transition_cost:  annualized one-off cost of merging, dollars per resident
+# Every assumption can be an array, so a whole grid of scenarios (and several candidate
+# member sets) is evaluated in one broadcast pass over the pooled totals.
+import argparse
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from boundary_engine import DEFAULT_DENSITY_THRESHOLD, MANUAL_EXCLUDE, MANUAL_INCLUDE, BoundaryEngine
+from crosswalk import Crosswalk, crosswalk_name
+from derived_io import read_layer
+from spatial_index import index_path
+
+FINANCE_COLUMNS = ['Population', 'Total Revenue', 'Court Fines Revenue', 'Total Expenditures',
+                   'Sum Total Payroll']
+
+# The city keeps its own government, so its payroll/spending isn't "absorbed"
+CORE_MUNICIPALITY = 'Saint Louis City'
+# The county government's row: county-wide population and budget, drawn on the
+# unincorporated area
+COUNTY_GOVERNMENT = 'STL County'
+
+DEFAULT_PARAMS = {'payroll_savings': 0.5, 'service_savings': 0.05, 'fines_retained': 0.5,
+                  'transition_cost': 0.0}
+
+
+def finance_table(munis):
+    # Numeric finance columns indexed by municipality (0 for missing amounts). Some
+    # municipalities (Pacific) are several polygon rows carrying the same finances; keep one.
+    table = munis.set_index('Municipality')[FINANCE_COLUMNS]
+    table = table[~table.index.duplicated()]
+    return table.apply(pd.to_numeric, errors='coerce').fillna(0.0)
+
+
+def members_from_tracts(crosswalk, tract_ids, tract_mask, tract_pop, table):
+    # Share of each municipality's (tract) population inside the tract selection.
+    # Municipalities split by the boundary count partly. The mask/pop arrays are in
+    # `tract_ids` order (e.g. the boundary engine's) and are realigned to the crosswalk.
+    # `table` (finance_table) sizes the county government's weight.
+    tracts = pd.DataFrame({'mask': np.asarray(tract_mask, dtype=float),
+                           'pop': np.asarray(tract_pop, dtype=float)}, index=tract_ids)
+    tracts = tracts.reindex(crosswalk.source_ids).fillna(0.0)
+    mask, pop = tracts['mask'].to_numpy(), tracts['pop'].to_numpy()
+    inside = crosswalk.to_target(mask * pop).iloc[:, 0]
+    total = crosswalk.to_target(pop).iloc[:, 0]
+    share = (inside / total.where(total > 0)).fillna(0.0).clip(0, 1)
+    share = share[~share.index.duplicated()]
+    # The county government's totals cover the whole county, not just the unincorporated
+    # area its geometry draws, so it comes along per unincorporated resident brought in
+    if COUNTY_GOVERNMENT in share.index and COUNTY_GOVERNMENT in table.index:
+        county_pop = table.loc[COUNTY_GOVERNMENT, 'Population']
+        share[COUNTY_GOVERNMENT] = inside[COUNTY_GOVERNMENT] / county_pop if county_pop > 0 else 0.0
+    return share
+
+
+def scenario_grid(**ranges):
+    # Cartesian product of the assumption values -> one row per scenario. Assumptions not
+    # given take their DEFAULT_PARAMS value.
+    values = {k: np.atleast_1d(ranges.get(k, v)) for k, v in DEFAULT_PARAMS.items()}
+    unknown = set(ranges) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f'unknown scenario parameters: {sorted(unknown)}')
+    return pd.DataFrame(list(itertools.product(*values.values())), columns=list(values))
+
+
+def simulate(table, members, params):
+    # `table` comes from finance_table; `members` is a Series of membership weights by
+    # municipality (0-1) or a DataFrame with one such column per candidate member set;
+    # `params` is a scenario_grid frame. Returns one row per (member set, scenario).
+    members = members.to_frame() if isinstance(members, pd.Series) else members
+    weights = members.reindex(table.index).fillna(0.0).to_numpy(dtype=float).T  # (S, n)
+    absorbed = weights * (table.index != CORE_MUNICIPALITY)
+
+    # Pooled totals per member set: (S,)
+    pop = weights @ table['Population'].to_numpy()
+    revenue = weights @ table['Total Revenue'].to_numpy()
+    fines = weights @ table['Court Fines Revenue'].to_numpy()
+    expenditures = weights @ table['Total Expenditures'].to_numpy()
+    absorbed_payroll = absorbed @ table['Sum Total Payroll'].to_numpy()
+    absorbed_spending = absorbed @ table['Total Expenditures'].to_numpy() - absorbed_payroll
+
+    # Assumptions broadcast against member sets: (S, 1) x (1, P) -> (S, P)
+    p = {k: params[k].to_numpy(dtype=float)[None, :] for k in DEFAULT_PARAMS}
+    col = lambda a: a[:, None]
+    new_revenue = col(revenue) - (1 - p['fines_retained']) * col(fines)
+    savings = p['payroll_savings'] * col(absorbed_payroll) + p['service_savings'] * col(absorbed_spending)
+    new_expenditures = col(expenditures) - savings + p['transition_cost'] * col(pop)
+    safe_pop = col(np.where(pop > 0, pop, np.nan))
+    new_exp_pc = new_expenditures / safe_pop
+
+    # Residents whose per-capita spending burden goes up under the pooled budget
+    current_pc = (table['Total Expenditures'] / table['Population'].where(table['Population'] > 0)).to_numpy()
+    member_pop = weights * table['Population'].to_numpy()  # (S, n)
+    higher = new_exp_pc[:, :, None] > current_pc[None, None, :]  # (S, P, n)
+    pop_higher = (higher * member_pop[:, None, :]).sum(axis=2)
+
+    out = {
+        'Population': np.broadcast_to(col(pop), new_revenue.shape),
+        'Revenue': new_revenue,
+        'Expenditures': new_expenditures,
+        'Savings': savings,
+        'Balance': new_revenue - new_expenditures,
+        'Revenue Per Capita': new_revenue / safe_pop,
+        'Expenditures Per Capita': new_exp_pc,
+        'Balance Per Capita': (new_revenue - new_expenditures) / safe_pop,
+        'Baseline Expenditures Per Capita': np.broadcast_to(col(expenditures) / safe_pop, new_revenue.shape),
+        'Population With Higher Burden': pop_higher,
+    }
+    n_sets, n_params = new_revenue.shape
+    result = pd.DataFrame({k: np.asarray(v).ravel() for k, v in out.items()})
+    result.insert(0, 'members', np.repeat(members.columns.to_numpy(), n_params))
+    return pd.concat([result, pd.concat([params.reset_index(drop=True)] * n_sets, ignore_index=True)],
+                     axis=1)
+
+
+def member_burdens(table, members, **params):
+    # Per-municipality view of one scenario: current vs consolidated spending per capita
+    result = simulate(table, members, scenario_grid(**params)).iloc[0]
+    weights = members.reindex(table.index).fillna(0.0)
+    current = table['Total Expenditures'] / table['Population'].where(table['Population'] > 0)
+    burdens = pd.DataFrame({'Share In Consolidation': weights,
+                            'Current Expenditures Per Capita': current,
+                            'Consolidated Expenditures Per Capita': result['Expenditures Per Capita']})
+    burdens['Change Per Capita'] = (burdens['Consolidated Expenditures Per Capita']
+                                    - burdens['Current Expenditures Per Capita'])
+    return burdens[weights > 0].sort_values('Change Per Capita')
+
+
+# --- Command line report ---
+
+def _new_stl_members(table, threshold, manual):
+    engine = BoundaryEngine.load(index_path('boundary_engine'))
+    mask = (engine.select(threshold, include=MANUAL_INCLUDE, exclude=MANUAL_EXCLUDE) if manual
+            else engine.select(threshold))
+    path = index_path(crosswalk_name('tract_muni'))
+    crosswalk = (Crosswalk.load(path) if os.path.exists(path)
+                 else Crosswalk.from_layers('tract_muni', read_layer))
+    return members_from_tracts(crosswalk, engine.tract_ids, mask, engine.pop, table)
+
+
+def _span(tokens):
+    # "0.5" -> [0.5]; "0.2 0.4 0.6" -> those three; "0:1:11" -> 11 evenly spaced values
+    # from 0 to 1. Tokens can be mixed.
+    values = []
+    for token in tokens:
+        if ':' in token:
+            start, stop, num = token.split(':')
+            values.extend(np.linspace(float(start), float(stop), int(num)))
+        else:
+            values.append(float(token))
+    return np.asarray(values, dtype=float)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fiscal scenarios for a consolidated New St. Louis.')
+    parser.add_argument('--threshold', type=int, default=DEFAULT_DENSITY_THRESHOLD,
+                        help='density threshold (people/sq mi) for the New St. Louis tracts')
+    parser.add_argument('--no-manual', dest='manual', action='store_false',
+                        help='skip the manual tract adjustments (applied by default, as in the app)')
+    for name, default in DEFAULT_PARAMS.items():
+        parser.add_argument(f'--{name.replace("_", "-")}', nargs='+', default=[str(default)],
+                            help=f'one value, a list, or START:STOP:NUM (default {default})')
+    parser.add_argument('--out', help='write every scenario to this csv')
+    args = parser.parse_args()
+
+    table = finance_table(read_layer('munis_merged', columns=['Municipality'] + FINANCE_COLUMNS))
+    members = _new_stl_members(table, args.threshold, args.manual).rename('New St. Louis')
+    grid = scenario_grid(**{k: _span(getattr(args, k)) for k in DEFAULT_PARAMS})
+    results = simulate(table, members, grid)
+
+    print(f'New St. Louis at {args.threshold:,} people/sq mi: {len(members[members > 0])} municipalities, '
+          f'{results["Population"].iloc[0]:,.0f} residents, {len(grid):,} scenarios')
+    summary = results[['Savings', 'Balance', 'Revenue Per Capita', 'Expenditures Per Capita',
+                       'Balance Per Capita', 'Population With Higher Burden']]
+    print(summary.describe(percentiles=[0.05, 0.5, 0.95]).T.round(1).to_string())
+    print(f'Share of scenarios with a surplus: {(results["Balance"] >= 0).mean():.1%}')
+    if args.out:
+        results.to_csv(args.out, index=False)
+        print(f'wrote {args.out}')
@@ -0,0 +1,94 @@
+# --- MULTI-RESOLUTION SIMPLIFIED GEOMETRIES FOR THE DASHBOARD ---
+# At the dashboard's default zoom most polygon vertices are sub-pixel, so we precompute
+# simplified copies of each polygon layer at a few tolerances and let the app pick the
+# level matching the current zoom. Polygon layers that tile the plane (tracts, munis,
+# fire districts) are simplified as a coverage so neighbours keep an identical shared
+# border, and every level is snapped to a coordinate grid to shrink the serialized JSON.
+# Source layers whose neighbours overlap or don't share vertices (munis_merged, firedist,
+# police) are cleaned into a coverage first.
+import warnings
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+# level: (simplification tolerance, coordinate grid size), both in degrees (EPSG:4326).
+# At St. Louis' latitude one screen pixel is roughly 0.0013 deg at zoom 10, 0.0003 at
+# zoom 12 and 0.00008 at zoom 14.
+LEVELS = {
+    'low': (0.001, 0.0001),
+    'medium': (0.00025, 0.00002),
+    'high': (0.00006, 0.000005),
+}
+
+# Highest zoom each level is used for; past the last one the full layer is served
+LEVEL_MAX_ZOOM = {'low': 10, 'medium': 12, 'high': 14}
+
+# Derived layers that get simplified copies
+SIMPLIFIED_LAYERS = ['all_tracts', 'newstl_tracts', 'newstl_dis', 'cur_city_dis', 'munis_merged',
+                     'firedist', 'police', 'tract_coverage', 'tract_transit', 'muni_transit',
+                     'busroute', 'metroroute']
+
+
+def level_for_zoom(zoom):
+    for level, max_zoom in LEVEL_MAX_ZOOM.items():
+        if zoom <= max_zoom:
+            return level
+    return None
+
+
+def layer_name(name, level):
+    return name if level is None else f'{name}_{level}'
+
+
+def _coverage(geoms, grid_size):
+    # The polygons snapped to the grid as a valid coverage, or None if they can't be one.
+    # coverage_simplify needs shapely 2.1 / GEOS 3.12, coverage_clean shapely 2.2 / GEOS 3.14.
+    if not hasattr(shapely, 'coverage_simplify'):
+        return None
+    # Only polygon layers can be coverages; route lines are simplified one by one
+    if not set(shapely.get_type_id(geoms).tolist()) <= {3, 6}:  # Polygon, MultiPolygon
+        return None
+    geoms = shapely.set_precision(shapely.make_valid(geoms), grid_size)
+    if shapely.coverage_is_valid(geoms):
+        return geoms
+    if hasattr(shapely, 'coverage_clean') and set(shapely.get_type_id(geoms).tolist()) <= {3, 6}:
+        # Overlaps go to the neighbour with the longest shared border, slivers narrower
+        # than a grid cell are closed, and near-coincident borders are snapped together
+        return shapely.coverage_clean(geoms, gap_width=grid_size)
+    return None
+
+
+def simplify_layer(gdf, level, name=None):
+    tolerance, grid_size = LEVELS[level]
+    geoms = gdf.geometry.to_numpy()
+    simplified = geoms.copy()
+    present = ~shapely.is_missing(geoms)
+
+    coverage = _coverage(geoms[present], grid_size) if present.sum() > 1 else None
+    if coverage is not None:
+        # Simplifies each shared edge once, so adjacent polygons stay gap/overlap free.
+        # The kept vertices are already on the grid.
+        reduced = shapely.coverage_simplify(coverage, tolerance)
+        # Slivers can collapse to empty at coarse tolerances; keep the cleaned piece there
+        empty = shapely.is_empty(reduced)
+        reduced[empty] = coverage[empty]
+    else:
+        if present.sum() > 1 and np.isin(shapely.get_type_id(geoms[present]), [3, 6]).any():
+            warnings.warn(f'{name or "layer"}: not a valid polygon coverage, simplifying '
+                          'polygons one by one; shared borders may not match')
+        # Snapping identical shared vertices to the same grid point keeps borders consistent
+        reduced = shapely.set_precision(
+            shapely.simplify(geoms[present], tolerance, preserve_topology=True), grid_size)
+        # Slivers can collapse to empty at coarse tolerances; keep the original there
+        empty = shapely.is_empty(reduced)
+        reduced[empty] = geoms[present][empty]
+    simplified[present] = reduced
+
+    out = gdf.copy()
+    out.geometry = gpd.GeoSeries(simplified, index=gdf.index, crs=gdf.crs)
+    return out
+
+
+def simplified_levels(gdf, name=None):
+    return {level: simplify_layer(gdf, level, name) for level in LEVELS}
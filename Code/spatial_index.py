@@ -0,0 +1,150 @@
+# --- SPATIAL INDEX SERVICE FOR THE DERIVED LAYERS ---
+# STRtree-backed indexes over the derived layers with batch queries that work on whole
+# arrays of points at once: which polygon contains each point, the k nearest features
+# and their distances. Indexes are pickled to data/derived-data/indexes/ so they are
+# built once per data refresh rather than per request.
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from derived_io import read_layer
+
+base_dir = Path(__file__).resolve().parent.parent
+path_indexes = os.path.join(base_dir, 'data', 'derived-data', 'indexes')
+
+# All distance work happens in NAD83 / UTM zone 15N (meters)
+PROJECTED_CRS = 'EPSG:26915'
+METERS_PER_MILE = 1609.344
+
+# Derived layer -> column used to label its features
+INDEXED_LAYERS = {
+    'all_tracts': 'TRACT',
+    'munis_merged': 'Municipality',
+    'firedist': 'District',
+    'firestat': 'Engine',
+    'metrostat': 'StopName',
+    'busstat': 'StopID',
+}
+
+
+def index_path(name, path_dir=path_indexes):
+    return os.path.join(path_dir, f'{name}.pkl')
+
+
+def to_projected_points(points):
+    # Accepts a GeoSeries/GeoDataFrame (any CRS) or an (n, 2) array of lon/lat
+    if isinstance(points, (gpd.GeoSeries, gpd.GeoDataFrame)):
+        return points.to_crs(PROJECTED_CRS).geometry.to_numpy()
+    xy = np.asarray(points, dtype=float)
+    return gpd.GeoSeries(gpd.points_from_xy(xy[:, 0], xy[:, 1]), crs='EPSG:4326') \
+        .to_crs(PROJECTED_CRS).to_numpy()
+
+
+class SpatialIndex:
+    def __init__(self, gdf, id_col):
+        gdf = gdf.to_crs(PROJECTED_CRS)
+        self.ids = gdf[id_col].to_numpy()
+        self.geoms = gdf.geometry.to_numpy()
+        self.tree = shapely.STRtree(self.geoms)
+
+    @classmethod
+    def from_layer(cls, name, id_col=None):
+        id_col = id_col or INDEXED_LAYERS[name]
+        return cls(read_layer(name, columns=[id_col]), id_col)
+
+    # --- Persistence ---
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    # --- Batch queries (geometries in PROJECTED_CRS) ---
+
+    def containing(self, points):
+        # Id of the feature containing each point, or None. Where features overlap the
+        # first match wins.
+        points = np.asarray(points)
+        point_idx, tree_idx = self.tree.query(points, predicate='within')
+        out = np.full(len(points), None, dtype=object)
+        first = np.unique(point_idx, return_index=True)[1]
+        out[point_idx[first]] = self.ids[tree_idx[first]]
+        return out
+
+    def nearest(self, points, k=1):
+        # Ids and distances (meters) of the k nearest features, each shaped (n, k)
+        points = np.asarray(points)
+        if k == 1:
+            (point_idx, tree_idx), dist = self.tree.query_nearest(
+                points, return_distance=True, all_matches=False)
+            ids = np.full((len(points), 1), None, dtype=object)
+            dists = np.full((len(points), 1), np.nan)
+            ids[point_idx, 0] = self.ids[tree_idx]
+            dists[point_idx, 0] = dist
+            return ids, dists
+
+        # Facility layers are small (dozens to a few thousand features), so a vectorized
+        # distance matrix plus a partial sort beats k successive tree searches
+        k = min(k, len(self.geoms))
+        matrix = shapely.distance(points[:, None], self.geoms[None, :])
+        nearest_idx = np.argpartition(matrix, k - 1, axis=1)[:, :k]
+        nearest_dist = np.take_along_axis(matrix, nearest_idx, axis=1)
+        order = np.argsort(nearest_dist, axis=1)
+        nearest_idx = np.take_along_axis(nearest_idx, order, axis=1)
+        return self.ids[nearest_idx], np.take_along_axis(nearest_dist, order, axis=1)
+
+    def count_within(self, polygons, distance=0):
+        # Number of indexed features within `distance` meters of each polygon
+        polygons = np.asarray(polygons)
+        if distance:
+            poly_idx, _ = self.tree.query(polygons, predicate='dwithin', distance=distance)
+        else:
+            poly_idx, _ = self.tree.query(polygons, predicate='intersects')
+        return np.bincount(poly_idx, minlength=len(polygons))
+
+
+def load_index(name, path_dir=path_indexes):
+    path = index_path(name, path_dir)
+    if os.path.exists(path):
+        return SpatialIndex.load(path)
+    return SpatialIndex.from_layer(name)
+
+
+# --- Per-tract service coverage ---
+
+def tract_service_coverage(tracts, indexes):
+    # One row per tract: containing municipality and fire district, nearest fire station
+    # and MetroLink station with distances (miles), and bus stops inside the tract.
+    # firestat only has the City of St. Louis' stations, so the fire station columns are
+    # left empty outside the city rather than reading as a gap in county service.
+    tracts = tracts.to_crs(PROJECTED_CRS)
+    in_city = (tracts['COUNTY'] == 'St. Louis city').to_numpy()
+    polygons = tracts.geometry.to_numpy()
+    inside = shapely.point_on_surface(polygons)
+    centroids = shapely.centroid(polygons)
+
+    fire_ids, fire_dist = indexes['firestat'].nearest(centroids)
+    metro_ids, metro_dist = indexes['metrostat'].nearest(centroids)
+
+    coverage = pd.DataFrame({
+        'TRACT': tracts['TRACT'].to_numpy(),
+        'Municipality': indexes['munis_merged'].containing(inside),
+        'Fire District': indexes['firedist'].containing(inside),
+        'Nearest Fire Station': pd.Series(fire_ids[:, 0]).where(in_city).to_numpy(),
+        'Miles to Fire Station': np.where(in_city, fire_dist[:, 0] / METERS_PER_MILE, np.nan),
+        'Nearest Metro Station': metro_ids[:, 0],
+        'Miles to Metro Station': metro_dist[:, 0] / METERS_PER_MILE,
+        'Bus Stops in Tract': indexes['busstat'].count_within(polygons),
+    })
+    return gpd.GeoDataFrame(coverage, geometry=tracts.geometry.to_crs('EPSG:4326').to_numpy(),
+                            crs='EPSG:4326')
@@ -0,0 +1,151 @@
+# --- SHARED-EDGE TOPOLOGY FOR FAST DISSOLVES ---
+# Census tracts tile the region, so every interior border is an edge shared by exactly two
+# tracts. We break every ring into segments once, give each distinct segment an id, and
+# record which tracts use it. The outline of any set of tracts is then the segments used
+# an odd number of times within the set (interior edges cancel out), polygonized, instead
+# of a general-purpose polygon union. Adding or removing one tract only touches that
+# tract's own segments, which is what the interactive boundary tools need.
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Coordinates are matched on a grid this fine (degrees, ~1 cm) so vertices written out by
+# different tracts compare equal even after a round trip through GeoJSON
+DEFAULT_GRID_SIZE = 1e-7
+
+# Outlines whose area drifts from the summed tract area by more than this share mean the
+# edges didn't line up (e.g. a vertex on one side only); those fall back to union_all
+AREA_TOLERANCE = 1e-6
+
+
+class Topology:
+    def __init__(self, geoms, index=None, grid_size=DEFAULT_GRID_SIZE):
+        self.geoms = np.asarray(geoms)
+        self.n = len(self.geoms)
+        self.index = pd.Index(range(self.n)) if index is None else pd.Index(index)
+        self.areas = shapely.area(self.geoms)
+
+        # Rings of every polygon (multipolygons split into parts), then their vertices
+        parts, part_owner = shapely.get_parts(self.geoms, return_index=True)
+        rings, ring_part = shapely.get_rings(parts, return_index=True)
+        coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+
+        # Consecutive vertices of the same ring form a segment
+        same_ring = coord_ring[:-1] == coord_ring[1:]
+        start, end = coords[:-1][same_ring], coords[1:][same_ring]
+        owner = part_owner[ring_part[coord_ring[:-1][same_ring]]]
+
+        # Undirected segment key on the grid: both endpoints, lower one first
+        qa = np.round(start / grid_size).astype(np.int64)
+        qb = np.round(end / grid_size).astype(np.int64)
+        keep = (qa != qb).any(axis=1)
+        qa, qb, start, end, owner = qa[keep], qb[keep], start[keep], end[keep], owner[keep]
+        swap = (qa[:, 0] > qb[:, 0]) | ((qa[:, 0] == qb[:, 0]) & (qa[:, 1] > qb[:, 1]))
+        keys = np.where(swap[:, None], np.hstack([qb, qa]), np.hstack([qa, qb]))
+        _, first, segment_ids = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        segment_ids = segment_ids.ravel()
+
+        # One representative copy of each distinct segment, as (n_segments, 2, 2) coords
+        self.segments = np.stack([start[first], end[first]], axis=1)
+        self.n_segments = len(first)
+
+        # Segment ids per polygon in CSR layout: polygon i owns ids[indptr[i]:indptr[i + 1]]
+        order = np.argsort(owner, kind='stable')
+        self.polygon_segments = segment_ids[order]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(owner, minlength=self.n))])
+
+    @classmethod
+    def from_frame(cls, gdf, grid_size=DEFAULT_GRID_SIZE):
+        return cls(gdf.geometry.to_numpy(), index=gdf.index, grid_size=grid_size)
+
+    def segments_of(self, i):
+        return self.polygon_segments[self.indptr[i]:self.indptr[i + 1]]
+
+    def positions(self, labels):
+        # Positions of frame index labels (e.g. a filtered copy of the source frame)
+        positions = self.index.get_indexer(labels)
+        if (positions < 0).any():
+            raise KeyError('rows not in the topology: '
+                           f'{list(pd.Index(labels)[positions < 0][:5])}')
+        return positions
+
+    def mask_for(self, labels):
+        mask = np.zeros(self.n, dtype=bool)
+        mask[self.positions(labels)] = True
+        return mask
+
+    # --- Outlines ---
+
+    def counts(self, mask):
+        # How many selected polygons use each segment
+        selected = np.repeat(mask, np.diff(self.indptr))
+        return np.bincount(self.polygon_segments[selected], minlength=self.n_segments)
+
+    def build(self, boundary):
+        # Polygonize a set of boundary segment ids; build_area turns nested rings into holes
+        if not len(boundary):
+            return shapely.Polygon()
+        lines = shapely.multilinestrings(shapely.linestrings(self.segments[boundary]))
+        return shapely.build_area(shapely.line_merge(lines))
+
+    def checked(self, outline, mask):
+        # build_area can close rings around holes where tracts only touch at a corner;
+        # those outlines cover more than the selection, so fall back to a real union
+        expected = self.areas[mask].sum()
+        if expected and abs(shapely.area(outline) - expected) > AREA_TOLERANCE * expected:
+            return shapely.union_all(self.geoms[mask])
+        return outline
+
+    def outline(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        return self.checked(self.build(np.flatnonzero(self.counts(mask) % 2 == 1)), mask)
+
+
+class Outline:
+    # Boundary of a changing tract selection. Toggling a tract updates the per-segment
+    # counts for that tract's segments only; the polygon is rebuilt lazily when asked for.
+    def __init__(self, topology, mask=None):
+        self.topology = topology
+        self.mask = np.zeros(topology.n, dtype=bool) if mask is None else np.asarray(mask, dtype=bool).copy()
+        self.count = topology.counts(self.mask)
+        self._geometry = None
+
+    def add(self, i):
+        if not self.mask[i]:
+            self.mask[i] = True
+            np.add.at(self.count, self.topology.segments_of(i), 1)
+            self._geometry = None
+
+    def remove(self, i):
+        if self.mask[i]:
+            self.mask[i] = False
+            np.subtract.at(self.count, self.topology.segments_of(i), 1)
+            self._geometry = None
+
+    def boundary(self):
+        return np.flatnonzero(self.count % 2 == 1)
+
+    @property
+    def geometry(self):
+        if self._geometry is None:
+            self._geometry = self.topology.checked(self.topology.build(self.boundary()), self.mask)
+        return self._geometry
+
+
+def dissolve(gdf, by=None, aggfunc='first', topology=None):
+    # Stand-in for GeoDataFrame.dissolve that builds each group's outline from the topology.
+    # Pass a topology built from a superset of `gdf` (same index) to reuse it across calls.
+    topology = topology if topology is not None else Topology.from_frame(gdf)
+    geom_col = gdf.geometry.name
+    keys = gdf[by] if by is not None else pd.Series(0, index=gdf.index)
+
+    data = gdf.drop(columns=geom_col)
+    if by is not None and not isinstance(aggfunc, dict):
+        data = data.drop(columns=by)
+    data = data.groupby(keys).agg(aggfunc)
+
+    groups = gdf.index.groupby(keys)
+    outlines = [topology.outline(topology.mask_for(groups[key])) for key in data.index]
+    return gpd.GeoDataFrame(data, geometry=gpd.GeoSeries(outlines, index=data.index, crs=gdf.crs),
+                            crs=gdf.crs)
@@ -0,0 +1,80 @@
+# --- TRANSIT ACCESSIBILITY PER TRACT AND MUNICIPALITY ---
+# Bus and MetroLink service summarized over areas (tracts or municipalities) for the
+# dashboard's choropleths:
+#   - stops within walking distance of the area (1/4 mile for bus, 1/2 mile for MetroLink)
+#   - miles of bus / MetroLink route running through the area
+#   - distance from the area's center to the nearest MetroLink station
+#   - a combined access index (average percentile of the measures above)
+# Everything is a batch query: one STRtree pass per stop layer with a `dwithin`
+# predicate, and one tree query plus a vectorized intersection for the route lengths,
+# so the whole region takes seconds.
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from spatial_index import METERS_PER_MILE, PROJECTED_CRS
+
+# Walking distances (miles) around each area
+BUS_WALK_MILES = 0.25
+METRO_WALK_MILES = 0.5
+
+# Derived layer -> (area layer, id column)
+TRANSIT_LAYERS = {
+    'tract_transit': ('all_tracts', 'TRACT'),
+    'muni_transit': ('munis_merged', 'Municipality'),
+}
+
+ACCESS_COLUMNS = ['Bus Stops Within 1/4 Mile', 'Bus Stops Per Sq Mi',
+                  'MetroLink Stations Within 1/2 Mile', 'Bus Route Miles',
+                  'MetroLink Route Miles', 'Route Miles Per Sq Mi', 'Miles to MetroLink',
+                  'Transit Access Index']
+
+
+def route_miles(polygons, routes):
+    # Miles of route line inside each polygon (overlapping routes each count)
+    routes = np.asarray(routes)
+    if not len(routes):
+        return np.zeros(len(polygons))
+    poly_idx, route_idx = shapely.STRtree(routes).query(polygons, predicate='intersects')
+    lengths = shapely.length(shapely.intersection(polygons[poly_idx], routes[route_idx]))
+    return np.bincount(poly_idx, weights=lengths, minlength=len(polygons)) / METERS_PER_MILE
+
+
+def transit_access(areas, id_col, indexes, bus_routes, metro_routes):
+    # One row per area. `indexes` holds the busstat and metrostat SpatialIndex; the route
+    # layers are GeoDataFrames in any CRS.
+    areas = areas[[id_col, areas.geometry.name]].to_crs(PROJECTED_CRS)
+    areas = areas.set_geometry(areas.geometry.make_valid())
+    # An area stored as several rows (Pacific in munis_merged) is scored once as a whole,
+    # so its stops and routes aren't split across the pieces
+    if areas[id_col].duplicated().any():
+        areas = areas.dissolve(by=id_col, as_index=False, sort=False)
+    polygons = areas.geometry.to_numpy()
+    sqmi = shapely.area(polygons) / METERS_PER_MILE ** 2
+    safe_sqmi = np.where(sqmi > 0, sqmi, np.nan)
+
+    bus_walk = indexes['busstat'].count_within(polygons, BUS_WALK_MILES * METERS_PER_MILE)
+    bus_inside = indexes['busstat'].count_within(polygons)
+    metro_walk = indexes['metrostat'].count_within(polygons, METRO_WALK_MILES * METERS_PER_MILE)
+    bus_miles = route_miles(polygons, bus_routes.to_crs(PROJECTED_CRS).geometry.to_numpy())
+    metro_miles = route_miles(polygons, metro_routes.to_crs(PROJECTED_CRS).geometry.to_numpy())
+    _, metro_dist = indexes['metrostat'].nearest(shapely.centroid(polygons))
+
+    access = pd.DataFrame({
+        id_col: areas[id_col].to_numpy(),
+        'Bus Stops Within 1/4 Mile': bus_walk,
+        'Bus Stops Per Sq Mi': bus_inside / safe_sqmi,
+        'MetroLink Stations Within 1/2 Mile': metro_walk,
+        'Bus Route Miles': bus_miles,
+        'MetroLink Route Miles': metro_miles,
+        'Route Miles Per Sq Mi': (bus_miles + metro_miles) / safe_sqmi,
+        'Miles to MetroLink': metro_dist[:, 0] / METERS_PER_MILE,
+    })
+    # 0-100: average percentile rank, closer MetroLink counts as better
+    ranks = pd.concat([access['Bus Stops Per Sq Mi'].rank(pct=True),
+                       access['Route Miles Per Sq Mi'].rank(pct=True),
+                       (-access['Miles to MetroLink']).rank(pct=True)], axis=1)
+    access['Transit Access Index'] = (ranks.mean(axis=1) * 100).round(1)
+    return gpd.GeoDataFrame(access, geometry=areas.geometry.to_crs('EPSG:4326').to_numpy(),
+                            crs='EPSG:4326')
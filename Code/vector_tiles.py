@@ -0,0 +1,261 @@
+# --- VECTOR TILE (MVT) EXPORT AND LOCAL TILE SERVER ---
+# Cuts the derived layers into Mapbox Vector Tiles stored in a single MBTiles (SQLite)
+# archive, and serves them over HTTP so the dashboard only downloads the tiles in view
+# at the current zoom instead of whole GeoJSON layers.
+#
+#   python Code/preprocessing.py tiles                     # build the archive
+#   python Code/vector_tiles.py serve --port 8081          # serve it locally
+#   STL_TILE_URL=http://localhost:8081/tiles/{z}/{x}/{y}.pbf streamlit run streamlit-app/app.py
+import argparse
+import gzip
+import json
+import math
+import os
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+base_dir = Path(__file__).resolve().parent.parent
+default_mbtiles = os.path.join(base_dir, 'data', 'derived-data', 'stl_layers.mbtiles')
+
+# Web Mercator half-width in meters
+ORIGIN_SHIFT = 2 * math.pi * 6378137 / 2.0
+TILE_EXTENT = 4096
+
+# Layers written to the archive: derived layer name -> tile layer name
+TILE_LAYERS = {
+    'all_tracts': 'tracts',
+    'munis_merged': 'munis',
+    'newstl_dis': 'newstl',
+    'busroute': 'busroute',
+    'busstat': 'busstat',
+    'metroroute': 'metroroute',
+    'metrostat': 'metrostat',
+    'firedist': 'firedist',
+    'police': 'police',
+}
+
+
+# --- Tile math ---
+
+def tile_range(bounds, zoom):
+    # bounds are lon/lat (minx, miny, maxx, maxy); returns inclusive x and y ranges
+    minx, miny, maxx, maxy = bounds
+    n = 2 ** zoom
+
+    def to_tile(lon, lat):
+        lat = max(min(lat, 85.0511), -85.0511)
+        x = int((lon + 180.0) / 360.0 * n)
+        y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    x0, y0 = to_tile(minx, maxy)
+    x1, y1 = to_tile(maxx, miny)
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def tile_bounds_mercator(x, y, zoom):
+    size = 2 * ORIGIN_SHIFT / 2 ** zoom
+    minx = -ORIGIN_SHIFT + x * size
+    maxy = ORIGIN_SHIFT - y * size
+    return (minx, maxy - size, minx + size, maxy)
+
+
+# --- Encoding ---
+
+def _feature_properties(df):
+    # MVT properties must be str/int/float/bool; missing values are simply left out
+    records = []
+    attrs = df.drop(columns=df.geometry.name)
+    for row in attrs.itertuples(index=False):
+        props = {}
+        for col, value in zip(attrs.columns, row):
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            if isinstance(value, (np.integer, np.floating, np.bool_)):
+                value = value.item()
+            elif not isinstance(value, (str, int, float, bool)):
+                value = str(value)
+            props[str(col)] = value
+        records.append(props)
+    return records
+
+
+class _TileLayer:
+    # Holds one layer in Web Mercator with its spatial index and pre-built properties
+    def __init__(self, name, gdf):
+        gdf = gdf.to_crs('EPSG:3857')
+        self.name = name
+        self.geoms = gdf.geometry.to_numpy()
+        self.props = _feature_properties(gdf)
+        self.tree = shapely.STRtree(self.geoms)
+        # Text columns are `str` (not object) dtype under pandas 3, so test for numbers
+        self.fields = {str(c): 'Number' if pd.api.types.is_numeric_dtype(gdf[c]) else 'String'
+                       for c in gdf.columns if c != gdf.geometry.name}
+
+    def features(self, bounds):
+        hits = self.tree.query(shapely.box(*bounds))
+        if len(hits) == 0:
+            return []
+        # Drop detail below one tile pixel at this zoom, then clip to the tile (with a small buffer)
+        pixel = (bounds[2] - bounds[0]) / TILE_EXTENT
+        buffer = pixel * 64
+        clip = (bounds[0] - buffer, bounds[1] - buffer, bounds[2] + buffer, bounds[3] + buffer)
+        geoms = shapely.simplify(self.geoms[hits], pixel, preserve_topology=True)
+        geoms = shapely.clip_by_rect(geoms, *clip)
+        return [{'geometry': geom, 'properties': self.props[i]}
+                for i, geom in zip(hits, geoms) if not geom.is_empty]
+
+
+def build_mbtiles(layers, path=default_mbtiles, min_zoom=8, max_zoom=14):
+    # `layers` maps tile layer names to GeoDataFrames
+    import mapbox_vector_tile
+
+    tile_layers = [_TileLayer(name, gdf) for name, gdf in layers.items() if gdf is not None]
+    lonlat_bounds = np.array([gdf.to_crs('EPSG:4326').total_bounds
+                              for gdf in layers.values() if gdf is not None])
+    bounds = (lonlat_bounds[:, 0].min(), lonlat_bounds[:, 1].min(),
+              lonlat_bounds[:, 2].max(), lonlat_bounds[:, 3].max())
+
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    con.executescript('''
+        CREATE TABLE metadata (name TEXT, value TEXT);
+        CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+    ''')
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        xs, ys = tile_range(bounds, zoom)
+        rows = []
+        for x in xs:
+            for y in ys:
+                tb = tile_bounds_mercator(x, y, zoom)
+                encoded_layers = [{'name': layer.name, 'features': layer.features(tb)}
+                                  for layer in tile_layers]
+                encoded_layers = [layer for layer in encoded_layers if layer['features']]
+                if not encoded_layers:
+                    continue
+                data = mapbox_vector_tile.encode(
+                    encoded_layers,
+                    default_options={'quantize_bounds': tb, 'extents': TILE_EXTENT})
+                # MBTiles uses TMS row numbering (origin bottom-left)
+                rows.append((zoom, x, 2 ** zoom - 1 - y, sqlite3.Binary(gzip.compress(data, mtime=0))))
+        con.executemany('INSERT INTO tiles VALUES (?, ?, ?, ?)', rows)
+        print(f'zoom {zoom}: {len(rows)} tiles')
+
+    metadata = {
+        'name': 'stl_layers',
+        'format': 'pbf',
+        'minzoom': str(min_zoom),
+        'maxzoom': str(max_zoom),
+        'bounds': ','.join(f'{b:.6f}' for b in bounds),
+        'center': f'{(bounds[0] + bounds[2]) / 2:.6f},{(bounds[1] + bounds[3]) / 2:.6f},{min_zoom + 2}',
+        'json': json.dumps({'vector_layers': [
+            {'id': layer.name, 'fields': layer.fields, 'minzoom': min_zoom, 'maxzoom': max_zoom}
+            for layer in tile_layers]}),
+    }
+    con.executemany('INSERT INTO metadata VALUES (?, ?)', metadata.items())
+    con.commit()
+    con.close()
+    os.replace(tmp_path, path)
+
+
+# --- Leaflet.VectorGrid styling for the dashboard ---
+
+def vectorgrid_options(layer, style_js):
+    # Every layer lives in the same archive, so all but `layer` are hidden ([] = not drawn)
+    styles = {name: '[]' for name in TILE_LAYERS.values()}
+    styles[layer] = style_js
+    body = ', '.join(f'"{name}": {style}' for name, style in styles.items())
+    return ('{"vectorTileLayerStyles": {' + body + '}, '
+            f'"interactive": true, "maxNativeZoom": 14, "rendererFactory": L.canvas.tile}}')
+
+
+def step_style_js(column, thresholds, colors, fill_opacity=0.7, line_opacity=0.2):
+    # JS style function that colors a feature by which bin `column` falls in, matching the
+    # equal-width bins folium.Choropleth draws for the GeoJSON version of the map
+    return (f'function (p, z) {{ var v = p[{json.dumps(column)}]; '
+            f'var t = {json.dumps([float(t) for t in thresholds])}; var c = {json.dumps(list(colors))}; '
+            'var i = 0; while (i < t.length && v > t[i]) { i++; } '
+            f'return {{fill: true, fillColor: c[Math.min(i, c.length - 1)], fillOpacity: {fill_opacity}, '
+            f'color: "black", weight: 1, opacity: {line_opacity}}}; }}')
+
+
+
+# --- Local tile server ---
+
+class _TileHandler(BaseHTTPRequestHandler):
+    mbtiles_path = default_mbtiles
+    _local = threading.local()
+
+    def _connection(self):
+        # sqlite connections can't be shared across the server's threads
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            uri = f'file:{self.mbtiles_path}?mode=ro'
+            con = self._local.con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return con
+
+    def _send(self, status, body=b'', content_type=None, gzipped=False):
+        self.send_response(status)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Cache-Control', 'public, max-age=3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if parts == ['metadata.json']:
+            rows = self._connection().execute('SELECT name, value FROM metadata').fetchall()
+            return self._send(200, json.dumps(dict(rows)).encode(), 'application/json')
+
+        if len(parts) == 4 and parts[0] == 'tiles' and parts[3].endswith('.pbf'):
+            try:
+                z, x, y = int(parts[1]), int(parts[2]), int(parts[3][:-4])
+            except ValueError:
+                return self._send(400)
+            row = self._connection().execute(
+                'SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?',
+                (z, x, 2 ** z - 1 - y)).fetchone()
+            if row is None:
+                # Empty tile: nothing to draw here
+                return self._send(204)
+            return self._send(200, bytes(row[0]), 'application/x-protobuf', gzipped=True)
+
+        self._send(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(path=default_mbtiles, host='127.0.0.1', port=8081):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'{path} not found; build it with `python Code/preprocessing.py tiles`')
+    handler = type('TileHandler', (_TileHandler,), {'mbtiles_path': path})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f'Serving {path} at http://{host}:{port}/tiles/{{z}}/{{x}}/{{y}}.pbf')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the vector tile archive.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve_parser = sub.add_parser('serve')
+    serve_parser.add_argument('path', nargs='?', default=default_mbtiles)
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    serve(args.path, args.host, args.port)
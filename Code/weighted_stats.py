@@ -0,0 +1,82 @@
+# --- VECTORIZED WEIGHTED GROUP STATISTICS ---
+# Population-weighted means, medians and quantiles for every numeric column of a frame,
+# per group, in one pass over NumPy arrays instead of building a statsmodels DescrStatsW
+# per group. Missing values are handled per column: a row only counts toward a column's
+# statistic where both the value and its weight are present.
+import numpy as np
+import pandas as pd
+
+
+def _prepare(df, by, weight, columns):
+    # Rows sorted by group code, the group keys, and the value/weight arrays
+    grouper = df.groupby(by, sort=True)
+    codes = grouper.ngroup().to_numpy()
+    keys = grouper.size().index
+
+    if columns is None:
+        exclude = {weight} | {b for b in np.atleast_1d(by) if isinstance(b, str)}
+        columns = [c for c in df.select_dtypes(include='number').columns if c not in exclude]
+
+    # Rows with a missing group key (ngroup == -1) belong to no group
+    rows = np.flatnonzero(codes >= 0)
+    rows = rows[np.argsort(codes[rows], kind='stable')]
+    codes = codes[rows]
+    values = df[columns].to_numpy(dtype=float)[rows]
+    weights = df[weight].to_numpy(dtype=float)[rows]
+
+    valid = ~np.isnan(values) & ~np.isnan(weights)[:, None]
+    w = np.where(valid, weights[:, None], 0.0)
+    starts = np.searchsorted(codes, np.arange(len(keys)))
+    return keys, columns, codes, starts, values, valid, w
+
+
+def weighted_mean(df, by, weight, columns=None):
+    # One row per group (indexed by the group keys), one column per numeric column
+    keys, columns, _, starts, values, valid, w = _prepare(df, by, weight, columns)
+    if not len(keys):
+        return pd.DataFrame(columns=columns, index=keys, dtype=float)
+    totals = np.add.reduceat(w, starts, axis=0)
+    sums = np.add.reduceat(np.where(valid, values, 0.0) * w, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(totals > 0, sums / totals, np.nan)
+    return pd.DataFrame(means, index=keys, columns=columns)
+
+
+def weighted_quantile(df, by, weight, q, columns=None):
+    # Weighted (inverted CDF) quantile: the smallest value whose cumulative weight within
+    # the group reaches q of the group's total weight
+    keys, columns, codes, starts, values, valid, w = _prepare(df, by, weight, columns)
+    if not len(keys):
+        return pd.DataFrame(columns=columns, index=keys, dtype=float)
+
+    # Sort every column by value within its group (NaNs last), all columns at once
+    order = np.argsort(values, axis=0, kind='stable')
+    order = np.take_along_axis(order, np.argsort(codes[order], axis=0, kind='stable'), axis=0)
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    sorted_w = np.take_along_axis(w, order, axis=0)
+
+    # Cumulative weight within each group
+    cum = np.cumsum(sorted_w, axis=0)
+    before = np.vstack([np.zeros((1, cum.shape[1])), cum])[starts]
+    cum -= np.repeat(before, np.diff(np.append(starts, len(codes))), axis=0)
+    totals = np.add.reduceat(sorted_w, starts, axis=0)
+
+    # Rows still short of the target are counted; the quantile is the next row
+    short = cum < q * totals[codes]
+    pick = starts[:, None] + np.add.reduceat(short.astype(np.int64), starts, axis=0)
+    pick = np.minimum(pick, len(codes) - 1)
+    quantiles = np.take_along_axis(sorted_values, pick, axis=0)
+    return pd.DataFrame(np.where(totals > 0, quantiles, np.nan), index=keys, columns=columns)
+
+
+def weighted_median(df, by, weight, columns=None):
+    return weighted_quantile(df, by, weight, 0.5, columns)
+
+
+def weighted_aggregate(df, by, weight, stat='mean', columns=None):
+    # stat is 'mean', 'median' or a quantile between 0 and 1
+    if stat == 'mean':
+        return weighted_mean(df, by, weight, columns)
+    if stat == 'median':
+        return weighted_median(df, by, weight, columns)
+    return weighted_quantile(df, by, weight, float(stat), columns)
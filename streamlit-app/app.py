@@ -1,11 +1,18 @@
 # --- 0. PACKAGES ---
 import streamlit as st
+import altair as alt
 import pandas as pd
 import numpy as np
 import geopandas as gpd
+import shapely
 import folium as fol
+from folium.plugins import FastMarkerCluster, VectorGridProtobuf
+from branca.colormap import StepColormap
+from branca.utilities import color_brewer
 from streamlit_folium import st_folium
+import json
 import os
+import sys
 from pathlib import Path
 
 
@@ -15,44 +22,584 @@ st.set_page_config(layout="wide", page_title="St. Louis Municipal Consolidation
 base_dir = Path(__file__).resolve().parent.parent
 path_cleaned_data = os.path.join(base_dir, 'data', 'derived-data')
 
-
-# Cache data loading for performance
-@st.cache_data
-def load_geojson(path_dir, filename):
-    path = os.path.join(path_dir, filename)
-    if not os.path.exists(path):
+# Shared helpers live with the processing code
+sys.path.append(os.path.join(base_dir, 'Code'))
+from derived_io import layer_signature, read_layer
+from simplify import layer_name, level_for_zoom
+from vector_tiles import step_style_js, vectorgrid_options
+from spatial_index import index_path
+from topology import dissolve
+from crosswalk import MUNI_ACS_MEASURES, Crosswalk, crosswalk_name, muni_acs
+from boundary_metrics import BoundaryMetrics
+from transit_access import ACCESS_COLUMNS
+from scenarios import (DEFAULT_PARAMS, FINANCE_COLUMNS, finance_table, member_burdens,
+                       members_from_tracts, scenario_grid, simulate)
+from boundary_engine import (DEFAULT_DENSITY_THRESHOLD, MANUAL_EXCLUDE, MANUAL_INCLUDE,
+                             BoundaryEngine)
+
+# Optional tile server mode: point STL_TILE_URL at `python Code/vector_tiles.py serve`
+# (e.g. http://localhost:8081/tiles/{z}/{x}/{y}.pbf) to stream large layers as tiles
+tile_url = os.environ.get('STL_TILE_URL')
+
+# Columns each layer needs for the maps and tables below
+tract_demo_cols = ["DENSITY", "Median HHI", "Total Population", "Proportion Black",
+                   "Proportion White", "Home Ownership Rate", 'Less than High School',
+                   'High School', "Associate's Degree", "Bachelor's Degree",
+                   "Master's Degree or Higher"]
+muni_cols = ['Municipality', 'Classification', 'Population', 'Year Incorporated',
+             'Median Household Income', 'Percent Black',
+             'Per Capita Admin Cost (winsorized)',
+             'Total Revenue Per Capita (winsorized)',
+             'Sales Tax Revenue Per Capita (winsorized)',
+             'Property Tax Revenue Per Capita (winsorized)',
+             'Utility Tax Revenue Per Capita (winsorized)',
+             'Court Fines Revenue Per Capita (winsorized)',
+             'Total Expenditures Per Capita (winsorized)',
+             'Elected Officials Per 50,000 People (winsorized)']
+coverage_tooltip_cols = ['TRACT', 'Municipality', 'Fire District', 'Nearest Fire Station',
+                         'Nearest Metro Station']
+# firestat only covers the City of St. Louis, so fire station distance is city tracts only
+coverage_options = ['Miles to Fire Station', 'Miles to Metro Station', 'Bus Stops in Tract']
+# Transit accessibility layers (transit_access.py): area level -> (layer, id column)
+transit_levels = {'Tracts': ('tract_transit', 'TRACT'), 'Municipalities': ('muni_transit', 'Municipality')}
+
+
+# Shared layer store. Layers are read once per server process (GeoParquet with only the
+# requested columns, or the GeoJSON export if that hasn't been built) and the same
+# GeoDataFrame is handed to every session: st.cache_resource doesn't pickle or copy on a
+# hit the way st.cache_data does. That makes the frames shared and read-only by
+# convention: callers `.copy()` before assigning columns or rows. Frames derived from
+# them (column subsets, filters) are already independent under pandas' copy-on-write.
+layer_store_size = 64
+
+@st.cache_resource(max_entries=layer_store_size)
+def read_shared_layer(name, columns, signature):
+    return read_layer(name, columns=list(columns) if columns is not None else None, path_dir=path_cleaned_data)
+
+# Last file signature seen per layer, shared across sessions
+@st.cache_resource
+def layer_signatures():
+    return {}
+
+def load_layer(name, columns=None):
+    # The signature (path, mtime, size) is part of the cache key, so a rebuilt file is
+    # read fresh. When one changes, the whole store is dropped so stale copies of the
+    # other column selections don't linger.
+    signature = layer_signature(name, path_cleaned_data)
+    seen = layer_signatures()
+    if name in seen and seen[name] != signature:
+        read_shared_layer.clear()
+    seen[name] = signature
+    if signature is None:
         return None
-    gdf = gpd.read_file(path)
-    
-    # Convert any datetime columns to strings to avoid JSON serialization errors
-    for col in gdf.columns:
-        if pd.api.types.is_datetime64_any_dtype(gdf[col]):
-            gdf[col] = gdf[col].astype(str)
-            
-    return gdf
-
-# Load datasets
-all_tracts = load_geojson(path_cleaned_data, 'all_tracts.geojson')
-newstl_dis = load_geojson(path_cleaned_data, 'newstl_dis.geojson')
-newstl_tracts = load_geojson(path_cleaned_data, 'newstl_tracts.geojson')
-county_plus_newstl = load_geojson(path_cleaned_data, 'county_plus_newstl.geojson')
-munis_merged = load_geojson(path_cleaned_data, 'munis_merged.geojson')
-
-@st.cache_data
-def get_current_city_boundary(_gdf):
-    city_gdf = _gdf[_gdf['COUNTY'] == 'St. Louis city'].copy()
+    return read_shared_layer(name, tuple(columns) if columns is not None else None, signature)
+
+# Nothing is loaded at startup. Each page asks for the layers (and only the columns) it
+# uses, the first time it needs them; load_layer's cache makes later calls free.
+layer_columns = {
+    'all_tracts': ['TRACT', 'COUNTY', 'SQMI'] + tract_demo_cols,
+    'newstl_dis': ['NAME'],
+    'cur_city_dis': ['NAME'],
+    'munis_merged': muni_cols,
+}
+
+def get_layer(name, columns=None):
+    return load_layer(name, columns if columns is not None else layer_columns.get(name))
+
+# The current city boundary is a derived layer (cur_city_dis). Older data folders don't
+# have it yet, so fall back to dissolving the city's tracts once.
+@st.cache_resource
+def dissolve_current_city():
+    tracts = get_layer('all_tracts')
+    if tracts is None:
+        return None
+    city_gdf = tracts[tracts['COUNTY'] == 'St. Louis city'][['COUNTY', 'geometry']].copy()
     city_gdf['DISID'] = 1
-    # Dissolve to get just the outer boundary
-    return city_gdf.dissolve(by='DISID')
+    # Dissolve to get just the outer boundary (drops the shared tract edges)
+    return dissolve(city_gdf, by='DISID')
+
+def get_current_city_boundary(zoom):
+    gdf = load_map_layer('cur_city_dis', layer_columns['cur_city_dis'], zoom)
+    return gdf if gdf is not None else dissolve_current_city()
+
+# The boundary engine answers "which tracts make up New St. Louis at this density
+# threshold" from the precomputed tract adjacency graph, so the slider on the regional
+# page can redraw the proposal live. Built from all_tracts if the pickle is missing.
+@st.cache_resource
+def load_boundary_engine():
+    path = index_path('boundary_engine')
+    if os.path.exists(path):
+        return BoundaryEngine.load(path)
+    tracts = get_layer('all_tracts')
+    return BoundaryEngine(tracts) if tracts is not None else None
+
+# Cached per-tract perimeters/hulls for compactness scores of any selection
+@st.cache_resource
+def load_boundary_metrics():
+    engine = load_boundary_engine()
+    return BoundaryMetrics(engine) if engine is not None else None
+
+def newstl_mask(threshold, manual):
+    engine = load_boundary_engine()
+    if manual:
+        return engine.select(threshold, include=MANUAL_INCLUDE, exclude=MANUAL_EXCLUDE)
+    return engine.select(threshold)
+
+@st.cache_resource(max_entries=64)
+def get_newstl_outline(threshold, manual):
+    outline = load_boundary_engine().outline(newstl_mask(threshold, manual))
+    return gpd.GeoDataFrame({'NAME': ['New St. Louis']}, geometry=[outline], crs='EPSG:4326')
+
+# Tract x municipality intersection areas (sparse), for moving tract ACS columns onto
+# municipalities and municipal finances onto tracts with one matrix product
+@st.cache_resource
+def load_crosswalk(name):
+    path = index_path(crosswalk_name(name))
+    if os.path.exists(path):
+        return Crosswalk.load(path)
+    return Crosswalk.from_layers(name, lambda layer, columns: get_layer(layer, columns))
+
+# Tract ACS measures by municipality (see MUNI_ACS_MEASURES in crosswalk.py); reads
+# exactly the tract columns the measures use
+@st.cache_resource
+def get_muni_acs():
+    columns = ['TRACT'] + list(dict.fromkeys(['Total Population'] + [c for c, _ in MUNI_ACS_MEASURES.values()]))
+    return muni_acs(load_crosswalk('tract_muni'), get_layer('all_tracts', columns))
+
+@st.cache_resource
+def get_tract_muni_revenue():
+    # Municipal revenue (per capita x population) spread over tracts by area share, in the
+    # boundary engine's tract order so it can be summed over any New St. Louis mask
+    tract_ids = load_boundary_engine().tract_ids
+    crosswalk = load_crosswalk('tract_muni')
+    munis = crosswalk.align_target(pd.DataFrame(get_layer('munis_merged').drop(columns='geometry')),
+                                   'Municipality')
+    revenue = munis['Total Revenue Per Capita (winsorized)'] * munis['Population']
+    return crosswalk.to_source(revenue).iloc[:, 0].reindex(tract_ids).fillna(0).to_numpy()
+
+# Fiscal scenario inputs: municipal finances and each municipality's share of residents
+# inside New St. Louis at the current slider setting
+@st.cache_resource
+def get_finance_table():
+    return finance_table(pd.DataFrame(get_layer('munis_merged', ['Municipality'] + FINANCE_COLUMNS)))
+
+@st.cache_resource
+def get_newstl_members(threshold, manual):
+    engine = load_boundary_engine()
+    members = members_from_tracts(load_crosswalk('tract_muni'), engine.tract_ids,
+                                  newstl_mask(threshold, manual), engine.pop, get_finance_table())
+    return members.rename('New St. Louis')
+
+# --- 1a. ZOOM-DEPENDENT LAYER DETAIL ---
+default_center = [38.64293421087117, -90.32506114168913]
+default_zoom = 10
+
+# Serve the simplified copy of a layer that matches the zoom, or the full layer if the
+# simplified files haven't been built
+def load_map_layer(name, columns, zoom):
+    gdf = load_layer(layer_name(name, level_for_zoom(zoom)), columns)
+    return gdf if gdf is not None else load_layer(name, columns)
+
+def get_view(page):
+    return st.session_state.get(f'view_{page}', (default_center, default_zoom))
+
+# Only move the stored view when the zoom crosses into another detail level. Panning
+# inside a level leaves the map HTML unchanged, so st_folium doesn't re-render it.
+def save_view(page, map_state):
+    if not map_state or map_state.get('zoom') is None or not map_state.get('center'):
+        return
+    _, zoom = get_view(page)
+    if level_for_zoom(map_state['zoom']) != level_for_zoom(zoom):
+        center = [map_state['center']['lat'], map_state['center']['lng']]
+        st.session_state[f'view_{page}'] = (center, map_state['zoom'])
+
+# --- 1b. VIEWPORT FILTERING ---
+# The big infrastructure layers are only sent for a window around what's on screen: the
+# viewport padded by half its size on every side. Panning within the window keeps the
+# same map; panning or zooming out of it moves the window and rebuilds the map, so the
+# payload stays about one screen's worth of features however large the layer is.
+viewport_padding = 0.5
+
+def view_bounds(center, zoom, width, height):
+    # Approximate (west, south, east, north) of a Leaflet map with 256px tiles
+    deg_per_px = 360 / (256 * 2 ** zoom)
+    half_w = width / 2 * deg_per_px
+    half_h = height / 2 * deg_per_px * np.cos(np.radians(center[0]))
+    return (center[1] - half_w, center[0] - half_h, center[1] + half_w, center[0] + half_h)
+
+def padded_window(bounds, pad=viewport_padding):
+    west, south, east, north = bounds
+    dx, dy = (east - west) * pad, (north - south) * pad
+    # Rounded so the window is a stable cache key for the map builder
+    return tuple(round(v, 4) for v in (west - dx, south - dy, east + dx, north + dy))
+
+def get_window(page, width, height):
+    if f'window_{page}' not in st.session_state:
+        center, zoom = get_view(page)
+        st.session_state[f'window_{page}'] = padded_window(view_bounds(center, zoom, width, height))
+    return st.session_state[f'window_{page}']
+
+def save_viewport(page, map_state, width, height):
+    # Like save_view, but also moves the window (and reruns to redraw) once the viewport
+    # leaves it or the detail level changes
+    if not map_state or map_state.get('zoom') is None or not map_state.get('bounds'):
+        return
+    bounds = map_state['bounds']
+    sw, ne = bounds.get('_southWest') or {}, bounds.get('_northEast') or {}
+    if sw.get('lat') is None or ne.get('lat') is None:
+        return
+    viewport = (sw['lng'], sw['lat'], ne['lng'], ne['lat'])
+    window = get_window(page, width, height)
+    _, zoom = get_view(page)
+    inside = (viewport[0] >= window[0] and viewport[1] >= window[1]
+              and viewport[2] <= window[2] and viewport[3] <= window[3])
+    if inside and level_for_zoom(map_state['zoom']) == level_for_zoom(zoom):
+        return
+    center = [map_state['center']['lat'], map_state['center']['lng']]
+    st.session_state[f'view_{page}'] = (center, map_state['zoom'])
+    st.session_state[f'window_{page}'] = padded_window(viewport)
+    st.rerun()
+
+def in_window(gdf, window):
+    # Features intersecting the window, via the layer's spatial index. The layer objects
+    # are shared (see load_layer), so each layer's STRtree is built once per process.
+    if gdf is None or window is None:
+        return gdf
+    hits = gdf.sindex.query(shapely.box(*window), predicate='intersects')
+    return gdf.iloc[np.sort(hits)]
+
+# --- 1c. MAP BUILDERS ---
+# Maps are built by cached functions keyed on the page's controls (variable, layer
+# toggles and view), so a rerun triggered by something unrelated reuses the finished
+# map instead of re-copying layers and re-serializing GeoJSON. The cache is shared by
+# all sessions and keeps the most recently used maps.
+map_cache_size = 32
+
+def add_boundaries(m, newstl_dis_map, cur_city_map, show_newstl_border, show_cur_city_border,
+                   newstl_weight=4, city_weight=3):
+    # Add New St. Louis Dissolved Boundary
+    if show_newstl_border and newstl_dis_map is not None:
+        fol.GeoJson(
+            newstl_dis_map,
+            name="Proposed New St. Louis",
+            style_function=lambda x: {
+                'fillColor': 'none',
+                'color': '#ff4b4b',
+                'weight': newstl_weight,
+                'dashArray': '5, 5'
+            }
+        ).add_to(m)
+
+    # Add Current STL Boundary
+    if show_cur_city_border and cur_city_map is not None:
+        fol.GeoJson(
+            cur_city_map,
+            name="Current City",
+            style_function=lambda x: {
+                'fillColor': 'none',
+                'color': '#2c3e50',
+                'weight': city_weight
+            }
+        ).add_to(m)
+
+# In tile mode the browser only fetches the tiles in view. Layers come from one archive,
+# so each VectorGrid shows its own layer and hides the rest.
+def add_tile_layer(m, tile_layer, name, style):
+    VectorGridProtobuf(tile_url, name, vectorgrid_options(tile_layer, json.dumps(style))).add_to(m)
+
+def add_tile_choropleth(m, tile_layer, name, values, column, fill_color, legend_name, bins=6):
+    # Same equal-width bins and ColorBrewer palette as folium.Choropleth
+    edges = np.histogram_bin_edges(values.dropna(), bins=bins)
+    colors = color_brewer(fill_color, bins)
+    VectorGridProtobuf(tile_url, name,
+                       vectorgrid_options(tile_layer, step_style_js(column, edges[1:-1], colors))).add_to(m)
+    StepColormap(colors, index=edges, vmin=edges[0], vmax=edges[-1], caption=legend_name).add_to(m)
+
+@st.cache_resource(max_entries=map_cache_size)
+def build_tract_map(demo_col, show_all_tracts, show_newstl_border, show_cur_city_border,
+                    center, zoom, use_tiles=False, threshold=DEFAULT_DENSITY_THRESHOLD,
+                    manual=True):
+    m = fol.Map(location=list(center), zoom_start=zoom, tiles='cartodb positron')
+
+    # Add All Tracts with Choropleth logic
+    tracts = load_map_layer('all_tracts', ['TRACT', 'COUNTY', 'SQMI'] + tract_demo_cols, zoom)
+    if show_all_tracts and tracts is not None:
+        # Handle cases where the demo_col might not match exactly due to previous renames
+        if demo_col == "Median Household Income" and "Median HHI" in tracts.columns:
+            target_col = "Median HHI"
+        else:
+            target_col = demo_col
+
+        # Only the columns the map uses are serialized; fill NA for choropleth
+        plot_df = tracts[['TRACT', 'COUNTY', target_col, 'geometry']].copy()
+        plot_df[target_col] = plot_df[target_col].fillna(0)
+
+        if use_tiles:
+            add_tile_choropleth(m, 'tracts', "Census Tracts", plot_df[target_col], target_col,
+                                "YlGnBu", demo_col)
+        else:
+            choropleth = fol.Choropleth(
+                geo_data=plot_df,
+                name="Census Tracts",
+                data=plot_df,
+                columns=['TRACT', target_col],
+                key_on="feature.properties.TRACT",
+                fill_color="YlGnBu",
+                fill_opacity=0.7,
+                line_opacity=0.2,
+                legend_name=demo_col,
+            ).add_to(m)
+
+            # Tooltips ride on the choropleth's own GeoJSON so the geometry is embedded once
+            fol.GeoJsonTooltip(
+                fields=['TRACT', 'COUNTY', target_col],
+                aliases=['Tract:', 'County:', f'{demo_col}:'],
+                localize=True
+            ).add_to(choropleth.geojson)
+
+    # The published boundary has simplified copies; anything else comes from the engine
+    if threshold == DEFAULT_DENSITY_THRESHOLD and manual:
+        newstl_dis_map = load_map_layer('newstl_dis', ['NAME'], zoom)
+    else:
+        newstl_dis_map = get_newstl_outline(threshold, manual)
+    add_boundaries(m, newstl_dis_map, get_current_city_boundary(zoom),
+                   show_newstl_border, show_cur_city_border)
+    return m
+
+@st.cache_resource(max_entries=map_cache_size)
+def build_muni_map(muni_demo_col, show_newstl_border, show_cur_city_border, center, zoom,
+                   use_tiles=False):
+    # Prepare data
+    tooltip_cols = list(dict.fromkeys(['Municipality', 'Classification', muni_demo_col, 'Population']))
+    if muni_demo_col in MUNI_ACS_MEASURES:
+        # Tract ACS measure apportioned to municipalities through the crosswalk
+        muni_plot_df = load_map_layer('munis_merged', muni_cols, zoom)[
+            ['Municipality', 'Classification', 'Population', 'geometry']].copy()
+        muni_plot_df[muni_demo_col] = muni_plot_df['Municipality'].map(get_muni_acs()[muni_demo_col])
+        muni_plot_df = muni_plot_df[tooltip_cols + ['geometry']]
+        # The tile archive only has the municipal columns
+        use_tiles = False
+    else:
+        muni_plot_df = load_map_layer('munis_merged', muni_cols, zoom)[tooltip_cols + ['geometry']].copy()
+
+    # Filter out STL County for Population view as it skews the scale significantly
+    if muni_demo_col == "Population":
+        muni_plot_df = muni_plot_df[muni_plot_df['Municipality'] != 'STL County']
+        muni_plot_df = muni_plot_df[muni_plot_df['Municipality'] != 'Saint Louis City']
+
+    # Special handling for Year Incorporated if it's a string like "1950" or contains non-numeric
+    if muni_demo_col == "Year Incorporated":
+        muni_plot_df[muni_demo_col] = pd.to_numeric(muni_plot_df[muni_demo_col], errors='coerce').fillna(0)
+
+    muni_plot_df[muni_demo_col] = muni_plot_df[muni_demo_col].fillna(0)
+
+    # Map Rendering
+    m_muni = fol.Map(location=list(center), zoom_start=zoom, tiles='cartodb positron')
+
+    if use_tiles:
+        add_tile_choropleth(m_muni, 'munis', "Municipalities", muni_plot_df[muni_demo_col],
+                            muni_demo_col, "OrRd", muni_demo_col)
+    else:
+        choropleth = fol.Choropleth(
+            geo_data=muni_plot_df,
+            name="Municipalities",
+            data=muni_plot_df,
+            columns=['Municipality', muni_demo_col],
+            key_on="feature.properties.Municipality",
+            fill_color="OrRd",
+            fill_opacity=0.7,
+            line_opacity=0.2,
+            legend_name=muni_demo_col,
+        ).add_to(m_muni)
+
+        # Tooltips
+        fol.GeoJsonTooltip(
+            fields=['Municipality', 'Classification', muni_demo_col, 'Population'],
+            aliases=['Municipality:', 'Class:', f'{muni_demo_col}:', 'Population:'],
+            localize=True
+        ).add_to(choropleth.geojson)
+
+    # Present new and current city borders
+    add_boundaries(m_muni, load_map_layer('newstl_dis', ['NAME'], zoom),
+                   get_current_city_boundary(zoom), show_newstl_border, show_cur_city_border)
+    return m_muni
+
+@st.cache_resource(max_entries=map_cache_size)
+def build_infra_map(show_econ, show_police, show_fire_stat, show_fire_dist,
+                    show_metro_stations, show_metro_routes, show_bus_stations,
+                    show_bus_routes, center, zoom, use_tiles=False, coverage_col=None,
+                    window=None, transit_col=None, transit_level='Tracts'):
+    # `window` (west, south, east, north) limits the large vector layers to features near
+    # the viewport; tile mode already only fetches what's in view
+    # Base Map
+    m_infra = fol.Map(location=list(center), zoom_start=zoom, tiles='cartodb positron', prefer_canvas=True)
+
+    # Per-tract service coverage, precomputed from the spatial indexes at build time
+    if coverage_col is not None:
+        coverage = load_map_layer('tract_coverage', coverage_tooltip_cols + [coverage_col], zoom)
+        if coverage is not None:
+            # Fire station distances are only measured for city tracts; the rest stay blank
+            coverage_df = coverage.copy()
+            choropleth = fol.Choropleth(
+                geo_data=coverage_df,
+                name="Tract Service Coverage",
+                data=coverage_df,
+                columns=['TRACT', coverage_col],
+                key_on="feature.properties.TRACT",
+                fill_color="PuRd",
+                fill_opacity=0.6,
+                line_opacity=0.2,
+                legend_name=coverage_col,
+                nan_fill_opacity=0,
+            ).add_to(m_infra)
+            fol.GeoJsonTooltip(
+                fields=coverage_tooltip_cols + [coverage_col],
+                aliases=['Tract:', 'Municipality:', 'Fire District:', 'Nearest Fire Station:',
+                         'Nearest Metro Station:', f'{coverage_col}:'],
+                localize=True
+            ).add_to(choropleth.geojson)
+
+    # Transit accessibility per tract or municipality, precomputed at build time
+    if transit_col is not None:
+        transit_layer, transit_id = transit_levels[transit_level]
+        transit = load_map_layer(transit_layer, [transit_id, transit_col], zoom)
+        if transit is not None:
+            transit_df = transit.copy()
+            transit_df[transit_col] = transit_df[transit_col].fillna(0)
+            choropleth = fol.Choropleth(
+                geo_data=transit_df,
+                name="Transit Accessibility",
+                data=transit_df,
+                columns=[transit_id, transit_col],
+                key_on=f"feature.properties.{transit_id}",
+                fill_color="YlGnBu",
+                fill_opacity=0.6,
+                line_opacity=0.2,
+                legend_name=transit_col,
+            ).add_to(m_infra)
+            fol.GeoJsonTooltip(
+                fields=[transit_id, transit_col],
+                aliases=[f'{transit_level[:-1]}:', f'{transit_col}:'],
+                localize=True
+            ).add_to(choropleth.geojson)
+
+    # Add Boundaries for Context
+    add_boundaries(m_infra, load_map_layer('newstl_dis', ['NAME'], zoom),
+                   get_current_city_boundary(zoom), True, True, newstl_weight=3, city_weight=2)
+
+    # Load and Add Infrastructure Layers
+    if show_econ:
+        econ = load_layer('stl_econ', ['Asset Name', 'Asset Type'])
+        if econ is not None:
+            fol.GeoJson(
+                econ, 
+                name="Economic Assets",
+                marker=fol.Marker(icon=fol.Icon(color='orange', icon='briefcase', prefix='fa')),
+                tooltip=fol.GeoJsonTooltip(
+                    fields=['Asset Name', 'Asset Type'],
+                    aliases=['Name:', 'Type:'],
+                    localize=True
+                )
+            ).add_to(m_infra)
 
-if all_tracts is not None:
-    cur_city_dis = get_current_city_boundary(all_tracts)
-else:
-    cur_city_dis = None
+    if show_police and use_tiles:
+        add_tile_layer(m_infra, 'police', "Police Precincts",
+                       {'fill': True, 'fillColor': 'blue', 'color': 'blue', 'weight': 1, 'fillOpacity': 0.1})
+    elif show_police:
+        police = in_window(load_map_layer('police', ['Police Dept.', 'Precinct', 'Municipality'], zoom), window)
+        if police is not None:
+            fol.GeoJson(police,
+                        name="Police Precincts",
+                        style_function=lambda x: {'fillcolor':'blue', 'color':'blue', 'weight': 1, 'fillOpacity': 0.1},
+                        tooltip=fol.GeoJsonTooltip(
+                            fields=['Police Dept.', 'Precinct', 'Municipality'],
+                            aliases=['Police Dept.:', 'St. Louis Precinct:', 'City'],
+                            localize=True)
+            ).add_to(m_infra)
+
+    if show_fire_stat:
+        fire_stat = load_layer('firestat', [])
+        if fire_stat is not None:
+            fol.GeoJson(fire_stat, 
+                        name="STL Fire Stations",
+                        marker=fol.Marker(icon=fol.Icon(color='red',
+                                                        icon='fire',
+                                                        prefix='fa'))).add_to(m_infra)
+
+    if show_fire_dist and use_tiles:
+        add_tile_layer(m_infra, 'firedist', "County Fire Districts",
+                       {'fill': True, 'fillColor': 'red', 'color': 'black', 'weight': 1, 'fillOpacity': 0.1})
+    elif show_fire_dist:
+        fire_dist = in_window(load_map_layer('firedist', ['Type', 'District'], zoom), window)
+        if fire_dist is not None:
+            fol.GeoJson(fire_dist,
+                        name="County Fire Districts",
+                        style_function=lambda x: {'fillColor': 'red', 'color': 'black', 'weight': 1, 'fillOpacity': 0.1},
+                        tooltip=fol.GeoJsonTooltip(
+                            fields=['Type', 'District'],
+                            aliases=['District Type', 'City'],
+                            localize=True)
+            ).add_to(m_infra)
+
+    if show_metro_routes and use_tiles:
+        add_tile_layer(m_infra, 'metroroute', "Metro Routes", {'color': '#007bff', 'weight': 4})
+    elif show_metro_routes:
+        metro_routes = load_layer('metroroute', [])
+        if metro_routes is not None:
+            fol.GeoJson(metro_routes,
+                        name="Metro Routes",
+                        style_function=lambda x: {'color': '#007bff', 'weight': 4}).add_to(m_infra)
+
+    if show_metro_stations and use_tiles:
+        add_tile_layer(m_infra, 'metrostat', "Metro Stations",
+                       {'radius': 5, 'color': 'white', 'fill': True, 'fillColor': '#007bff', 'fillOpacity': 1})
+    elif show_metro_stations:
+        metro_stations = load_layer('metrostat', [])
+        if metro_stations is not None:
+            fol.GeoJson(metro_stations,
+                        name="Metro Stations",
+                        marker=fol.CircleMarker(radius=5,
+                                                color='white',
+                                                fill=True,
+                                                fill_color='#007bff',
+                                                fill_opacity=1)).add_to(m_infra)
+
+    if show_bus_routes and use_tiles:
+        add_tile_layer(m_infra, 'busroute', "Bus Routes", {'color': '#28a745', 'weight': 2, 'opacity': 0.5})
+    elif show_bus_routes:
+        bus_routes = in_window(load_map_layer('busroute', [], zoom), window)
+        if bus_routes is not None:
+            fol.GeoJson(bus_routes,
+                        name="Bus Routes",
+                        style_function=lambda x: {'color': '#28a745', 'weight': 2, 'opacity': 0.5}).add_to(m_infra)
+
+    if show_bus_stations and use_tiles:
+        add_tile_layer(m_infra, 'busstat', "Bus Stations", {'radius': 2, 'color': '#28a745', 'fill': True})
+    elif show_bus_stations:
+        bus_stations = in_window(load_layer('busstat', []), window)
+        if bus_stations is not None:
+            # Bus stations are high volume, so they go to the browser as one coordinate
+            # array and are drawn client-side as canvas circle markers, clustered until
+            # the map is zoomed in far enough to see individual stops
+            points = bus_stations[bus_stations.geom_type == 'Point'].geometry
+            coords = np.column_stack([points.y.values, points.x.values]).tolist()
+            FastMarkerCluster(
+                coords,
+                name="Bus Stations",
+                callback="""function (row) {
+                    return L.circleMarker(new L.LatLng(row[0], row[1]),
+                                          {radius: 2, color: '#28a745', fill: true});
+                }""",
+                disable_clustering_at_zoom=14,
+                chunked_loading=True
+            ).add_to(m_infra)
+
+    return m_infra
 
 # --- 2. SIDEBAR NAVIGATION ---
 st.sidebar.title("Navigation")
 page = st.sidebar.radio("Select View", ["Regional Demographic Analysis", "Municipal Comparison", "Critical Infrastructure"])
+use_tiles = bool(tile_url) and st.sidebar.checkbox("Stream layers from tile server", value=True)
 
 # --- 3. PAGE: REGIONAL DENSITY ANALYSIS ---
 if page == "Regional Demographic Analysis":
@@ -72,6 +619,11 @@ if page == "Regional Demographic Analysis":
     show_newstl_border = st.sidebar.checkbox("Show Proposed 'New St. Louis' Boundary", value=True)
     show_cur_city_border = st.sidebar.checkbox("Show Current St. Louis City Boundary", value=True)
 
+    # Boundary parameters for the proposed city
+    threshold = st.sidebar.slider("Density Threshold (people/sq mi)", min_value=1000,
+                                  max_value=10000, value=DEFAULT_DENSITY_THRESHOLD, step=100)
+    manual = st.sidebar.checkbox("Apply Manual Compactness Adjustments", value=True)
+
     # Dynamic Legend
     st.sidebar.markdown("---")
     st.sidebar.subheader("Map Legend")
@@ -93,98 +645,120 @@ if page == "Regional Demographic Analysis":
 
     # --- MAP RENDERING ---
     # Center the map on St. Louis
-    m = fol.Map(location=[38.64293421087117, -90.32506114168913], zoom_start=10, tiles='cartodb positron')
-
-    # Add All Tracts with Choropleth logic
-    if show_all_tracts and all_tracts is not None:
-        # Fill NA for choropleth
-        plot_df = all_tracts.copy()
-        # Handle cases where the demo_col might not match exactly due to previous renames
-        if demo_col == "Median Household Income" and "Median HHI" in plot_df.columns:
-            target_col = "Median HHI"
-        else:
-            target_col = demo_col
-            
-        plot_df[target_col] = plot_df[target_col].fillna(0)
-        
-        fol.Choropleth(
-            geo_data=plot_df,
-            name="Census Tracts",
-            data=plot_df,
-            columns=['TRACT', target_col],
-            key_on="feature.properties.TRACT",
-            fill_color="YlGnBu",
-            fill_opacity=0.7,
-            line_opacity=0.2,
-            legend_name=demo_col,
-        ).add_to(m)
-        
-        # Add tooltips
-        fol.GeoJson(
-            plot_df,
-            style_function=lambda x: {'fillColor': 'transparent',
-                                      'color': 'transparent'},
-            tooltip=fol.GeoJsonTooltip(
-                fields=['TRACT', 'COUNTY', target_col],
-                aliases=['Tract:', 'County:', f'{demo_col}:'],
-                localize=True
-            )
-        ).add_to(m)
-
-    # Add New St. Louis Dissolved Boundary
-    if show_newstl_border and newstl_dis is not None:
-        fol.GeoJson(
-            newstl_dis,
-            name="Proposed New St. Louis",
-            style_function=lambda x: {
-                'fillColor': 'none',
-                'color': '#ff4b4b',
-                'weight': 4,
-                'dashArray': '5, 5'
-            }
-        ).add_to(m)
-
-    # Add Current STL Boundary
-    if show_cur_city_border and cur_city_dis is not None:
-        fol.GeoJson(
-            cur_city_dis,
-            name="Current City",
-            style_function=lambda x: {
-                'fillColor': 'none',
-                'color': '#2c3e50',
-                'weight': 3
-            }
-        ).add_to(m)
+    center, zoom = get_view(page)
+    m = build_tract_map(demo_col, show_all_tracts, show_newstl_border, show_cur_city_border,
+                        tuple(center), zoom, use_tiles, threshold, manual)
 
     # Display Map
-    st_folium(m, width=1000, height=600)
+    save_view(page, st_folium(m, width=1000, height=600, returned_objects=['zoom', 'center']))
 
     # --- SUMMARY STATISTICS ---
     st.subheader("Regional Summary Statistics")
     col1, col2, col3, col4, col5= st.columns(5)
 
-    if all_tracts is not None:
+    # Totals come straight from the boundary engine's per-tract arrays, no layer reads
+    engine = load_boundary_engine()
+    if engine is not None:
+        new_city = engine.stats(newstl_mask(threshold, manual))
+        old_city = engine.stats(engine.is_city)
         with col1:
-            old_city_pop = all_tracts[all_tracts['COUNTY'] == 'St. Louis city']['Total Population'].sum()
+            old_city_pop = old_city['Total Population']
             st.metric("Current City Population", f"{old_city_pop:,.0f}")
 
         with col2:
-            old_density = all_tracts[all_tracts['COUNTY'] == 'St. Louis city']['Total Population'].sum()/all_tracts[all_tracts['COUNTY'] == 'St. Louis city']['SQMI'].sum()
+            old_density = old_city['DENSITY']
             st.metric("Current City Density", f"{old_density:,.0f}")
 
         with col3:
-            new_city_pop = newstl_tracts['Total Population'].sum() if newstl_tracts is not None else 0
+            new_city_pop = new_city['Total Population']
             st.metric("'New St. Louis' Population", f"{new_city_pop:,.0f}")
 
         with col4:
-            new_city_density = newstl_tracts['Total Population'].sum()/newstl_tracts['SQMI'].sum() if newstl_tracts is not None else 0
+            new_city_density = new_city['DENSITY']
             st.metric("'New St. Louis' Density", f"{new_city_density:,.0f}")
 
         with col5:
-            county_pop = county_plus_newstl['Total Population'].sum() if county_plus_newstl is not None else 0
+            county_pop = engine.pop.sum()
             st.metric("Total Regional Population", f"{county_pop:,.0f}")
 
-    st.info("The 'New St. Louis' boundary is defined by census tracts with a density ≥ 3,600 people/sq mi, adjusted for contiguity and compactness.")
+        # Municipal revenue of the places New St. Louis would absorb, apportioned to its
+        # tracts by area through the tract x municipality crosswalk
+        new_city_revenue = get_tract_muni_revenue()[newstl_mask(threshold, manual)].sum()
+        col6, col7 = st.columns(2)
+        with col6:
+            st.metric("'New St. Louis' Municipal Revenue (est.)", f"${new_city_revenue:,.0f}")
+        with col7:
+            st.metric("'New St. Louis' Revenue Per Capita (est.)",
+                      f"${new_city_revenue / max(new_city_pop, 1):,.0f}")
+
+        # Compactness and contiguity of the proposal next to the current city
+        st.markdown("**Boundary Quality**")
+        metrics = load_boundary_metrics().measure(np.vstack([newstl_mask(threshold, manual), engine.is_city]))
+        st.dataframe(metrics.set_axis(["'New St. Louis'", 'Current City']).T.round(3))
+
+    st.info(f"The 'New St. Louis' boundary is defined by census tracts with a density ≥ {threshold:,} people/sq mi "
+            f"({new_city['tracts'] if engine is not None else 0} tracts), kept contiguous with the current city "
+            "with enclosed holes filled" + (" and adjusted for compactness." if manual else "."))
+
+    # --- CONSOLIDATION FISCAL SCENARIO ---
+    if engine is not None:
+        st.subheader("Consolidation Fiscal Scenario")
+        st.markdown("""
+        Pools the budgets of the municipalities inside 'New St. Louis' (split municipalities count
+        by their share of residents inside) under the assumptions below. The heatmap evaluates every
+        combination of payroll and service savings at once.
+        """)
+        scol1, scol2, scol3, scol4 = st.columns(4)
+        with scol1:
+            payroll_savings = st.slider("Payroll Cut (absorbed munis)", 0.0, 1.0,
+                                        DEFAULT_PARAMS['payroll_savings'], 0.05)
+        with scol2:
+            service_savings = st.slider("Service Savings (absorbed munis)", 0.0, 0.3,
+                                        DEFAULT_PARAMS['service_savings'], 0.01)
+        with scol3:
+            fines_retained = st.slider("Court Fines Retained", 0.0, 1.0,
+                                       DEFAULT_PARAMS['fines_retained'], 0.05)
+        with scol4:
+            transition_cost = st.slider("Transition Cost ($/resident/yr)", 0, 200,
+                                        int(DEFAULT_PARAMS['transition_cost']), 10)
+
+        table = get_finance_table()
+        members = get_newstl_members(threshold, manual)
+        scenario = simulate(table, members, scenario_grid(
+            payroll_savings=payroll_savings, service_savings=service_savings,
+            fines_retained=fines_retained, transition_cost=transition_cost)).iloc[0]
+
+        mcol1, mcol2, mcol3, mcol4 = st.columns(4)
+        with mcol1:
+            st.metric("Pooled Revenue Per Capita", f"${scenario['Revenue Per Capita']:,.0f}")
+        with mcol2:
+            st.metric("Expenditures Per Capita", f"${scenario['Expenditures Per Capita']:,.0f}",
+                      f"{scenario['Expenditures Per Capita'] - scenario['Baseline Expenditures Per Capita']:,.0f}",
+                      delta_color='inverse')
+        with mcol3:
+            st.metric("Annual Savings", f"${scenario['Savings']:,.0f}")
+        with mcol4:
+            st.metric("Residents With Higher Burden", f"{scenario['Population With Higher Burden']:,.0f}")
+
+        # Sensitivity over a payroll x service savings grid, one batched pass
+        grid = simulate(table, members, scenario_grid(
+            payroll_savings=np.linspace(0, 1, 21), service_savings=np.linspace(0, 0.3, 31),
+            fines_retained=fines_retained, transition_cost=transition_cost))
+        heatmap = alt.Chart(grid[['payroll_savings', 'service_savings', 'Balance Per Capita']]).mark_rect().encode(
+            x=alt.X('payroll_savings:O', title='Payroll Cut', axis=alt.Axis(format='.0%')),
+            y=alt.Y('service_savings:O', title='Service Savings', sort='descending',
+                    axis=alt.Axis(format='.0%')),
+            color=alt.Color('Balance Per Capita:Q', scale=alt.Scale(scheme='redblue', domainMid=0)),
+            tooltip=[alt.Tooltip('payroll_savings:Q', format='.0%'),
+                     alt.Tooltip('service_savings:Q', format='.0%'),
+                     alt.Tooltip('Balance Per Capita:Q', format=',.0f')]
+        ).properties(height=350, title='Budget Balance Per Capita')
+        st.altair_chart(heatmap, use_container_width=True)
+
+        with st.expander("Per-municipality burden under this scenario"):
+            st.dataframe(member_burdens(table, members, payroll_savings=payroll_savings,
+                                        service_savings=service_savings, fines_retained=fines_retained,
+                                        transition_cost=transition_cost).round(2))
 
 # --- 4. PAGE: MUNICIPAL COMPARISON ---
 elif page == "Municipal Comparison":
@@ -209,6 +783,7 @@ elif page == "Municipal Comparison":
         st.sidebar.markdown('<div style="display: flex; align-items: center; margin-bottom: 5px;"><div style="width: 20px; height: 0px; border-top: 3px solid #2c3e50; margin-right: 10px;"></div><span>Current City Boundary</span></div>', unsafe_allow_html=True)
     st.sidebar.markdown("---")
 
+    munis_merged = get_layer('munis_merged')
     if munis_merged is not None:
         # Variable Selector
         muni_demo_col = st.sidebar.selectbox(
@@ -226,76 +801,14 @@ elif page == "Municipal Comparison":
                 'Court Fines Revenue Per Capita (winsorized)',
                 'Total Expenditures Per Capita (winsorized)',
                 'Elected Officials Per 50,000 People (winsorized)'
-            ],
+            ] + list(MUNI_ACS_MEASURES),
             index=4
         )
 
-        # Prepare data
-        muni_plot_df = munis_merged.copy()
-        
-        # Filter out STL County for Population view as it skews the scale significantly
-        if muni_demo_col == "Population":
-            muni_plot_df = muni_plot_df[muni_plot_df['Municipality'] != 'STL County']
-            muni_plot_df = muni_plot_df[muni_plot_df['Municipality'] != 'Saint Louis City']
-        
-        # Special handling for Year Incorporated if it's a string like "1950" or contains non-numeric
-        if muni_demo_col == "Year Incorporated":
-            muni_plot_df[muni_demo_col] = pd.to_numeric(muni_plot_df[muni_demo_col], errors='coerce').fillna(0)
-        
-        muni_plot_df[muni_demo_col] = muni_plot_df[muni_demo_col].fillna(0)
-
-        # Map Rendering
-        m_muni = fol.Map(location=[38.64293421087117, -90.32506114168913], zoom_start=10, tiles='cartodb positron')
-
-        fol.Choropleth(
-            geo_data=muni_plot_df,
-            name="Municipalities",
-            data=muni_plot_df,
-            columns=['Municipality', muni_demo_col],
-            key_on="feature.properties.Municipality",
-            fill_color="OrRd",
-            fill_opacity=0.7,
-            line_opacity=0.2,
-            legend_name=muni_demo_col,
-        ).add_to(m_muni)
-
-        # Tooltips
-        fol.GeoJson(
-            muni_plot_df,
-            style_function=lambda x: {'fillColor': 'transparent', 'color': 'transparent'},
-            tooltip=fol.GeoJsonTooltip(
-                fields=['Municipality', 'Classification', muni_demo_col, 'Population'],
-                aliases=['Municipality:', 'Class:', f'{muni_demo_col}:', 'Population:'],
-                localize=True
-            )
-        ).add_to(m_muni)
-
-        # Present new city borders
-        if show_newstl_border is not None:
-            fol.GeoJson(
-                newstl_dis,
-                name="Proposed New St. Louis",
-                style_function=lambda x: {
-                    'fillColor': 'none',
-                    'color': '#ff4b4b',
-                    'weight': 4,
-                    'dashArray': '5, 5'
-                }
-            ).add_to(m_muni)
-
-        # Present current city borders
-        if show_cur_city_border is not None:
-            fol.GeoJson(
-                cur_city_dis,
-                name="Current City",
-                style_function=lambda x: {
-                    'fillColor': 'none',
-                    'color': '#2c3e50',
-                    'weight': 3
-                }
-            ).add_to(m_muni)
-
-        st_folium(m_muni, width=1000, height=600)
+        center, zoom = get_view(page)
+        m_muni = build_muni_map(muni_demo_col, show_newstl_border, show_cur_city_border,
+                                tuple(center), zoom, use_tiles)
+        save_view(page, st_folium(m_muni, width=1000, height=600, returned_objects=['zoom', 'center']))
         
         st.subheader("Municipal Data Table")
         # Display all columns from options plus Municipality and Classification
@@ -306,7 +819,7 @@ elif page == "Municipal Comparison":
         actual_display_cols = [c for c in display_cols if c in munis_merged.columns]
         st.dataframe(munis_merged[actual_display_cols].sort_values('Municipality'))
     else:
-        st.error("Municipal data (munis_merged.geojson) not found. Please run the data cleaning script.")
+        st.error("Municipal data (munis_merged) not found. Please run the data cleaning script.")
 
 # --- 5. PAGE: CRITICAL INFRASTRUCTURE ---
 elif page == "Critical Infrastructure":
@@ -325,6 +838,11 @@ elif page == "Critical Infrastructure":
     show_metro_routes = st.sidebar.checkbox("Metro Routes", value=False)
     show_bus_stations = st.sidebar.checkbox("Bus Stations", value=False)
     show_bus_routes = st.sidebar.checkbox("Bus Routes", value=False)
+    coverage_choice = st.sidebar.selectbox("Tract Service Coverage", ['None'] + coverage_options)
+    coverage_col = None if coverage_choice == 'None' else coverage_choice
+    transit_choice = st.sidebar.selectbox("Transit Accessibility", ['None'] + ACCESS_COLUMNS)
+    transit_col = None if transit_choice == 'None' else transit_choice
+    transit_level = st.sidebar.radio("Accessibility Areas", list(transit_levels), horizontal=True)
 
     # Dynamic Legend
     st.sidebar.markdown("---")
@@ -352,96 +870,17 @@ elif page == "Critical Infrastructure":
     if show_bus_stations:
         st.sidebar.markdown('<div style="display: flex; align-items: center; margin-bottom: 5px;"><div style="width: 8px; height: 8px; border-radius: 50%; background-color: #28a745; margin-right: 10px;"></div><span>Bus Stations</span></div>', unsafe_allow_html=True)
 
-    # Base Map
-    m_infra = fol.Map(location=[38.64293421087117, -90.32506114168913], zoom_start=10, tiles='cartodb positron')
-
-    # Add Boundaries for Context
-    if cur_city_dis is not None:
-        fol.GeoJson(cur_city_dis, name="Current City", style_function=lambda x: {'fillColor': 'none', 'color': '#2c3e50', 'weight': 2}).add_to(m_infra)
-    if newstl_dis is not None:
-        fol.GeoJson(newstl_dis, name="Proposed New STL", style_function=lambda x: {'fillColor': 'none', 'color': '#ff4b4b', 'weight': 3, 'dashArray': '5, 5'}).add_to(m_infra)
-
-    # Load and Add Infrastructure Layers
-    if show_econ:
-        econ = load_geojson(path_cleaned_data, 'stl_econ.geojson')
-        if econ is not None:
-            fol.GeoJson(
-                econ, 
-                name="Economic Assets",
-                marker=fol.Marker(icon=fol.Icon(color='orange', icon='briefcase', prefix='fa')),
-                tooltip=fol.GeoJsonTooltip(
-                    fields=['Asset Name', 'Asset Type'],
-                    aliases=['Name:', 'Type:'],
-                    localize=True
-                )
-            ).add_to(m_infra)
-
-    if show_police:
-        police = load_geojson(path_cleaned_data, 'police.geojson')
-        if police is not None:
-            fol.GeoJson(police,
-                        name="Police Precincts",
-                        style_function=lambda x: {'fillcolor':'blue', 'color':'blue', 'weight': 1, 'fillOpacity': 0.1},
-                        tooltip=fol.GeoJsonTooltip(
-                            fields=['Police Dept.', 'Precinct', 'Municipality'],
-                            aliases=['Police Dept.:', 'St. Louis Precinct:', 'City'],
-                            localize=True)
-            ).add_to(m_infra)
-
-    if show_fire_stat:
-        fire_stat = load_geojson(path_cleaned_data, 'firestat.geojson')
-        if fire_stat is not None:
-            fol.GeoJson(fire_stat, 
-                        name="STL Fire Stations",
-                        marker=fol.Marker(icon=fol.Icon(color='red',
-                                                        icon='fire',
-                                                        prefix='fa'))).add_to(m_infra)
+    center, zoom = get_view(page)
+    window = None if use_tiles else get_window(page, 1000, 700)
+    m_infra = build_infra_map(show_econ, show_police, show_fire_stat, show_fire_dist,
+                              show_metro_stations, show_metro_routes, show_bus_stations,
+                              show_bus_routes, tuple(center), zoom, use_tiles, coverage_col, window,
+                              transit_col, transit_level)
 
-    if show_fire_dist:
-        fire_dist = load_geojson(path_cleaned_data, 'firedist.geojson')
-        if fire_dist is not None:
-            fol.GeoJson(fire_dist,
-                        name="County Fire Districts",
-                        style_function=lambda x: {'fillColor': 'red', 'color': 'black', 'weight': 1, 'fillOpacity': 0.1},
-                        tooltip=fol.GeoJsonTooltip(
-                            fields=['Type', 'District'],
-                            aliases=['District Type', 'City'],
-                            localize=True)
-            ).add_to(m_infra)
-
-    if show_metro_routes:
-        metro_routes = load_geojson(path_cleaned_data, 'metroroute.geojson')
-        if metro_routes is not None:
-            fol.GeoJson(metro_routes,
-                        name="Metro Routes",
-                        style_function=lambda x: {'color': '#007bff', 'weight': 4}).add_to(m_infra)
-
-    if show_metro_stations:
-        metro_stations = load_geojson(path_cleaned_data, 'metrostat.geojson')
-        if metro_stations is not None:
-            fol.GeoJson(metro_stations,
-                        name="Metro Stations",
-                        marker=fol.CircleMarker(radius=5,
-                                                color='white',
-                                                fill=True,
-                                                fill_color='#007bff',
-                                                fill_opacity=1)).add_to(m_infra)
-
-    if show_bus_routes:
-        bus_routes = load_geojson(path_cleaned_data, 'busroute.geojson')
-        if bus_routes is not None:
-            fol.GeoJson(bus_routes,
-                        name="Bus Routes",
-                        style_function=lambda x: {'color': '#28a745', 'weight': 2, 'opacity': 0.5}).add_to(m_infra)
-
-    if show_bus_stations:
-        bus_stations = load_geojson(path_cleaned_data, 'busstat.geojson')
-        if bus_stations is not None:
-            # For bus stations, we use CircleMarkers due to high volume
-            for idx, row in bus_stations.iterrows():
-                if row.geometry.type == 'Point':
-                    fol.CircleMarker(location=[row.geometry.y, row.geometry.x], radius=2, color='#28a745', fill=True).add_to(m_infra)
-
-    st_folium(m_infra, width=1000, height=700)
+    map_state = st_folium(m_infra, width=1000, height=700, returned_objects=['zoom', 'center', 'bounds'])
+    if use_tiles:
+        save_view(page, map_state)
+    else:
+        save_viewport(page, map_state, 1000, 700)
 
     st.info("Transit and emergency service assets are shown relative to the proposed 'New St. Louis' boundary.")
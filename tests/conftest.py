@@ -0,0 +1,29 @@
+# Shared fixtures for the equivalence tests. The Code/ modules import each other as
+# top-level modules (the scripts run from that folder), so put it on the path.
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+base_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, os.path.join(base_dir, 'Code'))
+
+from derived_io import read_layer  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def tracts():
+    # The committed GeoJSON export of all_tracts (340 tracts)
+    gdf = read_layer('all_tracts')
+    if gdf is None:
+        pytest.skip('all_tracts layer not found')
+    return gdf
+
+
+@pytest.fixture(scope='session')
+def munis():
+    gdf = read_layer('munis_merged')
+    if gdf is None:
+        pytest.skip('munis_merged layer not found')
+    return gdf
@@ -0,0 +1,67 @@
+# Batched OLS vs. one statsmodels formula fit per outcome (and per year)
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.formula.api as smf
+
+from batch_ols import BatchOLS
+
+
+@pytest.fixture(scope='module')
+def panel():
+    rng = np.random.default_rng(12)
+    states = [f'S{i}' for i in range(8)]
+    rows = []
+    for year in [2020, 2021, 2022]:
+        # One state is missing each year, so the pooled design has zero dummy columns
+        present = [s for i, s in enumerate(states) if i != year % 8]
+        for state in present:
+            for _ in range(6):
+                rows.append((year, state))
+    df = pd.DataFrame(rows, columns=['year', 'state'])
+    n = len(df)
+    df['consolidated_govt'] = rng.choice([0, 1], n)
+    df['pop_log'] = rng.normal(12, 1, n)
+    effect = df['state'].str[1:].astype(int) * 0.1
+    for col in ['y1', 'y2']:
+        df[col] = 0.3 * df['consolidated_govt'] + 0.5 * df['pop_log'] + effect + rng.normal(0, 1, n)
+    df.loc[rng.choice(n, 10, replace=False), 'y2'] = np.nan
+    # Unused levels like a categorical read back from parquet
+    df['state'] = pd.Categorical(df['state'], categories=states + ['S99'])
+    return df
+
+
+def _statsmodels(df, outcome, cov_type):
+    kwargs = {'cov_type': 'cluster', 'cov_kwds': {'groups': None}} if cov_type == 'cluster' else {'cov_type': cov_type}
+    sample = df.dropna(subset=[outcome]).copy()
+    sample['state'] = sample['state'].astype(str)
+    if cov_type == 'cluster':
+        kwargs['cov_kwds']['groups'] = pd.factorize(sample['state'])[0]
+    fit = smf.ols(f'{outcome} ~ consolidated_govt + pop_log + C(state)', data=sample).fit(**kwargs)
+    return fit.params['consolidated_govt'], fit.bse['consolidated_govt'], fit.pvalues['consolidated_govt']
+
+
+@pytest.mark.parametrize('cov_type', ['nonrobust', 'HC1', 'cluster'])
+def test_pooled_fit_matches_statsmodels(panel, cov_type):
+    groups = 'state' if cov_type == 'cluster' else None
+    model = BatchOLS(panel, ['y1', 'y2'], ['consolidated_govt', 'pop_log'], ['state'],
+                     cov_type=cov_type, groups=groups)
+    summary = model.fit().summary('consolidated_govt').set_index('Variable')
+    for outcome in ['y1', 'y2']:
+        coef, se, p = _statsmodels(panel, outcome, cov_type)
+        np.testing.assert_allclose(summary.loc[outcome, ['Coeff', 'Standard Error', 'P>|t|']],
+                                   [coef, se, p], rtol=1e-8)
+
+
+@pytest.mark.parametrize('cov_type', ['nonrobust', 'HC1', 'cluster'])
+def test_by_year_fit_matches_statsmodels(panel, cov_type):
+    groups = 'state' if cov_type == 'cluster' else None
+    model = BatchOLS(panel, ['y1', 'y2'], ['consolidated_govt', 'pop_log'], ['state'],
+                     cov_type=cov_type, groups=groups, by='year')
+    summary = model.fit().summary('consolidated_govt').set_index(['year', 'Variable'])
+    for year, sample in panel.groupby('year', observed=True):
+        for outcome in ['y1', 'y2']:
+            coef, se, p = _statsmodels(sample, outcome, cov_type)
+            np.testing.assert_allclose(
+                summary.loc[(year, outcome), ['Coeff', 'Standard Error', 'P>|t|']],
+                [coef, se, p], rtol=1e-8)
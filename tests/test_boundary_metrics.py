@@ -0,0 +1,50 @@
+# Batch compactness metrics vs. the same measures on a union_all of the selected tracts
+import numpy as np
+import geopandas as gpd
+import pytest
+import shapely
+
+from boundary_engine import BoundaryEngine
+from boundary_metrics import BoundaryMetrics
+from spatial_index import PROJECTED_CRS
+
+
+@pytest.fixture(scope='module')
+def metrics(tracts):
+    return BoundaryMetrics(BoundaryEngine(tracts))
+
+
+@pytest.fixture(scope='module')
+def projected(tracts):
+    return gpd.GeoSeries(tracts.geometry.to_numpy(), crs=tracts.crs).to_crs(PROJECTED_CRS).to_numpy()
+
+
+def _masks(n, seeds):
+    return np.array([np.random.default_rng(seed).random(n) < 0.5 for seed in seeds])
+
+
+def test_metrics_match_union_all(metrics, projected):
+    masks = _masks(len(projected), range(5))
+    ours = metrics.measure(masks)
+    for row, mask in zip(ours.itertuples(index=False), masks):
+        union = shapely.union_all(projected[mask])
+        hull = shapely.convex_hull(union)
+        area = shapely.area(union)
+        assert row[ours.columns.get_loc('Polsby-Popper')] == pytest.approx(
+            4 * np.pi * area / shapely.length(union) ** 2, rel=1e-3)
+        assert row[ours.columns.get_loc('Convex Hull Ratio')] == pytest.approx(area / shapely.area(hull), rel=1e-6)
+        assert row[ours.columns.get_loc('Reock')] == pytest.approx(
+            area / (np.pi * shapely.minimum_bounding_radius(hull) ** 2), rel=1e-6)
+
+
+def test_empty_masks_anywhere_in_the_stack(metrics, projected):
+    n = len(projected)
+    filled = _masks(n, [1, 2])
+    empty = np.zeros(n, dtype=bool)
+    stack = np.vstack([empty, filled[0], empty, filled[1]])
+    ours = metrics.measure(stack)
+    reference = metrics.measure(filled)
+    np.testing.assert_allclose(ours.iloc[[1, 3]].to_numpy(dtype=float), reference.to_numpy(dtype=float))
+    ratios = ['DENSITY', 'Polsby-Popper', 'Reock', 'Convex Hull Ratio', 'Shared Perimeter Share']
+    assert ours.loc[[0, 2], ratios].isna().all().all()
+    assert (ours.loc[[0, 2], ['Tracts', 'Total Population', 'Pieces', 'Holes']] == 0).all().all()
@@ -0,0 +1,105 @@
+# CensusClient against a local stand-in for the ACS endpoint (http.server on a free port)
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from census_client import CensusAPIError, CensusClient
+
+TRACTS_PER_COUNTY = 3
+
+
+class _ACSHandler(BaseHTTPRequestHandler):
+    # Answers /<year>/acs/acs5?get=...&for=tract:*&in=state:SS county:CCC with a header
+    # row and TRACTS_PER_COUNTY rows of made-up values; the first `fail_first` requests
+    # get a 503
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            failing = len(server.requests) <= server.fail_first
+        if failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        year = int(url.path.strip('/').split('/')[0])
+        variables = query['get'][0].split(',')
+        state, county = (part.split(':')[1] for part in query['in'][0].split(' '))
+        rows = [variables + ['state', 'county', 'tract']]
+        for t in range(TRACTS_PER_COUNTY):
+            tract = f'{t + 1:06d}'
+            rows.append([f'Census Tract {t + 1}' if v == 'NAME' else str(year + t) for v in variables]
+                        + [state, county, tract])
+        body = json.dumps(rows).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _ACSHandler)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.fail_first = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _client(server, tmp_path, **kwargs):
+    host, port = server.server_address
+    return CensusClient(cache_dir=str(tmp_path), base_url=f'http://{host}:{port}', backoff=0,
+                        **kwargs)
+
+
+def test_tracts_fetches_every_county_and_year(server, tmp_path):
+    counties = [('29', '189'), ('29', '510')]
+    df = _client(server, tmp_path).tracts(['NAME', 'B01003_001E'], counties, years=(2021, 2022))
+    assert len(df) == len(counties) * 2 * TRACTS_PER_COUNTY
+    # Submission order: years outer, counties inner
+    assert df[['year', 'county']].drop_duplicates().values.tolist() == [
+        [2021, '189'], [2021, '510'], [2022, '189'], [2022, '510']]
+    assert (df['B01003_001E'] >= df['year']).all()
+    assert len(server.requests) == 4
+
+
+def test_variables_split_across_requests(server, tmp_path):
+    variables = [f'B15003_{i:03d}E' for i in range(1, 61)]
+    df = _client(server, tmp_path).tracts(variables, [('29', '510')])
+    assert set(variables) <= set(df.columns)
+    assert len(df) == TRACTS_PER_COUNTY
+    assert len(server.requests) == 2
+
+
+def test_retries_then_serves_from_cache(server, tmp_path):
+    server.fail_first = 2
+    first = _client(server, tmp_path).tracts(['B01003_001E'], [('29', '189')])
+    assert len(server.requests) == 3
+    # The cached response is enough offline
+    again = _client(server, tmp_path, offline=True).tracts(['B01003_001E'], [('29', '189')])
+    assert again.equals(first)
+    assert len(server.requests) == 3
+
+
+def test_gives_up_after_retries(server, tmp_path):
+    server.fail_first = 10
+    with pytest.raises(CensusAPIError):
+        _client(server, tmp_path, retries=1).tracts(['B01003_001E'], [('29', '189')])
+
+
+def test_no_counties_gives_an_empty_frame(server, tmp_path):
+    df = _client(server, tmp_path).tracts(['NAME', 'B01003_001E'], [])
+    assert df.empty
+    assert list(df.columns) == ['NAME', 'B01003_001E', 'state', 'county', 'tract', 'year']
+    assert not server.requests
@@ -0,0 +1,104 @@
+# Sparse tract -> municipality / fire district crosswalks vs. areal interpolation through a geopandas
+# overlay, and the municipal ACS measures built from the real layers
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+
+from crosswalk import MUNI_ACS_MEASURES, Crosswalk, muni_acs
+from derived_io import read_layer
+from spatial_index import PROJECTED_CRS
+
+
+@pytest.fixture(scope='module')
+def crosswalk(tracts, munis):
+    return Crosswalk(tracts[['TRACT', 'geometry']], 'TRACT', munis[['Municipality', 'geometry']],
+                     'Municipality')
+
+
+def _overlay(tracts, target, target_id):
+    # Intersection pieces with each tract's and each target id's full area
+    source = tracts[['TRACT', 'Total Population', 'geometry']].to_crs(PROJECTED_CRS)
+    target = target.loc[target[target_id].notna(), [target_id, 'geometry']].to_crs(PROJECTED_CRS)
+    source['geometry'] = source.geometry.make_valid()
+    target['geometry'] = target.geometry.make_valid()
+    source['source_area'] = source.area
+    target_area = target.assign(area=target.area).groupby(target_id)['area'].sum()
+    pieces = gpd.overlay(source, target, how='intersection', keep_geom_type=True)
+    pieces['piece_area'] = pieces.area
+    pieces['target_area'] = pieces[target_id].map(target_area)
+    return pieces
+
+
+def _population_by_target(pieces, target_id):
+    return (pieces['Total Population'] * pieces['piece_area'] / pieces['source_area']
+            ).groupby(pieces[target_id]).sum()
+
+
+@pytest.fixture(scope='module')
+def overlay(tracts, munis):
+    return _overlay(tracts, munis, 'Municipality')
+
+
+@pytest.fixture(scope='module')
+def firedist():
+    gdf = read_layer('firedist')
+    if gdf is None:
+        pytest.skip('firedist layer not found')
+    return gdf
+
+
+def test_one_column_per_municipality(crosswalk, munis):
+    # munis_merged stores some municipalities (Pacific) as several rows
+    assert len(crosswalk.target_ids) == munis['Municipality'].nunique()
+    assert crosswalk.areas.shape == (len(crosswalk.source_ids), len(crosswalk.target_ids))
+
+
+def test_to_target_matches_overlay(crosswalk, tracts, overlay):
+    pop = crosswalk.align_source(pd.DataFrame(tracts.drop(columns='geometry')), 'TRACT')['Total Population']
+    ours = crosswalk.to_target(pop).iloc[:, 0]
+    reference = _population_by_target(overlay, 'Municipality')
+    np.testing.assert_allclose(ours.reindex(reference.index), reference, rtol=1e-6)
+
+
+def test_to_source_matches_overlay(crosswalk, munis, overlay):
+    revenue = crosswalk.align_target(pd.DataFrame(munis.drop(columns='geometry')), 'Municipality')['Total Revenue']
+    revenue = pd.to_numeric(revenue, errors='coerce')
+    ours = crosswalk.to_source(revenue).iloc[:, 0]
+    share = overlay['piece_area'] / overlay['target_area']
+    reference = (overlay['Municipality'].map(revenue).fillna(0) * share).groupby(overlay['TRACT']).sum()
+    np.testing.assert_allclose(ours.reindex(reference.index), reference, rtol=1e-6, atol=1e-6)
+
+
+def test_extensive_totals_conserved(crosswalk, tracts):
+    # Each tract hands over exactly the share of its population lying under municipalities
+    # (more than all of it where municipal polygons overlap)
+    pop = crosswalk.align_source(pd.DataFrame(tracts.drop(columns='geometry')), 'TRACT')['Total Population']
+    covered = np.asarray(crosswalk.areas.sum(axis=1)).ravel() / crosswalk.source_area
+    total = crosswalk.to_target(pop).iloc[:, 0].sum()
+    assert total == pytest.approx((pop.fillna(0) * covered).sum(), rel=1e-9)
+
+
+def test_muni_acs_from_layers(crosswalk, tracts):
+    acs = muni_acs(crosswalk, tracts)
+    assert list(acs.columns) == list(MUNI_ACS_MEASURES)
+    assert acs.index.is_unique
+    assert acs.notna().any().all()
+    # Tract-averaged shares stay within the tract range
+    share = acs['ACS Proportion Black (tract avg.)'].dropna()
+    assert share.between(tracts['Proportion Black'].min(), tracts['Proportion Black'].max()).all()
+
+
+def test_muni_acs_missing_column(crosswalk, tracts):
+    with pytest.raises(KeyError, match='Median HHI'):
+        muni_acs(crosswalk, tracts.drop(columns='Median HHI'))
+
+
+def test_firedist_crosswalk_skips_unnamed_districts(tracts, firedist):
+    # A couple of firedist pieces have no District; the rest repeat ids across pieces
+    crosswalk = Crosswalk.from_layers('tract_firedist', read_layer)
+    assert list(crosswalk.target_ids) == list(firedist['District'].dropna().unique())
+    pop = crosswalk.align_source(pd.DataFrame(tracts.drop(columns='geometry')), 'TRACT')['Total Population']
+    ours = crosswalk.to_target(pop).iloc[:, 0]
+    reference = _population_by_target(_overlay(tracts, firedist, 'District'), 'District')
+    np.testing.assert_allclose(ours.reindex(reference.index), reference, rtol=1e-6)
@@ -0,0 +1,30 @@
+# Build targets that write derived layers, run against the raw data into a temp folder
+import os
+
+import pandas as pd
+import pytest
+
+import derived_io
+import preprocessing
+
+
+@pytest.fixture
+def derived_dir(tmp_path, monkeypatch):
+    # Layers the targets write go to tmp_path instead of data/derived-data
+    monkeypatch.setattr(preprocessing, 'write_layer',
+                        lambda gdf, name, **kwargs: derived_io.write_layer(gdf, name, path_dir=tmp_path))
+    return tmp_path
+
+
+def test_munis_layer_writes_as_parquet(derived_dir):
+    if not os.path.exists(preprocessing.raw('Municipal_Boundaries.geojson')):
+        pytest.skip('raw municipal data not found')
+    preprocessing.build_munis()
+    munis = derived_io.read_layer('munis_merged', path_dir=derived_dir)
+    assert pd.api.types.is_numeric_dtype(munis['Year Incorporated'])
+    years = munis.set_index('Municipality')['Year Incorporated']
+    assert years['STL County'] == 1812
+    assert years['Green Park'] == 1995
+    # Finance rows renamed to match the boundary names keep their geometry
+    renamed = munis.set_index('Municipality').loc[['St Ann', 'St John'], 'geometry']
+    assert renamed.notna().all()
@@ -0,0 +1,47 @@
+# The spec size budget should only fire on charts that embed more than they need, not on
+# the repo's own largest charts
+import json
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fisc_panel import effect_trend_chart, metric_trend_chart
+from render import SPEC_SIZE_BUDGET, SpecSizeWarning, check_spec_size
+
+YEARS = range(1977, 2023)
+
+
+@pytest.fixture(scope='module')
+def panel_charts():
+    rng = np.random.default_rng(17)
+    outcomes = ['Government Administration Spending', 'Federal Intergovernmental Revenue',
+                'Total Public Safety Spending', 'Current Charges & Fees', 'Utility Expenditure',
+                'Total Outstanding Debt', 'Total Tax Revenue', 'Property Tax Revenue',
+                'Utility Revenue', 'General Direct Expenditure', 'Police Protection Spending',
+                'Fire Protection Spending']
+    effects = pd.DataFrame([(y, v) for y in YEARS for v in outcomes], columns=['year', 'Variable'])
+    for col in ['Coeff', 'ci_lower', 'ci_upper', 'P>|t|']:
+        effects[col] = rng.normal(size=len(effects))
+    trend = pd.DataFrame([(y, c, m) for y in YEARS
+                          for c in ['St. Louis', 'Louisville', 'Consolidated', 'NonConsolidated']
+                          for m in ['All Taxes', 'Property Tax', 'Federal Transfers', 'Charges']],
+                         columns=['year', 'city', 'Metric'])
+    trend['Value'] = rng.normal(1000, 100, len(trend))
+    return {'effect_trend': effect_trend_chart(effects),
+            'revenue_trend': metric_trend_chart(trend, 'Per Capita Revenue Sources Over Time')}
+
+
+def test_panel_charts_fit_the_budget(panel_charts):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', SpecSizeWarning)
+        for name, chart in panel_charts.items():
+            assert check_spec_size(chart.to_dict(), name) <= SPEC_SIZE_BUDGET
+
+
+def test_oversized_spec_warns():
+    spec = {'data': {'values': [{'x': i, 'padding': 'x' * 100} for i in range(5000)]}}
+    assert len(json.dumps(spec)) > SPEC_SIZE_BUDGET
+    with pytest.warns(SpecSizeWarning):
+        check_spec_size(spec, 'oversized')
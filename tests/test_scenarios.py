@@ -0,0 +1,65 @@
+# Fiscal scenarios: pooled totals from munis_merged and the broadcast simulation vs. a
+# per-scenario loop
+import numpy as np
+import pandas as pd
+import pytest
+
+from boundary_engine import DEFAULT_DENSITY_THRESHOLD, MANUAL_EXCLUDE, MANUAL_INCLUDE, BoundaryEngine
+from crosswalk import Crosswalk
+from scenarios import (CORE_MUNICIPALITY, COUNTY_GOVERNMENT, _span, finance_table, members_from_tracts,
+                       scenario_grid, simulate)
+
+
+def test_finance_table_one_row_per_municipality(munis):
+    table = finance_table(munis)
+    assert table.index.is_unique
+    assert list(table.index) == list(munis['Municipality'].drop_duplicates())
+    # Pacific is three polygon rows in munis_merged; it counts once
+    pacific = munis.loc[munis['Municipality'] == 'Pacific', 'Population']
+    assert table.loc['Pacific', 'Population'] == pd.to_numeric(pacific).iloc[0]
+
+
+def test_simulate_matches_loop(munis):
+    table = finance_table(munis)
+    rng = np.random.default_rng(22)
+    members = pd.DataFrame(rng.random((len(table), 2)) * (rng.random((len(table), 2)) < 0.3),
+                           index=table.index, columns=['a', 'b'])
+    members.loc[CORE_MUNICIPALITY] = 1.0
+    grid = scenario_grid(payroll_savings=[0, 0.5, 1], fines_retained=[0.25, 1], transition_cost=[0, 10])
+    results = simulate(table, members, grid)
+
+    rows = []
+    for name in members:
+        w = members[name]
+        absorbed = w * (table.index != CORE_MUNICIPALITY)
+        totals = table.mul(w, axis=0).sum()
+        payroll = (table['Sum Total Payroll'] * absorbed).sum()
+        spending = (table['Total Expenditures'] * absorbed).sum() - payroll
+        for _, p in grid.iterrows():
+            revenue = totals['Total Revenue'] - (1 - p['fines_retained']) * totals['Court Fines Revenue']
+            expenditures = (totals['Total Expenditures'] - p['payroll_savings'] * payroll
+                            - p['service_savings'] * spending + p['transition_cost'] * totals['Population'])
+            rows.append((totals['Population'], revenue, expenditures))
+    reference = pd.DataFrame(rows, columns=['Population', 'Revenue', 'Expenditures'])
+    np.testing.assert_allclose(results[reference.columns].to_numpy(), reference.to_numpy(), rtol=1e-9)
+
+
+def test_pooled_population_matches_the_boundary(tracts, munis):
+    # The county government row carries the whole county's population; only the
+    # unincorporated residents inside the boundary should come along
+    engine = BoundaryEngine(tracts)
+    crosswalk = Crosswalk(tracts[['TRACT', 'geometry']], 'TRACT', munis[['Municipality', 'geometry']],
+                          'Municipality')
+    mask = engine.select(DEFAULT_DENSITY_THRESHOLD, include=MANUAL_INCLUDE, exclude=MANUAL_EXCLUDE)
+    table = finance_table(munis)
+    members = members_from_tracts(crosswalk, engine.tract_ids, mask, engine.pop, table)
+    pooled = simulate(table, members.rename('New St. Louis'), scenario_grid())['Population'].iloc[0]
+    # Municipal populations aren't the tract ACS totals, so only roughly equal
+    assert pooled == pytest.approx(engine.pop[mask].sum(), rel=0.1)
+    assert 0 < members[COUNTY_GOVERNMENT] * table.loc[COUNTY_GOVERNMENT, 'Population'] < engine.pop[mask].sum()
+
+
+def test_span_reads_lists_and_ranges():
+    np.testing.assert_allclose(_span(['0.2', '0.4', '0.6']), [0.2, 0.4, 0.6])
+    np.testing.assert_allclose(_span(['0:1:5']), [0, 0.25, 0.5, 0.75, 1])
+    np.testing.assert_allclose(_span(['0.1', '0.5:1:2']), [0.1, 0.5, 1])
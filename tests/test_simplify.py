@@ -0,0 +1,51 @@
+# Simplified levels of the polygon layers stay a gap/overlap free coverage, including
+# the source layers whose borders overlap or don't share vertices
+import warnings
+
+import pytest
+import shapely
+
+from derived_io import read_layer
+from simplify import LEVELS, simplify_layer
+
+
+def _gaps(geoms):
+    # Holes enclosed by the union of the polygons: (count, area)
+    parts = shapely.get_parts(shapely.union_all(geoms))
+    rings = [shapely.get_interior_ring(part, i) for part in parts
+             for i in range(shapely.get_num_interior_rings(part))]
+    return len(rings), float(shapely.area(shapely.polygons(rings)).sum()) if rings else 0.0
+
+
+def _simplified(gdf, level, name):
+    # Falling back to per-polygon simplification warns; make that a failure
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        simplified = simplify_layer(gdf, level, name).geometry.to_numpy()
+    return simplified[~shapely.is_missing(simplified)]
+
+
+@pytest.mark.parametrize('level', list(LEVELS))
+def test_simplified_munis_have_no_gaps_or_overlaps(munis, level):
+    original = munis.geometry.to_numpy()
+    original = shapely.make_valid(original[~shapely.is_missing(original)])
+    geoms = _simplified(munis, level, 'munis_merged')
+    assert shapely.coverage_is_valid(geoms)
+    # No overlaps: the pieces add up to their union
+    assert shapely.area(geoms).sum() == pytest.approx(shapely.area(shapely.union_all(geoms)), rel=1e-5)
+    # No new gaps between neighbours
+    count, area = _gaps(geoms)
+    original_count, original_area = _gaps(original)
+    assert count <= original_count
+    assert area <= original_area * 1.1
+
+
+@pytest.mark.parametrize('name', ['firedist', 'police', 'all_tracts'])
+def test_polygon_layers_simplify_as_coverages(name):
+    gdf = read_layer(name)
+    if gdf is None:
+        pytest.skip(f'{name} layer not found')
+    for level in LEVELS:
+        geoms = _simplified(gdf, level, name)
+        assert shapely.coverage_is_valid(geoms)
+        assert shapely.is_valid(geoms).all()
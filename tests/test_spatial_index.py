@@ -0,0 +1,28 @@
+# Per-tract service coverage from the spatial indexes over the committed layers
+import numpy as np
+import pytest
+
+from derived_io import read_layer
+from spatial_index import INDEXED_LAYERS, SpatialIndex, tract_service_coverage
+
+
+@pytest.fixture(scope='module')
+def coverage(tracts):
+    indexes = {}
+    for name, id_col in INDEXED_LAYERS.items():
+        layer = read_layer(name, columns=[id_col])
+        if layer is None:
+            pytest.skip(f'{name} layer not found')
+        indexes[name] = SpatialIndex(layer, id_col)
+    return tract_service_coverage(tracts[['TRACT', 'COUNTY', 'geometry']], indexes)
+
+
+def test_fire_station_distance_only_for_city_tracts(tracts, coverage):
+    # firestat only has the city's stations
+    in_city = (tracts['COUNTY'] == 'St. Louis city').to_numpy()
+    miles = coverage['Miles to Fire Station'].to_numpy()
+    assert np.isfinite(miles[in_city]).all()
+    assert np.isnan(miles[~in_city]).all()
+    assert coverage['Nearest Fire Station'][~in_city].isna().all()
+    # Every city tract is within a few miles of a station
+    assert miles[in_city].max() < 3
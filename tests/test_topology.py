@@ -0,0 +1,41 @@
+# Shared-edge outlines vs. a plain union_all of the same tracts
+import numpy as np
+import pytest
+import shapely
+
+from topology import Outline, Topology, dissolve
+
+
+def _relative_difference(geom, reference):
+    return shapely.area(shapely.symmetric_difference(geom, reference)) / shapely.area(reference)
+
+
+@pytest.fixture(scope='module')
+def topology(tracts):
+    return Topology(tracts.geometry.to_numpy())
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_outline_matches_union_all(tracts, topology, seed):
+    # Random half selections hit corner-touching tracts around holes
+    mask = np.random.default_rng(seed).random(len(tracts)) < 0.5
+    reference = shapely.union_all(tracts.geometry.to_numpy()[mask])
+    assert _relative_difference(topology.outline(mask), reference) < 1e-6
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_incremental_outline_matches_union_all(tracts, topology, seed):
+    rng = np.random.default_rng(seed)
+    mask = rng.random(len(tracts)) < 0.5
+    outline = Outline(topology, rng.random(len(tracts)) < 0.5)
+    for i in range(len(tracts)):
+        outline.add(i) if mask[i] else outline.remove(i)
+    reference = shapely.union_all(tracts.geometry.to_numpy()[mask])
+    assert _relative_difference(outline.geometry, reference) < 1e-6
+
+
+def test_dissolve_matches_geopandas(tracts):
+    ours = dissolve(tracts[['COUNTY', 'geometry']], by='COUNTY')
+    theirs = tracts[['COUNTY', 'geometry']].dissolve(by='COUNTY')
+    for county in theirs.index:
+        assert _relative_difference(ours.geometry[county], theirs.geometry[county]) < 1e-6
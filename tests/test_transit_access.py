@@ -0,0 +1,47 @@
+# Transit access per municipality from the committed stop and route layers
+import numpy as np
+import pandas as pd
+import pytest
+
+from derived_io import read_layer
+from spatial_index import INDEXED_LAYERS, SpatialIndex
+from transit_access import transit_access
+
+
+@pytest.fixture(scope='module')
+def layers():
+    loaded = {name: read_layer(name) for name in ['busstat', 'metrostat', 'busroute', 'metroroute']}
+    missing = [name for name, gdf in loaded.items() if gdf is None]
+    if missing:
+        pytest.skip(f'layers not found: {missing}')
+    return loaded
+
+
+@pytest.fixture(scope='module')
+def access(munis, layers):
+    indexes = {name: SpatialIndex(layers[name], INDEXED_LAYERS[name]) for name in ['busstat', 'metrostat']}
+    return transit_access(munis, 'Municipality', indexes, layers['busroute'], layers['metroroute'])
+
+
+def test_one_row_per_municipality(munis, access):
+    # Pacific is three rows in munis_merged
+    assert access['Municipality'].is_unique
+    assert set(access['Municipality']) == set(munis['Municipality'].dropna())
+
+
+def test_repeated_ids_scored_as_one_area(munis, layers, access):
+    # Cutting the city into two rows with the same name scores the same as the whole
+    indexes = {name: SpatialIndex(layers[name], INDEXED_LAYERS[name]) for name in ['busstat', 'metrostat']}
+    munis = munis.loc[munis['Municipality'] != 'Pacific', ['Municipality', 'geometry']]
+    city = munis.loc[munis['Municipality'] == 'Saint Louis City']
+    minx, miny, maxx, maxy = city.total_bounds
+    mid = (minx + maxx) / 2
+    halves = pd.concat([city.assign(geometry=city.geometry.clip_by_rect(minx, miny, mid, maxy)),
+                        city.assign(geometry=city.geometry.clip_by_rect(mid, miny, maxx, maxy))])
+    split = pd.concat([munis.loc[munis['Municipality'] != 'Saint Louis City'], halves])
+    ours = transit_access(split, 'Municipality', indexes, layers['busroute'], layers['metroroute'])
+    whole = transit_access(munis, 'Municipality', indexes, layers['busroute'], layers['metroroute'])
+    ours = ours.set_index('Municipality').drop(columns='geometry').loc['Saint Louis City']
+    whole = whole.set_index('Municipality').drop(columns='geometry').loc['Saint Louis City']
+    assert whole['Bus Stops Within 1/4 Mile'] > 0
+    np.testing.assert_allclose(ours.to_numpy(dtype=float), whole.to_numpy(dtype=float), rtol=1e-6)
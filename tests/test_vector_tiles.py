@@ -0,0 +1,7 @@
+# TileJSON field types advertised for a layer's attributes
+from vector_tiles import _TileLayer
+
+
+def test_fields_follow_column_types(munis):
+    fields = _TileLayer('munis_merged', munis[['Municipality', 'Population', 'geometry']]).fields
+    assert fields == {'Municipality': 'String', 'Population': 'Number'}
@@ -0,0 +1,57 @@
+# Vectorized weighted group stats vs. statsmodels DescrStatsW per group (what fisc_plots
+# used before)
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.stats.weightstats import DescrStatsW
+
+from weighted_stats import weighted_mean, weighted_quantile
+
+
+@pytest.fixture(scope='module')
+def panel():
+    rng = np.random.default_rng(11)
+    n = 400
+    df = pd.DataFrame({
+        'year': rng.choice([2019, 2020, 2021, 2022], n),
+        'consolidated_govt': rng.choice([0, 1], n),
+        'city_population': rng.integers(50_000, 2_000_000, n).astype(float),
+        'rev_general': rng.gamma(2.0, 1500.0, n),
+        'spending_total': rng.normal(5000, 800, n),
+    })
+    return df
+
+
+def _reference(df, func, columns, dropna=False):
+    out = {}
+    for key, group in df.groupby(['year', 'consolidated_govt']):
+        row = {}
+        for col in columns:
+            g = group[[col, 'city_population']].dropna() if dropna else group
+            row[col] = func(DescrStatsW(g[col].to_numpy(), weights=g['city_population'].to_numpy()))
+        out[key] = row
+    return pd.DataFrame.from_dict(out, orient='index')
+
+
+def test_weighted_mean_matches_descrstatsw(panel):
+    columns = ['rev_general', 'spending_total']
+    ours = weighted_mean(panel, ['year', 'consolidated_govt'], 'city_population', columns)
+    reference = _reference(panel, lambda d: d.mean, columns)
+    np.testing.assert_allclose(ours.to_numpy(), reference.loc[ours.index].to_numpy(), rtol=1e-12)
+
+
+def test_weighted_mean_skips_missing_per_column(panel):
+    panel = panel.copy()
+    panel.loc[panel.sample(frac=0.2, random_state=1).index, 'rev_general'] = np.nan
+    columns = ['rev_general', 'spending_total']
+    ours = weighted_mean(panel, ['year', 'consolidated_govt'], 'city_population', columns)
+    reference = _reference(panel, lambda d: d.mean, columns, dropna=True)
+    np.testing.assert_allclose(ours.to_numpy(), reference.loc[ours.index].to_numpy(), rtol=1e-12)
+
+
+@pytest.mark.parametrize('q', [0.1, 0.25, 0.5, 0.9])
+def test_weighted_quantile_matches_descrstatsw(panel, q):
+    columns = ['rev_general', 'spending_total']
+    ours = weighted_quantile(panel, ['year', 'consolidated_govt'], 'city_population', q, columns)
+    reference = _reference(panel, lambda d: d.quantile([q], return_pandas=False)[0], columns)
+    np.testing.assert_allclose(ours.to_numpy(), reference.loc[ours.index].to_numpy(), rtol=1e-12)